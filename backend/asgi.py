@@ -8,9 +8,15 @@ https://docs.djangoproject.com/en/4.0/howto/deployment/asgi/
 """
 
 import os
+from importlib import import_module
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 application = get_asgi_application()
+
+# Load the URLconf, and with it the views, now rather than on the first request, so a gunicorn
+# master started with --preload imports them once for all of its workers
+import_module(settings.ROOT_URLCONF)
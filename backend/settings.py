@@ -53,7 +53,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Request latency and database metrics; first, so it times the other middleware
+    'main_app.middleware.MetricsMiddleware',
+    # brotli or gzip compression of text and JSON responses; early, so it sees the final content
+    'main_app.middleware.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # Read replicas for read-only requests
+    'main_app.middleware.ReplicaPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     # CORS
     'corsheaders.middleware.CorsMiddleware',
@@ -84,6 +90,9 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'backend.wsgi.application'
 
+# Serve the customer and order endpoints with the async views; enable when running under ASGI
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'False') == 'True'
+
 
 # Database
 # https://docs.djangoproject.com/en/4.0/ref/settings/#databases
@@ -97,9 +106,52 @@ DATABASES = {
         'PASSWORD': os.getenv('POSTGRES_PASSWORD'),
         'HOST': os.getenv('DATABASE_HOST'),
         'PORT': os.getenv('DATABASE_PORT'),
+        # Keep connections open between requests, and check them before reuse. Under ASGI
+        # (ASYNC_VIEWS) the default is 0, closing them after each request: async views run
+        # their queries on short-lived threads, each of which would hold a connection open
+        'CONN_MAX_AGE': int(os.getenv('DATABASE_CONN_MAX_AGE', '0' if ASYNC_VIEWS else '60')),
+        'CONN_HEALTH_CHECKS': os.getenv('DATABASE_CONN_HEALTH_CHECKS', 'True') == 'True',
+        # Server-side cursors do not survive PgBouncer's transaction pooling
+        'DISABLE_SERVER_SIDE_CURSORS': os.getenv('DATABASE_PGBOUNCER', 'False') == 'True',
+    }
+}
+
+# Read replicas: a comma-separated list of hosts, each added as a "replica_<n>" alias with the
+# primary's credentials. Tests mirror them to the primary.
+DATABASE_REPLICAS = []
+for _index, _host in enumerate(filter(None, os.getenv('DATABASE_REPLICA_HOSTS', '').split(',')), start=1):
+    DATABASES[f'replica_{_index}'] = {**DATABASES['default'], 'HOST': _host.strip(), 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(f'replica_{_index}')
+
+DATABASE_ROUTERS = ['main_app.routers.ReplicaRouter']
+# Seconds a client keeps reading the primary after a write; should exceed the replication lag
+DATABASE_REPLICA_PIN_SECONDS = int(os.getenv('DATABASE_REPLICA_PIN_SECONDS', '5'))
+# CACHES alias recording which users have just written, for clients without the pin cookie;
+# it must be shared by every worker (Redis or Memcached) for the pin to hold across them
+DATABASE_REPLICA_PIN_CACHE_ALIAS = os.getenv('DATABASE_REPLICA_PIN_CACHE_ALIAS', 'default')
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
     }
 }
 
+# Customer lookup cache: per-process LRU in front of the CACHES alias below
+CUSTOMER_CACHE_ALIAS = os.getenv('CUSTOMER_CACHE_ALIAS', 'default')
+CUSTOMER_CACHE_SIZE = int(os.getenv('CUSTOMER_CACHE_SIZE', '10000'))
+CUSTOMER_CACHE_LOCAL_TTL = float(os.getenv('CUSTOMER_CACHE_LOCAL_TTL', '5'))
+CUSTOMER_CACHE_TTL = int(os.getenv('CUSTOMER_CACHE_TTL', '300'))
+
+# API users are checked against a per-process copy of their row; deactivation takes effect
+# in every process within AUTH_USER_CACHE_TTL seconds
+AUTH_USER_CACHE_TTL = float(os.getenv('AUTH_USER_CACHE_TTL', '30'))
+AUTH_USER_CACHE_SIZE = int(os.getenv('AUTH_USER_CACHE_SIZE', '10000'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
@@ -144,11 +196,21 @@ CORS_ALLOW_CREDENTIALS = True
 # REST Framework settings for JWT authentication
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'main_app.authentication.ClaimsJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    # DRF's JSON renderer and parser, encoding and decoding with orjson when it is installed
+    'DEFAULT_RENDERER_CLASSES': (
+        'main_app.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'main_app.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
 }
 
 SIMPLE_JWT = {
@@ -156,6 +218,79 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
 }
 
+# Seconds a POST's Idempotency-Key and stored response are kept, and after which a claimed
+# key whose request never finished may be claimed again (longer than any request runs)
+IDEMPOTENCY_KEY_TTL = int(os.getenv('IDEMPOTENCY_KEY_TTL', '86400'))
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv('IDEMPOTENCY_LOCK_SECONDS', '60'))
+
+# Page sizes for the keyset-paginated list endpoints
+LIST_PAGE_SIZE = int(os.getenv('LIST_PAGE_SIZE', '50'))
+LIST_MAX_PAGE_SIZE = int(os.getenv('LIST_MAX_PAGE_SIZE', '500'))
+
+# Maximum number of days of per-day totals returned by the customer rollup endpoint
+ROLLUP_MAX_DAYS = int(os.getenv('ROLLUP_MAX_DAYS', '366'))
+
+# Rows counted at most by the admin changelist paginator; larger tables use an estimate
+ADMIN_COUNT_LIMIT = int(os.getenv('ADMIN_COUNT_LIMIT', '10000'))
+
+# Bulk order ingestion limits
+ORDER_BULK_MAX_ROWS = int(os.getenv('ORDER_BULK_MAX_ROWS', '10000'))
+ORDER_BULK_CHUNK_SIZE = int(os.getenv('ORDER_BULK_CHUNK_SIZE', '500'))
+
+# Order archival: orders older than ORDER_ARCHIVE_AFTER_DAYS, and inactive orders not created
+# in the last ORDER_ARCHIVE_INACTIVE_AFTER_DAYS, are moved to the archive in transactions of
+# ORDER_ARCHIVE_BATCH_SIZE orders, ORDER_ARCHIVE_BATCH_PAUSE seconds apart
+ORDER_ARCHIVE_AFTER_DAYS = int(os.getenv('ORDER_ARCHIVE_AFTER_DAYS', '365'))
+ORDER_ARCHIVE_INACTIVE_AFTER_DAYS = int(os.getenv('ORDER_ARCHIVE_INACTIVE_AFTER_DAYS', '30'))
+ORDER_ARCHIVE_BATCH_SIZE = int(os.getenv('ORDER_ARCHIVE_BATCH_SIZE', '1000'))
+ORDER_ARCHIVE_BATCH_PAUSE = float(os.getenv('ORDER_ARCHIVE_BATCH_PAUSE', '0.1'))
+
+# Customer search: default and maximum number of results, the trigram similarity a fuzzy match
+# needs (0 to 1), and seconds after which the in-memory index used without PostgreSQL is rebuilt
+CUSTOMER_SEARCH_LIMIT = int(os.getenv('CUSTOMER_SEARCH_LIMIT', '10'))
+CUSTOMER_SEARCH_MAX_LIMIT = int(os.getenv('CUSTOMER_SEARCH_MAX_LIMIT', '50'))
+CUSTOMER_SEARCH_MIN_SIMILARITY = float(os.getenv('CUSTOMER_SEARCH_MIN_SIMILARITY', '0.4'))
+CUSTOMER_SEARCH_INDEX_TTL = float(os.getenv('CUSTOMER_SEARCH_INDEX_TTL', '300'))
+
+# Order export: rows fetched from the database, and encoded into one chunk of the streamed
+# response, at a time
+ORDER_EXPORT_CHUNK_SIZE = int(os.getenv('ORDER_EXPORT_CHUNK_SIZE', '2000'))
+
+# Response compression: responses smaller than this many bytes are sent as they are, and the
+# brotli quality (0-11) trades compression time for size
+COMPRESSION_MIN_BYTES = int(os.getenv('COMPRESSION_MIN_BYTES', '1024'))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv('COMPRESSION_BROTLI_QUALITY', '4'))
+
+# Real-time order feed. The backend carries events between processes: the default reaches
+# this process's subscribers only, main_app.feed.PostgresFeedBackend reaches every process.
+# A subscriber more than ORDER_FEED_QUEUE_SIZE events behind is disconnected, a resume
+# replays at most ORDER_FEED_REPLAY_LIMIT orders per connection, a comment is sent after
+# ORDER_FEED_KEEPALIVE_SECONDS of silence, and a stream ends after ORDER_FEED_MAX_SECONDS
+# so clients reconnect (an ASGI server may not report a disconnected client before then)
+ORDER_FEED_BACKEND = os.getenv('ORDER_FEED_BACKEND', 'main_app.feed.LocalFeedBackend')
+ORDER_FEED_QUEUE_SIZE = int(os.getenv('ORDER_FEED_QUEUE_SIZE', '1000'))
+ORDER_FEED_REPLAY_LIMIT = int(os.getenv('ORDER_FEED_REPLAY_LIMIT', '5000'))
+ORDER_FEED_KEEPALIVE_SECONDS = float(os.getenv('ORDER_FEED_KEEPALIVE_SECONDS', '15'))
+ORDER_FEED_MAX_SECONDS = float(os.getenv('ORDER_FEED_MAX_SECONDS', '300'))
+ORDER_FEED_RECONNECT_SECONDS = float(os.getenv('ORDER_FEED_RECONNECT_SECONDS', '1'))
+# Lifetime of the feed tokens browsers pass in the feed's URL (?token=), which EventSource
+# reuses to reconnect; a client whose token expired gets a new one and a new EventSource
+ORDER_FEED_TOKEN_SECONDS = int(os.getenv('ORDER_FEED_TOKEN_SECONDS', '600'))
+
+# Customer import settings
+CUSTOMER_IMPORT_CHUNK_SIZE = int(os.getenv('CUSTOMER_IMPORT_CHUNK_SIZE', '1000'))
+# Number of rejected rows reported back in detail
+CUSTOMER_IMPORT_MAX_ERRORS = int(os.getenv('CUSTOMER_IMPORT_MAX_ERRORS', '100'))
+
+# Metrics endpoint. Worker processes share their metrics through files in METRICS_DIR
+# (empty: each process reports only its own), written at most every METRICS_FLUSH_INTERVAL seconds.
+# /metrics requires METRICS_TOKEN as a bearer token, or a staff user; METRICS_PUBLIC=True
+# serves it to anyone, for networks where only the scraper can reach it.
+METRICS_DIR = os.getenv('METRICS_DIR', '')
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '5'))
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+METRICS_PUBLIC = os.getenv('METRICS_PUBLIC', 'False') == 'True'
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/4.0/howto/static-files/
 
@@ -166,8 +301,40 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
-AFRICAS_TALKING_USERNAME = str(os.getenv('AFRICAS_TALKING_USERNAME'))
-AFRICAS_TALKING_API_KEY = str(os.getenv('AFRICAS_TALKING_API_KEY'))
+# Africa's Talking credentials. The SDK is initialised on the first send, which fails with
+# ImproperlyConfigured while either is empty
+AFRICAS_TALKING_USERNAME = os.getenv('AFRICAS_TALKING_USERNAME', '')
+AFRICAS_TALKING_API_KEY = os.getenv('AFRICAS_TALKING_API_KEY', '')
+
+# SMS gateway backend and outbox dispatcher settings
+SMS_BACKEND = os.getenv('SMS_BACKEND', 'main_app.utils.AfricasTalkingBackend')
+# Recipient of the order confirmation SMS
+ORDER_SMS_RECIPIENT = os.getenv('ORDER_SMS_RECIPIENT', '+254704205757')
+SMS_OUTBOX_BATCH_SIZE = int(os.getenv('SMS_OUTBOX_BATCH_SIZE', '100'))
+SMS_OUTBOX_POLL_INTERVAL = float(os.getenv('SMS_OUTBOX_POLL_INTERVAL', '1'))
+SMS_OUTBOX_MAX_ATTEMPTS = int(os.getenv('SMS_OUTBOX_MAX_ATTEMPTS', '5'))
+SMS_OUTBOX_RETRY_BASE_SECONDS = int(os.getenv('SMS_OUTBOX_RETRY_BASE_SECONDS', '5'))
+SMS_OUTBOX_RETRY_MAX_SECONDS = int(os.getenv('SMS_OUTBOX_RETRY_MAX_SECONDS', '600'))
+# Claimed messages are leased for the batching window plus SMS_SEND_TIMEOUT per gateway call
+# the batch may need, plus SMS_OUTBOX_LEASE_SECONDS; a dispatcher that dies leaves them that long
+SMS_OUTBOX_LEASE_SECONDS = int(os.getenv('SMS_OUTBOX_LEASE_SECONDS', '60'))
+# Seconds the async SMS path waits for the gateway, and concurrent sends per dispatcher batch
+SMS_SEND_TIMEOUT = float(os.getenv('SMS_SEND_TIMEOUT', '10'))
+SMS_OUTBOX_CONCURRENCY = int(os.getenv('SMS_OUTBOX_CONCURRENCY', '10'))
+# SMS gateway circuit breaker: consecutive failures that open it, and seconds before it lets
+# a probe through. SMS_BREAKER_FALLBACK is what the dispatcher does with a message it cannot
+# send while the breaker is open: 'defer' reschedules it without using up an attempt, 'retry'
+# counts it as a failed attempt. SMS_GATEWAY_THREADS bounds the concurrent blocking gateway calls.
+SMS_BREAKER_FAILURE_THRESHOLD = int(os.getenv('SMS_BREAKER_FAILURE_THRESHOLD', '5'))
+SMS_BREAKER_RESET_SECONDS = float(os.getenv('SMS_BREAKER_RESET_SECONDS', '30'))
+SMS_BREAKER_FALLBACK = os.getenv('SMS_BREAKER_FALLBACK', 'defer')
+SMS_GATEWAY_THREADS = int(os.getenv('SMS_GATEWAY_THREADS', '4'))
+# Recipients per gateway call for messages with identical bodies, and seconds the dispatcher
+# waits for more messages when fewer than a batch are due
+SMS_BATCH_MAX_RECIPIENTS = int(os.getenv('SMS_BATCH_MAX_RECIPIENTS', '100'))
+SMS_BATCH_WINDOW = float(os.getenv('SMS_BATCH_WINDOW', '0.25'))
+# Response time of main_app.utils.FakeLatencyBackend, in seconds
+SMS_FAKE_LATENCY = float(os.getenv('SMS_FAKE_LATENCY', '0.2'))
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.0/ref/settings/#default-auto-field
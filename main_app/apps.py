@@ -16,3 +16,18 @@ class MainAppConfig(AppConfig):
         """
         # Import signals to ensure they are registered
         import main_app.signals  # noqa: F401, C0415
+        from main_app import metrics  # pylint: disable=C0415
+        from main_app.authentication import user_cache  # pylint: disable=C0415
+        from main_app.cache import customer_cache  # pylint: disable=C0415
+
+        @metrics.registry.register_collector
+        def cache_stats():
+            """
+            Report the customer and authentication cache counters and sizes of this process.
+            """
+            for prefix, stats in (('customer_cache', customer_cache.stats()), ('auth_user_cache', user_cache.stats())):
+                for name, value in stats.items():
+                    if name.endswith('size'):
+                        yield f"{prefix}_{name}", "Entries in the per-process cache.", 'gauge', {}, value
+                    else:
+                        yield f"{prefix}_{name}_total", "Per-process cache counter.", 'counter', {}, value
@@ -0,0 +1,159 @@
+"""
+Order archival for the MainApp Django application.
+
+Orders older than settings.ORDER_ARCHIVE_AFTER_DAYS, and inactive orders not created in the
+last settings.ORDER_ARCHIVE_INACTIVE_AFTER_DAYS, are moved from the Order table to OrderArchive,
+so the Order table and its indexes only hold the orders that are still being read and written.
+The list endpoints read the Order table unless they are asked for archived orders.
+
+Orders are moved in batches, each in its own short transaction. A batch's orders are locked
+with ``SELECT ... FOR UPDATE SKIP LOCKED``, so the archiver never waits for a request that is
+updating one of them, and a request waits at most for one batch. Orders are deleted without
+the Order signal handlers, so they keep counting in the customer rollups; SMS outbox entries
+keep their message and lose the link to the order, as they would if it were deleted.
+
+On PostgreSQL OrderArchive is partitioned by month of the order's timestamp, and the partitions
+a batch needs are created before it is inserted.
+
+- archive_cutoffs: The creation times before which orders, and inactive orders, are archived.
+- archivable_orders: The orders the archiver moves.
+- ensure_partitions: Creates the monthly archive partitions for a set of timestamps.
+- archive_batch: Moves one batch of orders to the archive.
+- archive_orders: Moves batches until no archivable orders are left.
+"""
+
+
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Order, OrderArchive, OutboundSms
+
+ARCHIVED_FIELDS = ['id', 'customer_id', 'item', 'amount', 'active', 'timestamp', 'updated', 'slug']
+
+
+def archive_cutoffs(now=None):
+    """
+    Return the creation times before which orders, and inactive orders, are archived.
+    """
+    now = now or timezone.now()
+    return (
+        now - timedelta(days=settings.ORDER_ARCHIVE_AFTER_DAYS),
+        now - timedelta(days=settings.ORDER_ARCHIVE_INACTIVE_AFTER_DAYS),
+    )
+
+
+def archivable_orders(cutoff, inactive_cutoff):
+    """
+    Return the orders created before ``cutoff``, and the inactive ones created before ``inactive_cutoff``.
+
+    Each condition is served by an index on timestamp (the inactive one by a partial index).
+    """
+    return Order.objects.filter(Q(timestamp__lt=cutoff) | Q(active=False, timestamp__lt=inactive_cutoff))
+
+
+def _month_start(value):
+    value = value.astimezone(dt_timezone.utc)
+    return datetime(value.year, value.month, 1, tzinfo=dt_timezone.utc)
+
+
+def _next_month(month):
+    return datetime(month.year + month.month // 12, month.month % 12 + 1, 1, tzinfo=dt_timezone.utc)
+
+
+def ensure_partitions(timestamps):
+    """
+    Create the monthly OrderArchive partitions the given timestamps fall in, if they are missing.
+
+    Does nothing on databases other than PostgreSQL, where the archive is a plain table.
+
+    Returns:
+        The names of the partitions created.
+    """
+    if connection.vendor != 'postgresql':
+        return []
+    table = OrderArchive._meta.db_table
+    created = []
+    with connection.cursor() as cursor:
+        for month in sorted({_month_start(value) for value in timestamps}):
+            name = f"{table}_p{month:%Y%m}"
+            cursor.execute("SELECT to_regclass(%s)", [name])
+            if cursor.fetchone()[0] is not None:
+                continue
+            # Locks the parent table briefly, once per month archived
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {connection.ops.quote_name(name)} PARTITION OF "
+                f"{connection.ops.quote_name(table)} "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_next_month(month).isoformat()}')"
+            )
+            created.append(name)
+    return created
+
+
+def archive_batch(cutoff, inactive_cutoff, batch_size):
+    """
+    Move up to ``batch_size`` archivable orders to the archive in one transaction.
+
+    Orders locked by another transaction are skipped; a later batch picks them up.
+
+    Returns:
+        The number of orders moved.
+    """
+    with transaction.atomic():
+        orders = list(
+            archivable_orders(cutoff, inactive_cutoff).select_for_update(skip_locked=True)
+            .order_by()[:batch_size]
+        )
+        if not orders:
+            return 0
+        ensure_partitions(order.timestamp for order in orders)
+        archived_at = timezone.now()
+        OrderArchive.objects.bulk_create([
+            OrderArchive(**{field: getattr(order, field) for field in ARCHIVED_FIELDS}, archived_at=archived_at)
+            for order in orders
+        ])
+        ids = [order.pk for order in orders]
+        OutboundSms.objects.filter(order_id__in=ids).update(order=None)
+        # Deleted in SQL rather than through the ORM, which would send the post_delete signals
+        # that take the orders out of the rollups
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {connection.ops.quote_name(Order._meta.db_table)} "
+                f"WHERE {connection.ops.quote_name(Order._meta.pk.column)} IN ({', '.join(['%s'] * len(ids))})",
+                ids,
+            )
+    return len(orders)
+
+
+def archive_orders(batch_size=None, pause=None, max_batches=None, now=None):
+    """
+    Move archivable orders to the archive, batch by batch, until none are left.
+
+    Args:
+        batch_size: Orders per transaction (default settings.ORDER_ARCHIVE_BATCH_SIZE).
+        pause: Seconds to sleep between batches, to let replicas and other writers keep up
+            (default settings.ORDER_ARCHIVE_BATCH_PAUSE).
+        max_batches: Stop after this many batches.
+        now: The time the cutoffs are computed from (default: now).
+
+    Returns:
+        A tuple ``(orders, batches)``: the number of orders moved and of batches run.
+    """
+    batch_size = batch_size or settings.ORDER_ARCHIVE_BATCH_SIZE
+    pause = settings.ORDER_ARCHIVE_BATCH_PAUSE if pause is None else pause
+    cutoff, inactive_cutoff = archive_cutoffs(now)
+    moved = batches = 0
+    while max_batches is None or batches < max_batches:
+        count = archive_batch(cutoff, inactive_cutoff, batch_size)
+        if not count:
+            break
+        moved += count
+        batches += 1
+        if count < batch_size:
+            break
+        time.sleep(pause)
+    return moved, batches
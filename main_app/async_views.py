@@ -0,0 +1,269 @@
+"""
+Async view functions for the MainApp Django application.
+
+These views serve the customer and order endpoints in place of customer_view and order_view
+when settings.ASYNC_VIEWS is enabled and the project runs under ASGI (for example with
+``gunicorn -k uvicorn.workers.UvicornWorker backend.asgi:application``). A request waiting on
+the database then holds no worker thread, so one process can keep hundreds of requests in flight.
+
+They accept and return the same JSON as the DRF views. Lists are read with the async ORM;
+Django has no async transactions yet, so validation and writes run in a worker thread
+through sync_to_async. POSTs honour an Idempotency-Key header like the DRF views.
+
+- async_customer_view: Async version of customer_view.
+- async_order_view: Async version of order_view.
+- order_feed_view: Streams orders as they are committed, as server-sent events; ASGI only.
+- order_feed_token_view: Issues the feed tokens browsers pass to order_feed_view in its URL.
+"""
+
+
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import router
+from django.http import HttpResponse, StreamingHttpResponse
+from rest_framework import status
+from rest_framework.exceptions import (
+    APIException,
+    AuthenticationFailed,
+    MethodNotAllowed,
+    NotAuthenticated,
+    ParseError,
+    UnsupportedMediaType,
+    ValidationError,
+)
+from rest_framework.request import Request
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+from .authentication import ClaimsJWTAuthentication, FeedToken
+from .fast_serializers import FastCustomerSerializer, FastOrderListSerializer, FastOrderSerializer
+from .feed import order_event, order_feed
+from .filters import filter_customers, filter_orders, wants_archived
+from .idempotency import HEADER, REPLAYED_HEADER, fingerprint, run_once
+from .models import Customer, Order, OrderArchive
+from .pagination import KeysetPagination
+from .parsers import loads
+from .renderers import FastJSONRenderer
+from .views import save_order
+
+authenticator = ClaimsJWTAuthentication()
+FORM_MEDIA_TYPES = ('application/x-www-form-urlencoded', 'multipart/form-data')
+
+
+def _json_response(data, status_code=status.HTTP_200_OK):
+    # The DRF views' renderer rather than JsonResponse, so the output matches them byte for byte
+    content = FastJSONRenderer().render(data)
+    return HttpResponse(content, status=status_code, content_type='application/json')  # pylint: disable=R5102
+
+
+def _error_response(exc):
+    """
+    Return the response DRF's exception handler would give for an APIException.
+    """
+    data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+    response = _json_response(data, exc.status_code)
+    if isinstance(exc, (AuthenticationFailed, NotAuthenticated)):
+        response['WWW-Authenticate'] = authenticator.authenticate_header(None)
+    return response
+
+
+async def _authenticate(request, token_param=None):
+    """
+    Authenticate the request by its bearer token or, failing that, a FeedToken in the
+    ``token_param`` query parameter, when given.
+    """
+    result = await authenticator.aauthenticate(request)
+    if result is None and token_param and request.GET.get(token_param):
+        try:
+            token = FeedToken(request.GET[token_param])
+        except TokenError as e:
+            raise InvalidToken({'detail': str(e)}) from e
+        result = await authenticator.aauthenticate_token(token)
+    if result is None:
+        raise NotAuthenticated()
+    request.user, request.auth = result
+
+
+def _parse(request):
+    """
+    Return the request data from a JSON or form body.
+    """
+    if request.content_type in FORM_MEDIA_TYPES:
+        return request.POST
+    if request.content_type != 'application/json':
+        raise UnsupportedMediaType(request.content_type)
+    try:
+        return loads(request.body or b'{}')
+    except ValueError as e:
+        raise ParseError(f"JSON parse error - {e}") from e
+
+
+async def _list(request, queryset, filter_queryset, serializer_class):
+    api_request = Request(request)  # For query_params, as used by the filters and paginator
+    paginator = KeysetPagination()
+    page = await paginator.apaginate_queryset(filter_queryset(queryset, api_request.query_params), api_request)
+    return _json_response(paginator.get_paginated_data(serializer_class(page, many=True).data))
+
+
+async def _create(request, serializer_class, save):
+    """
+    Validate the request data and save it with ``save(serializer)`` in a worker thread.
+    """
+    data = _parse(request)
+
+    def validate_and_save():
+        serializer = serializer_class(data=data)
+        if not serializer.is_valid():
+            return status.HTTP_400_BAD_REQUEST, serializer.errors
+        try:
+            save(serializer)
+        except ValidationError as e:  # A unique constraint, checked by the INSERT
+            return status.HTTP_400_BAD_REQUEST, e.detail
+        return status.HTTP_201_CREATED, None
+
+    key, replayed = request.headers.get(HEADER), False
+    if key is None:
+        status_code, errors = await sync_to_async(validate_and_save)()
+    else:
+        request_fingerprint = fingerprint(request.method, request.path, data)
+        status_code, errors, replayed = await sync_to_async(run_once)(
+            request.user.pk, key, request.path, request_fingerprint, validate_and_save,
+        )
+    response = _json_response(errors, status_code) if errors else HttpResponse(status=status_code)
+    if replayed:
+        response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+async def async_customer_view(request):
+    """
+    Handle GET and POST requests for Customer.
+    """
+    try:
+        await _authenticate(request)
+        if request.method == 'GET':
+            return await _list(request, Customer.objects.all(), filter_customers, FastCustomerSerializer)
+        if request.method == 'POST':
+            return await _create(request, FastCustomerSerializer, lambda serializer: serializer.save())
+        raise MethodNotAllowed(request.method)
+    except APIException as e:
+        return _error_response(e)
+
+
+async def async_order_view(request):
+    """
+    Handle GET and POST requests for Order.
+
+    GET lists the current orders, or with ``archived=true`` the archived ones.
+    """
+    try:
+        await _authenticate(request)
+        if request.method == 'GET':
+            model = OrderArchive if wants_archived(request.GET) else Order
+            return await _list(request, model.objects.select_related('customer'), filter_orders, FastOrderListSerializer)
+        if request.method == 'POST':
+            return await _create(request, FastOrderSerializer, save_order)
+        raise MethodNotAllowed(request.method)
+    except APIException as e:
+        return _error_response(e)
+
+
+def _last_event_id(request):
+    """
+    Return the order id to resume after, from the Last-Event-ID header or ``after`` parameter.
+    """
+    value = request.headers.get('Last-Event-ID', request.GET.get('after'))
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except ValueError as e:
+        raise ValidationError({'after': ["A valid integer is required."]}) from e
+
+
+async def _feed_events(after):
+    """
+    Yield the feed's server-sent events: the orders after ``after``, if given, then new orders.
+    """
+    loop = asyncio.get_running_loop()
+    subscription = order_feed.subscribe()  # Before replaying, so no order falls in between
+    try:
+        replayed = set()
+        if after is not None:
+            # From the primary: a replica may not have the orders committed just before subscribing
+            orders = Order.objects.using(router.db_for_write(Order)).select_related('customer')
+            async for order in orders.filter(pk__gt=after).order_by('pk')[:settings.ORDER_FEED_REPLAY_LIMIT]:
+                replayed.add(order.pk)
+                yield order_event(order).frame
+            if len(replayed) >= settings.ORDER_FEED_REPLAY_LIMIT:
+                return  # The client reconnects from the last order and replays the next batch
+        deadline = loop.time() + settings.ORDER_FEED_MAX_SECONDS
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                event = await asyncio.wait_for(
+                    subscription.get(), min(settings.ORDER_FEED_KEEPALIVE_SECONDS, remaining),
+                )
+            except asyncio.TimeoutError:
+                yield b': keepalive\n\n'
+                continue
+            if event is None:
+                return  # Fell behind; the client resumes from the database
+            if event.id not in replayed:
+                yield event.frame
+    finally:
+        order_feed.unsubscribe(subscription)
+
+
+async def order_feed_view(request):
+    """
+    Handle GET requests streaming new Orders as server-sent events.
+
+    Each order is an ``order`` event whose id is the order id and whose data is the order as
+    in the order list. A client that reconnects with a Last-Event-ID header (as EventSource
+    does), or passes ``after=<order id>``, first gets the orders created after that one.
+    Orders are delivered as their transactions commit, so an order can follow one with a
+    higher id; a client resuming after the higher id does not get it.
+
+    Browsers' EventSource cannot send an Authorization header, so this endpoint alone also
+    accepts a FeedToken from order_feed_token_view as ``token=<feed token>``.
+
+    The stream needs the ASGI application: under WSGI it would hold a worker thread for as long
+    as it is open.
+    """
+    try:
+        await _authenticate(request, token_param='token')
+        if request.method != 'GET':
+            raise MethodNotAllowed(request.method)
+        after = _last_event_id(request)
+    except APIException as e:
+        return _error_response(e)
+    if not hasattr(request, 'scope'):
+        return _json_response(
+            {'detail': "The order feed is served by the ASGI application only."}, status.HTTP_501_NOT_IMPLEMENTED,
+        )
+    response = StreamingHttpResponse(_feed_events(after), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Tell nginx not to buffer the stream
+    return response
+
+
+async def order_feed_token_view(request):
+    """
+    Handle POST requests issuing a FeedToken for the authenticated user.
+    """
+    try:
+        await _authenticate(request)
+        if request.method != 'POST':
+            raise MethodNotAllowed(request.method)
+    except APIException as e:
+        return _error_response(e)
+    token = FeedToken.for_user(request.user.instance)
+    return _json_response({'token': str(token), 'expires_in': settings.ORDER_FEED_TOKEN_SECONDS})
+
+
+# Clients authenticate with a bearer token, not a session cookie
+async_customer_view.csrf_exempt = True
+async_order_view.csrf_exempt = True
+order_feed_view.csrf_exempt = True
+order_feed_token_view.csrf_exempt = True
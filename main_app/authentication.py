@@ -0,0 +1,220 @@
+"""
+Authentication classes for the MainApp Django application.
+
+Simple JWT's JWTAuthentication loads the User row on every request. ClaimsJWTAuthentication
+builds the request user from the token claims instead, and checks the account against a
+short-lived per-process copy of the row, so a user costs one query per process every
+settings.AUTH_USER_CACHE_TTL seconds rather than one per request. A deactivated or deleted
+user is rejected by every process within that TTL (immediately by the process that saved it).
+
+- UserCache: Per-process LRU of User rows with a TTL.
+- user_cache: The process-wide UserCache instance.
+- ClaimsUser: Lightweight request user backed by the token claims and the cached row.
+- ClaimsJWTAuthentication: JWT authentication that resolves users through the cache, with an
+    ``aauthenticate`` coroutine for the async views.
+- FeedToken: Short-lived token that authenticates the order feed only, passed in its URL by
+    browsers' EventSource, which cannot send an Authorization header.
+"""
+
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+
+class UserCache:
+    """
+    Per-process cache of User rows keyed by the token's user id.
+
+    Missing users are cached too, so a token for a deleted user does not query on every request.
+    """
+
+    def __init__(self):
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = dict.fromkeys(['hits', 'misses', 'invalidations'], 0)
+
+    def _get_local(self, user_id):
+        """
+        Return ``(found, user)`` for the given id from the unexpired entries.
+        """
+        with self._lock:
+            entry = self._local.get(user_id)
+            if entry is not None and entry[0] >= time.monotonic():
+                self._local.move_to_end(user_id)
+                self._stats['hits'] += 1
+                return True, entry[1]
+            self._stats['misses'] += 1
+            return False, None
+
+    def _set_local(self, user_id, user):
+        with self._lock:
+            self._local[user_id] = (time.monotonic() + settings.AUTH_USER_CACHE_TTL, user)
+            self._local.move_to_end(user_id)
+            while len(self._local) > settings.AUTH_USER_CACHE_SIZE:
+                self._local.popitem(last=False)
+
+    @staticmethod
+    def _queryset(user_id):
+        return get_user_model().objects.filter(**{api_settings.USER_ID_FIELD: user_id})
+
+    def get(self, user_id):
+        """
+        Return the User with the given id, or None if it does not exist.
+        """
+        found, user = self._get_local(user_id)
+        if not found:
+            user = self._queryset(user_id).first()
+            self._set_local(user_id, user)
+        return user
+
+    async def aget(self, user_id):
+        """
+        Async version of ``get``, for async views.
+        """
+        found, user = self._get_local(user_id)
+        if not found:
+            user = await self._queryset(user_id).afirst()
+            self._set_local(user_id, user)
+        return user
+
+    def invalidate(self, *user_ids):
+        """
+        Drop the given users, so this process reloads them on their next request.
+        """
+        with self._lock:
+            for user_id in user_ids:
+                self._local.pop(user_id, None)
+            self._stats['invalidations'] += len(user_ids)
+
+    def clear(self):
+        """
+        Empty the cache and reset the counters.
+        """
+        with self._lock:
+            self._local.clear()
+            self._stats = dict.fromkeys(self._stats, 0)
+
+    def stats(self):
+        """
+        Return the hit/miss counters of this process along with the cache size.
+        """
+        with self._lock:
+            return {**self._stats, 'size': len(self._local)}
+
+
+user_cache = UserCache()
+
+
+class ClaimsUser(TokenUser):  # pylint: disable=W0223
+    """
+    Request user built from a validated token.
+
+    The id and username come from the token; the account flags come from the cached row,
+    which is also available as ``instance`` for code that needs the real model.
+    """
+
+    def __init__(self, token, user):
+        super().__init__(token)
+        self._user = user
+
+    @cached_property
+    def username(self):
+        return self._user.get_username()
+
+    @property
+    def is_active(self):
+        return self._user.is_active
+
+    @cached_property
+    def is_staff(self):
+        return self._user.is_staff
+
+    @cached_property
+    def is_superuser(self):
+        return self._user.is_superuser
+
+    @cached_property
+    def instance(self):
+        """
+        A private copy of the cached User row, at most settings.AUTH_USER_CACHE_TTL seconds old.
+        """
+        return copy.copy(self._user)
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that returns a ClaimsUser instead of loading the User row per request.
+
+    Rejects missing and inactive users with the same errors as JWTAuthentication.
+    """
+
+    @staticmethod
+    def _user_id(validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as exc:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from exc
+
+    @staticmethod
+    def _check_user(validated_token, user):
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+            api_settings.REVOKE_TOKEN_CLAIM
+        ) != get_md5_hash_password(user.password):
+            raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        return ClaimsUser(validated_token, user)
+
+    def get_user(self, validated_token):
+        return self._check_user(validated_token, user_cache.get(self._user_id(validated_token)))
+
+    async def aauthenticate(self, request):
+        """
+        Async version of ``authenticate``, taking a Django HttpRequest.
+
+        Returns:
+            A ``(user, token)`` tuple, or None if the request carries no bearer token.
+        """
+        header = self.get_header(request)
+        raw_token = None if header is None else self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        return await self.aauthenticate_token(self.get_validated_token(raw_token))
+
+    async def aauthenticate_token(self, validated_token):
+        """
+        Return the ``(user, token)`` tuple of a validated token, checking its user as ``aauthenticate`` does.
+        """
+        user = await user_cache.aget(self._user_id(validated_token))
+        return self._check_user(validated_token, user), validated_token
+
+
+class FeedToken(AccessToken):
+    """
+    Access token for the order feed only, valid for settings.ORDER_FEED_TOKEN_SECONDS.
+
+    Its own token type keeps it from authenticating any other endpoint, so the copies that
+    end up in server and proxy logs, with the feed's URL, expire quickly and grant little.
+    """
+    token_type = 'feed'
+
+    @property
+    def lifetime(self):
+        return timedelta(seconds=settings.ORDER_FEED_TOKEN_SECONDS)
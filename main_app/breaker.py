@@ -0,0 +1,148 @@
+"""
+Circuit breaker for calls to external services from the MainApp Django application.
+
+While a service is down, every call to it waits for its timeout. A breaker counts consecutive
+failed calls; after ``failure_threshold`` of them it opens and calls fail at once with
+CircuitOpenError for ``reset_timeout`` seconds. It then lets a single probe call through
+(half-open): success closes it again, failure re-opens it.
+
+The state is kept per process.
+
+- CircuitOpenError: Raised instead of calling the service while the breaker is open.
+- CircuitBreaker: The breaker; wrap calls in ``with breaker.guard():``.
+"""
+
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """
+    The breaker is open, so the call was not made.
+
+    ``retry_at`` is the time.time() after which a call may be attempted again.
+    """
+
+    def __init__(self, name, retry_at):
+        super().__init__(f"{name} circuit is open; not calling it until it recovers")
+        self.retry_at = retry_at
+
+
+class CircuitBreaker:  # pylint: disable=R0902
+    """
+    Thread-safe circuit breaker.
+
+    Exceptions listed in ``ignore`` (for example ValueError for a malformed request) say nothing
+    about the service's health and neither open nor close the breaker.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_threshold, reset_timeout, ignore=(), on_trip=None):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.ignore = ignore
+        self.on_trip = on_trip
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Close the breaker and clear its counters.
+        """
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._opened_at = 0.0
+            self._probing = False
+            self._stats = dict.fromkeys(['trips', 'rejected'], 0)
+
+    def _current_state(self):
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+        return self._state
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def before_call(self):
+        """
+        Claim permission for a call.
+
+        Raises:
+            CircuitOpenError: The breaker is open, or half-open with a probe already in flight.
+        """
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED or (state == self.HALF_OPEN and not self._probing):
+                self._probing = state == self.HALF_OPEN
+                return
+            self._stats['rejected'] += 1
+            remaining = max(self.reset_timeout - (time.monotonic() - self._opened_at), 0)
+        raise CircuitOpenError(self.name, time.time() + remaining)
+
+    def record_success(self):
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.warning("%s circuit closed", self.name)
+            self._state, self._failures, self._probing = self.CLOSED, 0, False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            tripped = self._state == self.HALF_OPEN or (
+                self._state == self.CLOSED and self._failures >= self.failure_threshold
+            )
+            if tripped:
+                self._state, self._opened_at = self.OPEN, time.monotonic()
+                self._stats['trips'] += 1
+        if tripped:
+            logger.warning("%s circuit opened after %s failures", self.name, self._failures)
+            if self.on_trip is not None:
+                self.on_trip(self)
+
+    def release(self):
+        """
+        End a call that neither succeeded nor failed in a way that reflects on the service.
+        """
+        with self._lock:
+            self._probing = False
+
+    @contextmanager
+    def guard(self):
+        """
+        Run the block as one call through the breaker.
+
+        Raises:
+            CircuitOpenError: The breaker is open; the block is not run.
+        """
+        self.before_call()
+        try:
+            yield
+        except self.ignore:
+            self.release()
+            raise
+        except Exception:
+            self.record_failure()
+            raise
+        except BaseException:  # Cancelled, so the service's health is unknown
+            self.release()
+            raise
+        self.record_success()
+
+    def stats(self):
+        """
+        Return the breaker's state, consecutive failures, trip count and rejected calls.
+        """
+        with self._lock:
+            return {'state': self._current_state(), 'failures': self._failures, **self._stats}
@@ -0,0 +1,70 @@
+"""
+Bulk write helpers for the MainApp Django application.
+
+- create_orders_in_bulk: Validates a list of order payloads and inserts the valid ones with
+    batched queries, returning per-row errors for the rest.
+"""
+
+
+from django.conf import settings
+from django.db import transaction
+
+from .fast_serializers import FastOrderSerializer
+from .feed import publish_orders
+from .models import Order, OutboundSms
+from .outbox import order_confirmation_message
+from .rollups import add_orders
+from .signals import assign_slugs
+
+
+def create_orders_in_bulk(rows, chunk_size=None):
+    """
+    Validate and insert a batch of orders.
+
+    The rows are validated together by FastOrderSerializer, with all referenced customers
+    loaded at once through the customer cache. Slugs are assigned to the whole batch in memory
+    and the orders (and their SMS notifications) are written with ``bulk_create`` in chunks,
+    inside one transaction. ``bulk_create`` skips the Order signals, so the customer rollups
+    are updated, and the orders published to the order feed, for the whole batch here.
+
+    Args:
+        rows: A list of order payloads, as accepted by OrderSerializer.
+        chunk_size: Number of rows per INSERT (default is settings.ORDER_BULK_CHUNK_SIZE).
+
+    Returns:
+        A tuple ``(orders, errors)`` where ``orders`` are the created Order instances and
+        ``errors`` is a list of ``{'index': ..., 'errors': ...}`` dicts for rejected rows.
+    """
+    chunk_size = chunk_size or settings.ORDER_BULK_CHUNK_SIZE
+    orders, errors, objects = [], [], []
+    for index, row in enumerate(rows):
+        if isinstance(row, dict):
+            objects.append((index, row))
+        else:
+            errors.append({'index': index, 'errors': {'non_field_errors': ["Expected an object."]}})
+    results = FastOrderSerializer().validate_rows([row for _, row in objects])
+    for (index, _), (validated_data, row_errors) in zip(objects, results):
+        if row_errors:
+            errors.append({'index': index, 'errors': row_errors})
+        else:
+            orders.append(Order(**validated_data))
+    errors.sort(key=lambda error: error['index'])
+
+    if orders:
+        with transaction.atomic():
+            assign_slugs(orders, Order)
+            Order.objects.bulk_create(orders, batch_size=chunk_size)
+            add_orders(orders)
+            publish_orders(orders)
+            OutboundSms.objects.bulk_create(
+                [
+                    OutboundSms(
+                        order=order if order.pk else None,
+                        phone_number=settings.ORDER_SMS_RECIPIENT,
+                        message=order_confirmation_message(order),
+                    )
+                    for order in orders
+                ],
+                batch_size=chunk_size,
+            )
+    return orders, errors
@@ -0,0 +1,150 @@
+"""
+Customer lookup cache for the MainApp Django application.
+
+Order writes resolve their customer by primary key on every request, and most orders come
+from a small set of customers. CustomerCache serves those lookups from a per-process LRU,
+backed by Django's cache framework (shared between processes when it is configured with
+a shared backend), and only queries the database on a miss in both tiers.
+
+Entries are invalidated on Customer save and delete. Other processes may keep serving their
+local copy for up to settings.CUSTOMER_CACHE_LOCAL_TTL seconds.
+
+- CustomerCache: The two-tier cache.
+- customer_cache: The process-wide CustomerCache instance.
+"""
+
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .models import Customer
+
+
+class CustomerCache:
+    """
+    Two-tier cache of Customer instances keyed by primary key.
+
+    Returned instances are copies, so callers may modify them freely.
+    """
+    key_prefix = 'main_app:customer:'
+
+    def __init__(self):
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = dict.fromkeys(['local_hits', 'shared_hits', 'misses', 'invalidations'], 0)
+
+    @property
+    def shared(self):
+        return caches[settings.CUSTOMER_CACHE_ALIAS]
+
+    def _key(self, pk):
+        return f"{self.key_prefix}{pk}"
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def _get_local(self, pk):
+        with self._lock:
+            entry = self._local.get(pk)
+            if entry is None:
+                return None
+            expires_at, customer = entry
+            if expires_at < time.monotonic():
+                del self._local[pk]
+                return None
+            self._local.move_to_end(pk)
+            self._stats['local_hits'] += 1
+            return customer
+
+    def _set_local(self, customer):
+        with self._lock:
+            self._local[customer.pk] = (time.monotonic() + settings.CUSTOMER_CACHE_LOCAL_TTL, customer)
+            self._local.move_to_end(customer.pk)
+            while len(self._local) > settings.CUSTOMER_CACHE_SIZE:
+                self._local.popitem(last=False)
+
+    def get_many(self, pks):
+        """
+        Return a dict of the Customers with the given primary keys that exist.
+
+        Keys missing from the local tier are fetched from the shared cache with one
+        ``get_many`` call, and the remaining ones from the database with one query.
+        """
+        found, missing = {}, []
+        for pk in set(pks):
+            customer = self._get_local(pk)
+            if customer is None:
+                missing.append(pk)
+            else:
+                found[pk] = customer
+
+        if missing:
+            shared = self.shared.get_many([self._key(pk) for pk in missing])
+            self._count('shared_hits', len(shared))
+            for customer in shared.values():
+                self._set_local(customer)
+                found[customer.pk] = customer
+            missing = [pk for pk in missing if self._key(pk) not in shared]
+
+        if missing:
+            self._count('misses', len(missing))
+            loaded = Customer.objects.in_bulk(missing)
+            if loaded:
+                self.shared.set_many(
+                    {self._key(pk): customer for pk, customer in loaded.items()},
+                    timeout=settings.CUSTOMER_CACHE_TTL,
+                )
+            for customer in loaded.values():
+                self._set_local(customer)
+            found.update(loaded)
+
+        return {pk: copy.copy(customer) for pk, customer in found.items()}
+
+    def get(self, pk):
+        """
+        Return the Customer with the given primary key, or None if it does not exist.
+        """
+        return self.get_many([pk]).get(pk)
+
+    def invalidate(self, *pks):
+        """
+        Drop the given customers from both tiers.
+        """
+        with self._lock:
+            for pk in pks:
+                self._local.pop(pk, None)
+        self.shared.delete_many([self._key(pk) for pk in pks])
+        self._count('invalidations', len(pks))
+
+    def invalidate_on_commit(self, *pks):
+        """
+        Drop the given customers now and again once the current transaction commits, so a
+        concurrent request cannot re-cache the old row in between.
+        """
+        self.invalidate(*pks)
+        transaction.on_commit(lambda: self.invalidate(*pks))
+
+    def clear(self):
+        """
+        Empty the local tier and reset the counters; the shared tier is left to expire.
+        """
+        with self._lock:
+            self._local.clear()
+            self._stats = dict.fromkeys(self._stats, 0)
+
+    def stats(self):
+        """
+        Return the hit/miss counters of this process along with the local tier's size.
+        """
+        with self._lock:
+            return {**self._stats, 'local_size': len(self._local)}
+
+
+customer_cache = CustomerCache()
@@ -0,0 +1,135 @@
+"""
+Order export for the MainApp Django application.
+
+Exports stream every order matching the list filters, current ones then archived ones, as CSV
+or NDJSON, with the customer's name and code joined in. Rows are read with
+``QuerySet.iterator(chunk_size=...)`` (a server-side cursor on PostgreSQL) as plain tuples and
+written out a chunk at a time, optionally through gzip, so memory use does not depend on the
+number of rows.
+
+- FORMATS: Supported export formats and their media types.
+- COLUMNS: The exported columns, in order.
+- export_querysets: Builds the current and archived order querysets for a set of filters.
+- iter_rows: Yields the exported rows of the querysets.
+- iter_chunks: Encodes rows as CSV or NDJSON, a chunk of rows per string.
+- gzip_chunks: Compresses a stream of strings into gzip bytes.
+- aiterate: Iterates a blocking iterator from async code, one item at a time.
+"""
+
+
+import csv
+import zlib
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import router
+
+from .filters import filter_orders
+from .models import Order, OrderArchive
+from .renderers import dumps
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+COLUMNS = [
+    'id', 'customer', 'customer_name', 'customer_code', 'item', 'amount', 'active', 'timestamp', 'slug', 'archived',
+]
+VALUES = ['id', 'customer_id', 'customer__name', 'customer__code', 'item', 'amount', 'active', 'timestamp', 'slug']
+
+
+def export_querysets(params):
+    """
+    Return the current and archived order querysets matching the ``customer``, ``active``,
+    ``since`` and ``until`` filters in ``params``, oldest first.
+
+    The database is chosen now rather than when the rows are read: a streamed response is
+    read after the view, and its middleware, have returned.
+
+    Raises:
+        ValidationError: A filter value is invalid.
+    """
+    return [
+        filter_orders(model.objects.using(router.db_for_read(model)), params)
+        .order_by('timestamp', 'id').values_list(*VALUES)
+        for model in (Order, OrderArchive)
+    ]
+
+
+def iter_rows(querysets, chunk_size=None):
+    """
+    Yield the rows of the export querysets as tuples in COLUMNS order, fetching ``chunk_size``
+    rows at a time (default settings.ORDER_EXPORT_CHUNK_SIZE).
+    """
+    chunk_size = chunk_size or settings.ORDER_EXPORT_CHUNK_SIZE
+    for archived, queryset in enumerate(querysets):
+        for row in queryset.iterator(chunk_size=chunk_size):
+            yield (*row, bool(archived))
+
+
+def _timestamp(value):
+    # The same representation as the API's datetimes
+    text = value.isoformat()
+    return text[:-6] + 'Z' if text.endswith('+00:00') else text
+
+
+def _bool(value):
+    return 'true' if value else 'false'
+
+
+class _Echo:
+    """
+    File-like object whose ``write`` returns what it is given, so a csv.writer returns its lines.
+    """
+
+    def write(self, value):
+        return value
+
+
+def iter_chunks(rows, fmt, rows_per_chunk=None):
+    """
+    Encode rows as CSV (with a header line) or NDJSON, yielding one string per
+    ``rows_per_chunk`` rows (default settings.ORDER_EXPORT_CHUNK_SIZE).
+    """
+    rows_per_chunk = rows_per_chunk or settings.ORDER_EXPORT_CHUNK_SIZE
+    rows = iter(rows)
+    if fmt == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(COLUMNS)
+        while chunk := list(islice(rows, rows_per_chunk)):
+            yield ''.join(
+                writer.writerow((*row[:6], _bool(row[6]), _timestamp(row[7]), row[8], _bool(row[9])))
+                for row in chunk
+            )
+        return
+    while chunk := list(islice(rows, rows_per_chunk)):
+        yield ''.join(
+            dumps(dict(zip(COLUMNS, (*row[:5], str(row[5]), row[6], _timestamp(row[7]), *row[8:])))).decode() + '\n'
+            for row in chunk
+        )
+
+
+def gzip_chunks(chunks, level=6):
+    """
+    Compress a stream of strings into gzip bytes, yielding output as it becomes available.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+async def aiterate(iterator):
+    """
+    Yield the items of a blocking iterator from async code, fetching each in the thread that
+    runs the request's synchronous code, so database reads keep using its connection.
+    """
+    iterator = iter(iterator)
+    fetch = sync_to_async(next, thread_sensitive=True)
+    sentinel = object()
+    while (item := await fetch(iterator, sentinel)) is not sentinel:
+        yield item
@@ -0,0 +1,292 @@
+"""
+Fast-path serializers for the MainApp Django application.
+
+A DRF ModelSerializer builds its fields again for every serializer instance: it introspects
+the model, constructs each field with its validators and deep-copies the declared fields,
+then validates and represents through ordered dicts. For a list page or a bulk payload that
+is most of the CPU time spent serializing.
+
+A FastSerializer mirrors a DRF serializer class. It builds that serializer's fields once per
+class and reuses them, and validates and represents directly into plain dicts. Validation runs
+the same fields with the same validators and error messages, so ``validated_data`` and
+``errors`` equal the DRF serializer's. Unique fields still validated by the serializer are checked
+with one query per field for a whole batch of rows instead of one query per row; constraint-first
+serializers leave them to the database when saving, as the DRF serializer does. Only flat fields
+are supported, and ``save`` only creates instances; updates and partial validation go through the
+DRF serializers.
+
+- customer_ids: The customer primary keys referenced by a batch of order payloads.
+- FastSerializer: Base class; ``serializer_class`` names the DRF serializer it mirrors.
+- FastCustomerSerializer: Mirrors CustomerSerializer.
+- FastOrderSerializer: Mirrors OrderSerializer; a batch's customers are loaded with one cache lookup.
+- FastOrderListSerializer: Mirrors OrderListSerializer.
+"""
+
+
+from collections.abc import Mapping
+from operator import attrgetter
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError
+from rest_framework.exceptions import ErrorDetail, ValidationError
+from rest_framework.fields import SkipField, empty, get_error_detail
+from rest_framework.relations import RelatedField
+from rest_framework.serializers import ListSerializer, Serializer, as_serializer_error
+from rest_framework.settings import api_settings
+from rest_framework.validators import UniqueValidator
+
+from .cache import customer_cache
+from .serializers import ConstraintFirstMixin, CustomerSerializer, OrderListSerializer, OrderSerializer
+
+
+def customer_ids(rows):
+    """
+    Collect the customer primary keys referenced by the given rows, ignoring malformed values.
+    """
+    ids = set()
+    for row in rows:
+        if not isinstance(row, Mapping) or isinstance(row.get('customer'), bool):
+            continue
+        try:
+            ids.add(int(row.get('customer')))
+        except (TypeError, ValueError):
+            continue  # Reported as a validation error for the row
+    return ids
+
+
+class _Compiled:
+    """
+    The fields of one DRF serializer class, prepared for validation and representation.
+    """
+
+    def __init__(self, serializer_class):
+        self.serializer = serializer_class()
+        self.model = serializer_class.Meta.model
+        fields = self.serializer.fields
+        self.field_names = list(fields)
+        self.writable = []  # (name, field)
+        self.unique = []  # (name, field, UniqueValidator), checked per batch
+        for field in self.serializer._writable_fields:  # pylint: disable=W0212
+            assert '.' not in field.source and field.source != '*', f"{field.field_name} is not a flat field"
+            for validator in list(field.validators):
+                if isinstance(validator, UniqueValidator) and validator.lookup == 'exact':
+                    field.validators.remove(validator)
+                    self.unique.append((field.field_name, field, validator))
+            self.writable.append((field.field_name, field))
+        readable = self.serializer._readable_fields  # pylint: disable=W0212
+        self.readable = [(field.field_name, *self._reader(field)) for field in readable]
+        # Serializer-level validators (unique_together) and validate() are rare; skip them when absent
+        self.validates_serializer = bool(self.serializer.validators) or (
+            type(self.serializer).validate is not Serializer.validate
+        )
+
+    def _reader(self, field):
+        """
+        Return the ``(get, represent)`` functions of a readable field.
+        """
+        try:
+            model_field = self.model._meta.get_field(field.source)  # pylint: disable=W0212
+        except FieldDoesNotExist:
+            model_field = None
+        if model_field is None or not model_field.concrete or '.' in field.source:
+            return field.get_attribute, field.to_representation
+        if isinstance(field, RelatedField):
+            if field.use_pk_only_optimization() and getattr(field, 'pk_field', None) is None:
+                return attrgetter(model_field.attname), lambda pk: pk
+            return field.get_attribute, field.to_representation
+        return attrgetter(model_field.attname), field.to_representation
+
+
+class FastSerializer:
+    """
+    Flat serializer that validates and represents with the prebuilt fields of ``serializer_class``.
+
+    It takes the same ``instance``, ``data``, ``many`` and ``context`` arguments and offers the
+    same ``is_valid``, ``errors``, ``validated_data``, ``save`` and ``data`` as a DRF serializer.
+    """
+    serializer_class = None
+
+    def __init__(self, instance=None, data=empty, many=False, context=None):
+        self.instance = instance
+        self.many = many
+        self.context = context or {}
+        if data is not empty:
+            self.initial_data = data
+        self._errors = self._validated_data = None
+
+    @classmethod
+    def compiled(cls):
+        # Built once per class; a race builds it twice, harmlessly
+        if '_compiled' not in cls.__dict__:
+            cls._compiled = _Compiled(cls.serializer_class)
+        return cls.__dict__['_compiled']
+
+    def get_lookups(self, rows):  # pylint: disable=W0613
+        """
+        Return a dict of related field name to a function resolving primary keys, for fields
+        whose instances are looked up for all ``rows`` at once rather than by the field per row.
+        """
+        return {}
+
+    def _validate_fields(self, compiled, data, lookups):
+        attrs, errors = {}, {}
+        for name, field in compiled.writable:
+            primitive = field.get_value(data)
+            try:
+                if name in lookups:
+                    is_empty, value = field.validate_empty_values(primitive)
+                    if not is_empty:
+                        value = field.resolve(value, lookups[name])
+                        field.run_validators(value)
+                else:
+                    value = field.run_validation(primitive)
+            except ValidationError as exc:
+                errors[name] = exc.detail
+            except DjangoValidationError as exc:
+                errors[name] = get_error_detail(exc)
+            except SkipField:
+                pass
+            else:
+                attrs[field.source] = value
+        return attrs, errors
+
+    def _check_unique(self, compiled, results):
+        """
+        Add a uniqueness error to each valid result whose unique field value already exists.
+        """
+        for name, field, validator in compiled.unique:
+            source = field.source
+            # Rows with errors in other fields are checked too, so they report every error
+            values = {attrs[source] for attrs, _ in results if attrs and attrs.get(source) is not None}
+            if not values:
+                continue
+            taken = set(validator.queryset.filter(**{f"{source}__in": values}).values_list(source, flat=True))
+            for attrs, errors in results:
+                if attrs and attrs.get(source) in taken:
+                    errors[name] = ValidationError(validator.message, code='unique').detail
+        # Report field errors in field order, as DRF does
+        return [
+            (attrs, {}) if not errors
+            else (None, errors) if attrs is None
+            else (None, {name: errors[name] for name in compiled.field_names if name in errors})
+            for attrs, errors in results
+        ]
+
+    def validate_rows(self, rows):
+        """
+        Validate a list of payloads.
+
+        Returns:
+            A list of ``(validated_data, errors)`` tuples, one per row, with ``validated_data``
+            None for invalid rows and ``errors`` empty for valid ones.
+        """
+        compiled = self.compiled()
+        lookups = self.get_lookups(rows)
+        results = []
+        for data in rows:
+            if data is None:
+                results.append((None, [ErrorDetail(compiled.serializer.error_messages['null'], code='null')]))
+            elif not isinstance(data, Mapping):
+                message = compiled.serializer.error_messages['invalid'].format(datatype=type(data).__name__)
+                results.append((None, {api_settings.NON_FIELD_ERRORS_KEY: [ErrorDetail(message, code='invalid')]}))
+            else:
+                results.append(self._validate_fields(compiled, data, lookups))
+        results = self._check_unique(compiled, results)
+        if compiled.validates_serializer:
+            results = [self._validate_serializer(compiled, *result) for result in results]
+        return results
+
+    @staticmethod
+    def _validate_serializer(compiled, attrs, errors):
+        if errors:
+            return attrs, errors
+        try:
+            compiled.serializer.run_validators(attrs)
+            return compiled.serializer.validate(attrs), {}
+        except (ValidationError, DjangoValidationError) as exc:
+            return None, as_serializer_error(exc)
+
+    def is_valid(self, *, raise_exception=False):
+        assert hasattr(self, 'initial_data'), "Pass data= to validate."
+        if self._errors is None:
+            if not self.many:
+                attrs, self._errors = self.validate_rows([self.initial_data])[0]
+                self._validated_data = attrs or {}
+                if isinstance(self._errors, list):  # As DRF reports a null payload
+                    self._errors = {api_settings.NON_FIELD_ERRORS_KEY: [ErrorDetail('No data provided', code='null')]}
+            elif not isinstance(self.initial_data, list):
+                message = ListSerializer.default_error_messages['not_a_list'].format(
+                    input_type=type(self.initial_data).__name__
+                )
+                self._validated_data = []
+                self._errors = {api_settings.NON_FIELD_ERRORS_KEY: [ErrorDetail(message, code='not_a_list')]}
+            else:
+                results = self.validate_rows(self.initial_data)
+                self._errors = [errors for _, errors in results] if any(errors for _, errors in results) else []
+                self._validated_data = [] if self._errors else [attrs for attrs, _ in results]
+        if self._errors and raise_exception:
+            raise ValidationError(self._errors)
+        return not self._errors
+
+    @property
+    def errors(self):
+        assert self._errors is not None, "Call is_valid() first."
+        return self._errors
+
+    @property
+    def validated_data(self):
+        assert self._validated_data is not None, "Call is_valid() first."
+        return self._validated_data
+
+    def save(self, **kwargs):
+        """
+        Create the instance, or with ``many`` the instances, from the validated data.
+
+        Raises:
+            ValidationError: The serializer is constraint-first and a unique field's value is taken.
+        """
+        assert self._errors is not None and not self._errors, "Call is_valid() first and check it passed."
+        serializer = self.compiled().serializer
+
+        def create(attrs):
+            if isinstance(serializer, ConstraintFirstMixin):
+                return serializer.write(lambda: serializer.create(attrs), attrs)
+            return serializer.create(attrs)
+
+        if self.many:
+            self.instance = [create({**attrs, **kwargs}) for attrs in self._validated_data]
+        else:
+            self.instance = create({**self._validated_data, **kwargs})
+        return self.instance
+
+    def to_representation(self, instance):
+        row = {}
+        for name, get, represent in self.compiled().readable:
+            try:
+                value = get(instance)
+            except SkipField:
+                continue
+            row[name] = None if value is None else represent(value)
+        return row
+
+    @property
+    def data(self):
+        if self.many:
+            return [self.to_representation(instance) for instance in self.instance]
+        return self.to_representation(self.instance)
+
+
+class FastCustomerSerializer(FastSerializer):
+    serializer_class = CustomerSerializer
+
+
+class FastOrderSerializer(FastSerializer):
+    serializer_class = OrderSerializer
+
+    def get_lookups(self, rows):
+        if len(rows) < 2:
+            return {}  # The field's own cache lookup
+        return {'customer': customer_cache.get_many(customer_ids(rows)).get}
+
+
+class FastOrderListSerializer(FastSerializer):
+    serializer_class = OrderListSerializer
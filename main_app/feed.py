@@ -0,0 +1,332 @@
+"""
+Real-time order feed for the MainApp Django application.
+
+Orders are published to the feed once the transaction that created them commits, and the
+/api/orders/feed/ endpoint streams them to subscribers as server-sent events. Each process
+fans events out to its own subscribers from memory; the backend named by
+settings.ORDER_FEED_BACKEND carries them between processes:
+
+- LocalFeedBackend (the default) delivers events to the publishing process's subscribers
+  only, which is enough for a single ASGI process, tests and local runs.
+- PostgresFeedBackend sends events with NOTIFY and has every process LISTEN for them, so the
+  subscribers of every worker receive the orders created by any worker or command.
+
+Each subscriber buffers at most settings.ORDER_FEED_QUEUE_SIZE events. One that falls further
+behind is disconnected after it has read those, instead of slowing the others down or
+buffering without limit; it reconnects with the last order id it saw and catches up from the
+database.
+
+- FeedEvent: One order, encoded once as JSON and as a server-sent event for all subscribers.
+- order_event: Builds the FeedEvent of an order.
+- Subscription: A subscriber's bounded queue of events.
+- OrderFeed: Fans events out to the subscriptions of this process, on their event loops.
+- LocalFeedBackend / PostgresFeedBackend: Carry published events to the subscribing processes.
+- order_feed: The process-wide OrderFeed.
+- publish_orders: Publishes orders to the feed once the current transaction commits.
+"""
+
+
+import asyncio
+import logging
+import select
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.utils.module_loading import import_string
+
+from .fast_serializers import FastOrderListSerializer
+from .metrics import ORDER_FEED_DROPPED, registry
+from .models import Order
+from .renderers import dumps
+
+logger = logging.getLogger(__name__)
+
+
+class FeedEvent:
+    """
+    An order on the feed: its id, its JSON representation and its server-sent event frame.
+    """
+    __slots__ = ('id', 'data', 'frame')
+
+    def __init__(self, pk, data):
+        self.id = pk
+        self.data = data
+        self.frame = f"id: {pk}\nevent: order\ndata: {data}\n\n".encode()
+
+
+def order_event(order):
+    """
+    Return the FeedEvent of an order, represented as in the order list.
+    """
+    return FeedEvent(order.pk, dumps(FastOrderListSerializer(order).data).decode())
+
+
+def _running_loop():
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+class Subscription:
+    """
+    A subscriber's queue of events, read with ``await get()`` on the loop that subscribed.
+    """
+
+    def __init__(self, feed, loop, maxsize):
+        self.feed = feed
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize)
+        self.dropped = False
+
+    def put(self, event):
+        """
+        Queue an event, or drop the subscription when its queue is full. Runs on its loop.
+
+        Returns:
+            False when the subscription is, or has just been, dropped.
+        """
+        if self.dropped:
+            return False
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.drop()
+            ORDER_FEED_DROPPED.inc()
+            return False
+        return True
+
+    def drop(self):
+        """
+        Stop delivering to this subscription; ``get`` returns None once the queued events are read.
+        """
+        self.dropped = True
+        self.feed.unsubscribe(self)
+        if self.queue.empty():
+            self.queue.put_nowait(None)  # Wakes a waiting get()
+
+    async def get(self):
+        """
+        Return the next event, or None when the subscription has been dropped.
+        """
+        if self.dropped and self.queue.empty():
+            return None
+        return await self.queue.get()
+
+
+class OrderFeed:
+    """
+    Fans published events out to the subscriptions of this process.
+
+    Subscriptions are grouped by the event loop they were made on, and each loop's group is
+    fed by a single callback on that loop, so publishing from a request thread costs one
+    call_soon_threadsafe per loop rather than one per subscriber.
+    """
+
+    def __init__(self):
+        self._subscriptions = {}  # Event loop -> set of Subscription
+        self._lock = threading.Lock()
+        self._backend = None
+
+    @property
+    def backend(self):
+        with self._lock:
+            if self._backend is None:
+                self._backend = import_string(settings.ORDER_FEED_BACKEND)(self)
+            return self._backend
+
+    def subscribe(self, maxsize=None):
+        """
+        Subscribe the running event loop to the feed.
+
+        Args:
+            maxsize: Events buffered before the subscription is dropped (default is
+                settings.ORDER_FEED_QUEUE_SIZE).
+        """
+        loop = asyncio.get_running_loop()
+        subscription = Subscription(self, loop, maxsize or settings.ORDER_FEED_QUEUE_SIZE)
+        with self._lock:
+            self._subscriptions.setdefault(loop, set()).add(subscription)
+        self.backend.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.loop)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.loop]
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+    def publish(self, events):
+        """
+        Send events to the subscribers of every process, through the backend.
+        """
+        if events:
+            self.backend.publish(events)
+
+    def deliver(self, events):
+        """
+        Queue events for this process's subscribers. Safe to call from any thread.
+        """
+        with self._lock:
+            loops = list(self._subscriptions)
+        running = _running_loop()
+        for loop in loops:
+            if loop is running:
+                self._fanout(loop, events)
+                continue
+            try:
+                loop.call_soon_threadsafe(self._fanout, loop, events)
+            except RuntimeError:  # The loop has been closed
+                with self._lock:
+                    self._subscriptions.pop(loop, None)
+
+    def _fanout(self, loop, events):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(loop, ()))
+        for subscription in subscriptions:
+            for event in events:
+                if not subscription.put(event):
+                    break
+
+    def drop_all(self):
+        """
+        Drop every subscription, so subscribers reconnect and catch up from the database.
+        Safe to call from any thread.
+        """
+        with self._lock:
+            loops = list(self._subscriptions)
+        for loop in loops:
+            try:
+                loop.call_soon_threadsafe(self._drop_loop, loop)
+            except RuntimeError:  # The loop has been closed
+                with self._lock:
+                    self._subscriptions.pop(loop, None)
+
+    def _drop_loop(self, loop):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(loop, ()))
+        for subscription in subscriptions:
+            subscription.drop()
+
+
+class LocalFeedBackend:
+    """
+    Feed backend that delivers events to the subscribers of the publishing process only.
+    """
+    shared = False
+
+    def __init__(self, feed):
+        self.feed = feed
+
+    def start(self):
+        pass
+
+    def publish(self, events):
+        self.feed.deliver(events)
+
+
+class PostgresFeedBackend:
+    """
+    Feed backend that carries events between processes with PostgreSQL's LISTEN/NOTIFY.
+
+    Publishing sends the events in as few NOTIFYs as their size allows. A process starts
+    listening, on a connection of its own in a daemon thread, when it gets its first
+    subscriber. If that connection fails, the events sent meanwhile cannot be recovered,
+    so every subscriber of the process is dropped to catch up from the database, and the
+    thread reconnects after settings.ORDER_FEED_RECONNECT_SECONDS.
+    """
+    shared = True
+    channel = 'order_feed'
+    max_payload_bytes = 7900  # NOTIFY payloads must be shorter than 8000 bytes
+
+    def __init__(self, feed):
+        self.feed = feed
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.listen, name='order-feed-listener', daemon=True)
+                self._thread.start()
+
+    def payloads(self, events):
+        """
+        Yield NOTIFY payloads of ``<id> <json>`` lines, each within the payload size limit.
+        """
+        lines, size = [], 0
+        for event in events:
+            line = f"{event.id} {event.data}"
+            length = len(line.encode()) + 1
+            if lines and size + length > self.max_payload_bytes:
+                yield '\n'.join(lines)
+                lines, size = [], 0
+            lines.append(line)
+            size += length
+        if lines:
+            yield '\n'.join(lines)
+
+    def publish(self, events):
+        with connections[router.db_for_write(Order)].cursor() as cursor:
+            for payload in self.payloads(events):
+                cursor.execute("SELECT pg_notify(%s, %s)", [self.channel, payload])
+
+    def listen(self):
+        while True:
+            try:
+                self._listen()
+            except Exception:  # pylint: disable=W0718
+                logger.exception("Order feed listener failed; reconnecting")
+                self.feed.drop_all()
+                connections[router.db_for_write(Order)].close()
+                time.sleep(settings.ORDER_FEED_RECONNECT_SECONDS)
+
+    def _listen(self):
+        # Django's connections are per thread, so this is the listener's own connection
+        connection = connections[router.db_for_write(Order)]
+        with connection.cursor() as cursor:
+            cursor.execute(f"LISTEN {self.channel}")
+        raw = connection.connection
+        while True:
+            if select.select([raw], [], [], 5) == ([], [], []):
+                continue
+            raw.poll()
+            while raw.notifies:
+                payload = raw.notifies.pop(0).payload
+                self.feed.deliver([FeedEvent(int(pk), data) for pk, data in (
+                    line.split(' ', 1) for line in payload.split('\n')
+                )])
+
+
+order_feed = OrderFeed()
+
+
+def publish_orders(orders, using=None):
+    """
+    Publish newly created orders to the feed once the current transaction commits.
+
+    With the local backend and no subscribers in this process nothing is encoded.
+    """
+    orders = list(orders)
+
+    def publish():
+        if order_feed.backend.shared or order_feed.subscriber_count():
+            order_feed.publish([order_event(order) for order in orders])
+
+    transaction.on_commit(publish, using=using)
+
+
+@registry.register_collector
+def feed_subscribers():
+    """
+    Report the number of order feed subscribers of this process.
+    """
+    yield 'order_feed_subscribers', "Subscribers to the order feed.", 'gauge', {}, order_feed.subscriber_count()
@@ -0,0 +1,75 @@
+"""
+Query parameter filters for the MainApp list endpoints.
+
+- filter_customers: Applies the ``active``, ``since`` and ``until`` filters to a Customer queryset.
+- filter_orders: Applies the ``customer``, ``active``, ``since`` and ``until`` filters to an Order queryset.
+- wants_archived: Whether a list request asks for archived orders (``archived=true``).
+"""
+
+
+from django.utils.dateparse import parse_datetime
+from rest_framework import serializers
+
+
+def _parse(field, params, name):
+    """
+    Validate the ``name`` query parameter with a serializer field.
+
+    Returns:
+        The parsed value, or None if the parameter is absent.
+    """
+    if name not in params:
+        return None
+    try:
+        return field.run_validation(params[name])
+    except serializers.ValidationError as e:
+        raise serializers.ValidationError({name: e.detail}) from e
+
+
+def _parse_datetime(params, name):
+    if name not in params:
+        return None
+    try:
+        value = parse_datetime(params[name])
+    except ValueError:  # Well formed but impossible, such as February 30th
+        value = None
+    if value is None:
+        raise serializers.ValidationError({name: ["Expected an ISO 8601 datetime."]})
+    return value
+
+
+def _filter_common(queryset, params):
+    active = _parse(serializers.BooleanField(), params, 'active')
+    if active is not None:
+        queryset = queryset.filter(active=active)
+    since = _parse_datetime(params, 'since')
+    if since is not None:
+        queryset = queryset.filter(timestamp__gte=since)
+    until = _parse_datetime(params, 'until')
+    if until is not None:
+        queryset = queryset.filter(timestamp__lt=until)
+    return queryset
+
+
+def filter_customers(queryset, params):
+    """
+    Filter customers by ``active`` and by a ``since`` (inclusive) / ``until`` (exclusive) creation range.
+    """
+    return _filter_common(queryset, params)
+
+
+def filter_orders(queryset, params):
+    """
+    Filter orders by ``customer`` id, ``active`` and a ``since`` (inclusive) / ``until`` (exclusive) creation range.
+    """
+    customer = _parse(serializers.IntegerField(), params, 'customer')
+    if customer is not None:
+        queryset = queryset.filter(customer_id=customer)
+    return _filter_common(queryset, params)
+
+
+def wants_archived(params):
+    """
+    Return whether the ``archived`` query parameter asks for archived orders instead of current ones.
+    """
+    return bool(_parse(serializers.BooleanField(), params, 'archived'))
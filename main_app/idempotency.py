@@ -0,0 +1,203 @@
+"""
+Idempotency keys for the MainApp Django application.
+
+Clients that time out waiting for a POST retry it, and without a key each retry creates
+another customer or order and queues another SMS. A POST that carries an ``Idempotency-Key``
+header is executed at most once per user, endpoint and key; a retry with the same key gets the
+stored status and body back, with an ``Idempotent-Replayed: true`` header, without running the
+serializer, the writes or the SMS enqueue again.
+
+The first request claims the key by inserting an IdempotencyKey row in its own transaction,
+so a concurrent duplicate hits the unique constraint and gets 409 Conflict while the first is
+running. The view's writes and the stored response commit in one transaction: if the request
+fails or its process dies, nothing was written, and the key can be claimed again after
+settings.IDEMPOTENCY_LOCK_SECONDS. Keys expire after settings.IDEMPOTENCY_KEY_TTL seconds.
+
+- IdempotencyKeyInUse / IdempotencyKeyMismatch: Errors for a key that is in progress or that
+    was used with a different request.
+- fingerprint: Hashes a request's method, path and data.
+- run_once: Calls a handler at most once per key and returns its stored result on retries.
+- idempotent: Decorator applying run_once to the POSTs of a DRF function view.
+- purge_expired_keys: Deletes expired keys.
+"""
+
+
+import functools
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyKeyInUse(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "A request with this Idempotency-Key is still in progress."
+    default_code = 'idempotency_key_in_use'
+
+
+class IdempotencyKeyMismatch(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = "This Idempotency-Key was already used with a different request."
+    default_code = 'idempotency_key_mismatch'
+
+
+def fingerprint(method, path, data):
+    """
+    Return a SHA-256 hex digest identifying a request by its method, path and data.
+    """
+    payload = json.dumps([method, path, data], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _claim(user_id, endpoint, key, request_fingerprint):
+    """
+    Claim ``key`` for a new request, or find the stored response of an earlier one.
+
+    Returns:
+        A tuple ``(record, replay)``: the IdempotencyKey row, and whether it holds a stored response.
+
+    Raises:
+        IdempotencyKeyInUse: Another request holds the key.
+        IdempotencyKeyMismatch: The key was used with a different request.
+    """
+    for _ in range(3):
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(
+                    user_id=user_id, endpoint=endpoint, key=key, fingerprint=request_fingerprint, locked_at=now,
+                )
+            return record, False
+        except IntegrityError:
+            pass  # The key was claimed before
+
+        record = IdempotencyKey.objects.filter(user_id=user_id, endpoint=endpoint, key=key).first()
+        if record is None:
+            continue  # Purged in the meantime
+        if record.timestamp < now - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL):
+            IdempotencyKey.objects.filter(pk=record.pk, timestamp=record.timestamp).delete()
+            continue
+        if record.fingerprint != request_fingerprint:
+            raise IdempotencyKeyMismatch()
+        if record.response_status is not None:
+            return record, True
+        # A request that held the key this long has died; its writes were rolled back with it
+        stale = record.locked_at < now - timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS)
+        if stale and IdempotencyKey.objects.filter(
+            pk=record.pk, response_status__isnull=True, locked_at=record.locked_at
+        ).update(locked_at=now):
+            record.locked_at = now
+            return record, False
+        raise IdempotencyKeyInUse()
+    raise IdempotencyKeyInUse()
+
+
+def _release(record):
+    """
+    Delete a claim that has no stored response, so the request can be retried.
+    """
+    IdempotencyKey.objects.filter(pk=record.pk, response_status__isnull=True, locked_at=record.locked_at).delete()
+
+
+def run_once(user_id, key, endpoint, request_fingerprint, handler):
+    """
+    Call ``handler`` at most once for the user's ``key`` on ``endpoint``.
+
+    The handler runs in a transaction together with saving its result, so a result is only
+    stored if the handler's writes are committed. Server errors (5xx) are not stored, so the
+    request can be retried.
+
+    Args:
+        user_id: Primary key of the requesting user.
+        key: The Idempotency-Key header value.
+        endpoint: The endpoint the key is scoped to (the request path).
+        request_fingerprint: The request's fingerprint(); a retry must have the same one.
+        handler: Callable returning ``(status_code, data)``; ``data`` must be JSON-serialisable.
+
+    Returns:
+        A tuple ``(status_code, data, replayed)``.
+
+    Raises:
+        ValidationError: The key is empty or too long.
+        IdempotencyKeyInUse: Another request holds the key.
+        IdempotencyKeyMismatch: The key was used with a different request.
+    """
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise ValidationError({HEADER: [f"Expected 1 to {MAX_KEY_LENGTH} characters."]})
+    record, replay = _claim(user_id, endpoint, key, request_fingerprint)
+    if replay:
+        return record.response_status, record.response_data, True
+
+    try:
+        with transaction.atomic():
+            status_code, data = handler()
+            if status_code < 500:
+                # Store the result unless another request took the key over in the meantime,
+                # in which case this request's writes are rolled back
+                if not IdempotencyKey.objects.filter(
+                    pk=record.pk, response_status__isnull=True, locked_at=record.locked_at
+                ).update(response_status=status_code, response_data=data):
+                    raise IdempotencyKeyInUse()
+                return status_code, data, False
+    except IdempotencyKeyInUse:
+        raise
+    except BaseException:
+        _release(record)
+        raise
+    _release(record)
+    return status_code, data, False
+
+
+def idempotent(view):
+    """
+    Decorator making the POSTs of a DRF function view idempotent when they carry an Idempotency-Key.
+
+    Apply it below ``api_view`` and ``permission_classes``, so the request is authenticated first.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if request.method != 'POST' or key is None:
+            return view(request, *args, **kwargs)
+
+        responses = []
+
+        def handler():
+            response = view(request, *args, **kwargs)
+            responses.append(response)
+            return response.status_code, response.data
+
+        status_code, data, replayed = run_once(
+            request.user.pk, key, request.path, fingerprint(request.method, request.path, request.data), handler,
+        )
+        if not replayed:
+            return responses[0]
+        response = Response(data, status=status_code)
+        response[REPLAYED_HEADER] = 'true'
+        return response
+
+    return wrapper
+
+
+def purge_expired_keys():
+    """
+    Delete the keys older than settings.IDEMPOTENCY_KEY_TTL seconds.
+
+    Returns:
+        The number of keys deleted.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+    deleted, _ = IdempotencyKey.objects.filter(timestamp__lt=cutoff).delete()
+    return deleted
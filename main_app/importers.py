@@ -0,0 +1,135 @@
+"""
+Customer import for the MainApp Django application.
+
+Imports stream CSV or NDJSON input line by line and upsert customers on their unique code
+in fixed-size chunks, so memory use does not depend on the size of the file.
+
+- FORMATS: Supported import formats and their media types.
+- iter_rows: Decodes a binary stream into row dicts.
+- import_customers: Validates rows and upserts them in chunks, returning created/updated/rejected counts.
+"""
+
+
+import codecs
+import csv
+
+from django.conf import settings
+from django.db import transaction
+
+from .cache import customer_cache
+from .models import Customer
+from .parsers import loads
+from .serializers import CustomerImportSerializer
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def _iter_lines(stream):
+    """
+    Yield decoded text lines from a binary stream, without reading it all at once.
+    """
+    return codecs.iterdecode(iter(stream.readline, b''), 'utf-8-sig')
+
+
+def iter_rows(stream, fmt):
+    """
+    Yield ``(line_number, row)`` pairs from a binary CSV or NDJSON stream.
+
+    CSV input must start with a header row. Rows that cannot be decoded are yielded with
+    ``row`` set to None so they are counted as rejected.
+    """
+    lines = _iter_lines(stream)
+    if fmt == 'csv':
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = loads(line)
+        except ValueError:
+            row = None
+        yield line_number, row if isinstance(row, dict) else None
+
+
+def _upsert_chunk(chunk):
+    """
+    Upsert a chunk of validated rows keyed by code.
+
+    An existing customer is updated with the fields its row supplied only, so a file without
+    an ``active`` column (or with the cell left empty) keeps each customer's status; new
+    customers get the model defaults. Rows are upserted in groups supplying the same fields.
+
+    Returns:
+        A tuple ``(created, updated)``.
+    """
+    rows = {}
+    for data in chunk:
+        rows[data['code']] = {**rows.get(data['code'], {}), **data}  # Later rows win within a chunk
+    groups = {}
+    for data in rows.values():
+        groups.setdefault(frozenset(data), []).append(Customer(**data))
+    with transaction.atomic():
+        existing = list(Customer.objects.filter(code__in=list(rows)).values_list('pk', flat=True))
+        for fields, customers in groups.items():
+            Customer.objects.bulk_create(
+                customers,
+                update_conflicts=True,
+                unique_fields=['code'],
+                update_fields=sorted(fields - {'code'} | {'updated'}),
+            )
+        # The upsert bypasses the Customer signals
+        if existing:
+            customer_cache.invalidate_on_commit(*existing)
+    created = len(rows) - len(existing)
+    return created, len(chunk) - created
+
+
+def import_customers(stream, fmt, chunk_size=None):
+    """
+    Import customers from a CSV or NDJSON stream, creating new codes and updating existing ones.
+
+    Each chunk is written in its own transaction, so a failure part-way keeps earlier chunks.
+
+    Args:
+        stream: A binary file-like object with a ``readline`` method.
+        fmt: Either 'csv' or 'ndjson'.
+        chunk_size: Number of rows per upsert (default is settings.CUSTOMER_IMPORT_CHUNK_SIZE).
+
+    Returns:
+        A dict with ``created``, ``updated`` and ``rejected`` counts, and the ``errors`` of the
+        first rejected rows (at most settings.CUSTOMER_IMPORT_MAX_ERRORS).
+    """
+    chunk_size = chunk_size or settings.CUSTOMER_IMPORT_CHUNK_SIZE
+    result = {'created': 0, 'updated': 0, 'rejected': 0, 'errors': []}
+
+    def flush(chunk):
+        created, updated = _upsert_chunk(chunk)
+        result['created'] += created
+        result['updated'] += updated
+        chunk.clear()
+
+    chunk = []
+    for line_number, row in iter_rows(stream, fmt):
+        if row is None:
+            errors = {'non_field_errors': ["Invalid row."]}
+        else:
+            # Empty CSV cells mean "not provided"
+            serializer = CustomerImportSerializer(data={key: value for key, value in row.items() if value != ''})
+            if serializer.is_valid():
+                chunk.append(serializer.validated_data)
+                if len(chunk) >= chunk_size:
+                    flush(chunk)
+                continue
+            errors = serializer.errors
+        result['rejected'] += 1
+        if len(result['errors']) < settings.CUSTOMER_IMPORT_MAX_ERRORS:
+            result['errors'].append({'line': line_number, 'errors': errors})
+    if chunk:
+        flush(chunk)
+    return result
@@ -0,0 +1,349 @@
+"""
+Load-test harness for the MainApp API.
+
+A run seeds a user and some customers through the API, then sends a mix of signup, token,
+customer and order requests with a fixed concurrency, and summarises the latency, throughput
+and database queries of each kind of request. Requests go to the WSGI or ASGI application in
+process, or over HTTP to a running server.
+
+A request is a dict with a ``name`` (used to group results), ``method``, ``path``, ``data``
+and ``auth`` (whether to send the bearer token). Recorded mixes are JSON lines of such dicts,
+where "$customer" in the data stands for a random seeded customer id and "$tag" for the run's
+unique tag.
+
+- synthetic_requests: Generates a weighted random request mix.
+- load_requests / save_requests: Read and write request mixes as JSON lines.
+- WsgiTarget, AsgiTarget, HttpTarget: Send requests in process or over HTTP.
+- seed_data: Creates the load-test user and customers through the API.
+- counting_queries: Context manager counting the queries of each request.
+- run: Sends the requests and returns the samples and elapsed time.
+- summarize: Computes per-request-kind latency percentiles, throughput and queries.
+"""
+
+
+import asyncio
+import contextvars
+import itertools
+import json
+import math
+import queue
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from contextlib import contextmanager
+
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient, Client
+from django.urls import reverse
+
+ITEMS = ['Sugar', 'Tea', 'Coffee', 'Flour', 'Rice', 'Milk', 'Bread', 'Salt']
+DEFAULT_MIX = {'signup': 5, 'token': 5, 'customer': 20, 'order': 70}
+
+_query_count = contextvars.ContextVar('loadtest_query_count', default=None)
+
+
+def _count_query(execute, sql, params, many, context):
+    counter = _query_count.get()
+    if counter is not None:
+        counter[0] += 1
+    return execute(sql, params, many, context)
+
+
+def _install_query_counter(sender, connection, **kwargs):  # pylint: disable=W0613,W0621
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_query)
+
+
+@contextmanager
+def counting_queries():
+    """
+    Count the queries of each request sent by ``run``, in every connection opened inside the block.
+
+    Enter it before any request is sent: the worker threads of the ASGI handler keep their
+    connections, and only new connections get the counter.
+    """
+    connection_created.connect(_install_query_counter)
+    for conn in connections.all():
+        _install_query_counter(None, conn)
+    try:
+        yield
+    finally:
+        connection_created.disconnect(_install_query_counter)
+
+
+def synthetic_requests(count, context, mix=None, seed=None):
+    """
+    Yield ``count`` requests drawn from ``mix``, a dict of request kind to weight.
+
+    ``context`` provides the ``tag`` prefixing created names, the seeded ``username``
+    and ``password``, and the seeded ``customers`` ids.
+    """
+    mix = mix or DEFAULT_MIX
+    rng = random.Random(seed)
+    serial = itertools.count()
+    builders = {
+        'signup': lambda n: ('POST', reverse('signup'), {
+            'username': f"{context['tag']}-user-{n}", 'password': context['password'],
+            'email': f"{context['tag']}-{n}@example.com",
+        }, False),
+        'token': lambda n: ('POST', reverse('token_obtain_pair'), {
+            'username': context['username'], 'password': context['password'],
+        }, False),
+        'customer': lambda n: ('POST', reverse('customer_view'), {
+            'name': f"Load test customer {n}", 'code': f"{context['tag']}-{n}",
+        }, True),
+        'order': lambda n: ('POST', reverse('order_view'), {
+            'customer': rng.choice(context['customers']), 'item': rng.choice(ITEMS),
+            'amount': f"{rng.randrange(100, 100000) / 100:.2f}",
+        }, True),
+    }
+    names = list(mix)
+    for name in rng.choices(names, weights=[mix[name] for name in names], k=count):
+        method, path, data, auth = builders[name](next(serial))
+        yield {'name': name, 'method': method, 'path': path, 'data': data, 'auth': auth}
+
+
+def load_requests(path, context, seed=None):
+    """
+    Yield the requests recorded as JSON lines in ``path``, filling in the placeholders.
+    """
+    rng = random.Random(seed)
+    with open(path, encoding='utf-8') as recording:
+        for line in recording:
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            request['data'] = {
+                key: (
+                    rng.choice(context['customers']) if value == '$customer'
+                    else value.replace('$tag', context['tag']) if isinstance(value, str) else value
+                )
+                for key, value in (request.get('data') or {}).items()
+            }
+            yield request
+
+
+def save_requests(requests, path, context):
+    """
+    Write requests as JSON lines, so the same mix can be replayed later.
+
+    The run's tag and seeded customer ids are replaced with placeholders, as they differ
+    between runs.
+    """
+    customers = set(context['customers'])
+    with open(path, 'w', encoding='utf-8') as recording:
+        for request in requests:
+            data = {
+                key: (
+                    '$customer' if key == 'customer' and value in customers
+                    else value.replace(context['tag'], '$tag') if isinstance(value, str) else value
+                )
+                for key, value in request['data'].items()
+            }
+            recording.write(json.dumps({**request, 'data': data}) + '\n')
+
+
+class WsgiTarget:
+    """
+    Sends requests through the WSGI handler in process, one worker thread per concurrent request.
+    """
+    counts_queries = True
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def send(self, request, token):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = Client()
+        headers = {'Authorization': f"Bearer {token}"} if request['auth'] and token else {}
+        response = client.generic(
+            request['method'], request['path'], _body(request), content_type='application/json', headers=headers,
+        )
+        return response.status_code, response.content
+
+    def run(self, requests, concurrency, token):
+        pending = queue.Queue()
+        for request in requests:
+            pending.put(request)
+        samples, lock = [], threading.Lock()
+
+        def worker():
+            try:
+                while True:
+                    try:
+                        request = pending.get_nowait()
+                    except queue.Empty:
+                        return
+                    sample = _timed(lambda: self.send(request, token), request['name'])  # pylint: disable=W0640
+                    with lock:
+                        samples.append(sample)
+            finally:
+                connection.close()  # Each thread has its own connection
+
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return samples
+
+
+class AsgiTarget:
+    """
+    Sends requests through the ASGI handler in process, as tasks on one event loop.
+    """
+    counts_queries = True
+
+    async def asend(self, client, request, token):
+        headers = {'Authorization': f"Bearer {token}"} if request['auth'] and token else {}
+        response = await client.generic(
+            request['method'], request['path'], _body(request), content_type='application/json', headers=headers,
+        )
+        return response.status_code, response.content
+
+    def send(self, request, token):
+        return asyncio.run(self.asend(AsyncClient(), request, token))
+
+    def run(self, requests, concurrency, token):
+        async def run_all():
+            client, semaphore = AsyncClient(), asyncio.Semaphore(concurrency)
+
+            async def one(request):
+                async with semaphore:
+                    counter, started = [0], time.perf_counter()
+                    _query_count.set(counter)  # Each task has its own context
+                    status_code, _ = await self.asend(client, request, token)
+                    return request['name'], status_code, time.perf_counter() - started, counter[0]
+
+            return await asyncio.gather(*(one(request) for request in requests))
+
+        return list(asyncio.run(run_all()))
+
+
+class HttpTarget(WsgiTarget):
+    """
+    Sends requests over HTTP to a running server at ``base_url``. Queries are not counted.
+    """
+    counts_queries = False
+
+    def __init__(self, base_url):
+        super().__init__()
+        self.base_url = base_url.rstrip('/')
+
+    def send(self, request, token):
+        headers = {'Content-Type': 'application/json'}
+        if request['auth'] and token:
+            headers['Authorization'] = f"Bearer {token}"
+        http_request = urllib.request.Request(
+            self.base_url + request['path'], data=_body(request).encode() or None,
+            headers=headers, method=request['method'],
+        )
+        try:
+            with urllib.request.urlopen(http_request, timeout=30) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+
+def _body(request):
+    return json.dumps(request['data']) if request['method'] not in ('GET', 'HEAD') else ''
+
+
+def _timed(send, name):
+    """
+    Call ``send`` and return a ``(name, status, seconds, queries)`` sample.
+    """
+    counter = [0]
+    token = _query_count.set(counter)
+    try:
+        started = time.perf_counter()
+        status_code, _ = send()
+        return name, status_code, time.perf_counter() - started, counter[0]
+    finally:
+        _query_count.reset(token)
+
+
+def seed_data(target, context, customers):
+    """
+    Create the load-test user and ``customers`` customers through the API.
+
+    Fills in the context's ``token`` and ``customers`` ids.
+    """
+    signup = {'username': context['username'], 'password': context['password'], 'email': 'loadtest@example.com'}
+    target.send({'method': 'POST', 'path': reverse('signup'), 'data': signup, 'auth': False}, None)
+    credentials = {'username': context['username'], 'password': context['password']}
+    status_code, body = target.send(
+        {'method': 'POST', 'path': reverse('token_obtain_pair'), 'data': credentials, 'auth': False}, None
+    )
+    if status_code != 200:
+        raise RuntimeError(f"Could not obtain a token: {status_code} {body[:200]!r}")
+    context['token'] = json.loads(body)['access']
+
+    for n in range(customers):
+        data = {'name': f"Load test customer {n}", 'code': f"{context['tag']}-seed-{n}"}
+        target.send({'method': 'POST', 'path': reverse('customer_view'), 'data': data, 'auth': True}, context['token'])
+    # The create endpoint returns no body, so list the seeded customers back
+    ids, path = [], f"{reverse('customer_view')}?page_size={max(customers, 1)}"
+    status_code, body = target.send({'method': 'GET', 'path': path, 'data': {}, 'auth': True}, context['token'])
+    if status_code == 200:
+        ids = [row['id'] for row in json.loads(body)['results'] if row['code'].startswith(context['tag'])]
+    if not ids:
+        raise RuntimeError("Could not seed customers.")
+    context['customers'] = ids
+
+
+def run(target, requests, concurrency, token):
+    """
+    Send ``requests`` to ``target`` with ``concurrency`` requests in flight.
+
+    Returns:
+        A tuple ``(samples, elapsed)``: ``(name, status, seconds, queries)`` samples and the
+        wall-clock duration in seconds.
+    """
+    started = time.perf_counter()
+    samples = target.run(list(requests), concurrency, token)
+    return samples, time.perf_counter() - started
+
+
+def _percentile(ordered, percent):
+    """
+    Nearest-rank percentile of an ordered list.
+    """
+    return ordered[max(math.ceil(percent / 100 * len(ordered)) - 1, 0)]
+
+
+def summarize(samples, elapsed, counts_queries=True):
+    """
+    Summarise samples overall and per request kind.
+
+    Returns:
+        A dict with ``total`` and ``requests`` (per kind) entries, each with the request
+        ``count``, ``errors`` (status 400 and above), ``rps``, ``p50_ms``, ``p95_ms``, ``p99_ms``,
+        ``mean_ms`` and ``queries_per_request`` (None over HTTP).
+    """
+    def stats(group):
+        latencies = sorted(seconds * 1000 for _, _, seconds, _ in group)
+        return {
+            'count': len(group),
+            'errors': sum(1 for _, status_code, _, _ in group if status_code >= 400),
+            'rps': round(len(group) / elapsed, 2) if elapsed else None,
+            'p50_ms': round(_percentile(latencies, 50), 3),
+            'p95_ms': round(_percentile(latencies, 95), 3),
+            'p99_ms': round(_percentile(latencies, 99), 3),
+            'mean_ms': round(sum(latencies) / len(latencies), 3),
+            'queries_per_request': (
+                round(sum(queries for *_, queries in group) / len(group), 2) if counts_queries else None
+            ),
+        }
+
+    groups = {}
+    for sample in samples:
+        groups.setdefault(sample[0], []).append(sample)
+    return {
+        'total': stats(samples) if samples else None,
+        'requests': {name: stats(group) for name, group in sorted(groups.items())},
+    }
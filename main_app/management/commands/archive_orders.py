@@ -0,0 +1,37 @@
+"""
+Management command that moves old and inactive orders to the order archive.
+
+Run it periodically, for example nightly from cron:
+
+    python manage.py archive_orders
+    python manage.py archive_orders --batch-size 5000 --pause 0 --max-batches 100
+
+Each batch of orders is moved in its own short transaction; see main_app.archive.
+"""
+
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from main_app.archive import archive_orders
+
+
+class Command(BaseCommand):
+    help = "Move orders older than ORDER_ARCHIVE_AFTER_DAYS, and old inactive orders, to the archive."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.ORDER_ARCHIVE_BATCH_SIZE,
+            help="Orders moved per transaction.",
+        )
+        parser.add_argument(
+            '--pause', type=float, default=settings.ORDER_ARCHIVE_BATCH_PAUSE,
+            help="Seconds to sleep between batches.",
+        )
+        parser.add_argument('--max-batches', type=int, help="Stop after this many batches.")
+
+    def handle(self, *args, **options):
+        orders, batches = archive_orders(
+            batch_size=options['batch_size'], pause=options['pause'], max_batches=options['max_batches'],
+        )
+        self.stdout.write(f"archived={orders} batches={batches}")
@@ -0,0 +1,144 @@
+"""
+Management command that benchmarks order archival.
+
+It seeds N orders spread over two years, measures the latency of inserting an order and of
+the recent-order reads, archives the old and inactive orders, and measures them again. On
+PostgreSQL the orders are seeded with one INSERT ... SELECT per batch, so the table can be
+brought to tens of millions of rows. Everything happens in one transaction that is rolled
+back at the end.
+
+    python manage.py bench_archive --rows 200000
+    python manage.py bench_archive --rows 50000000 --batch-size 1000000   # PostgreSQL
+"""
+
+
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from main_app.archive import archive_orders
+from main_app.models import Customer, Order, OrderArchive
+
+SEED_SQL = """
+    INSERT INTO {table} (customer_id, item, amount, active, "timestamp", updated, slug)
+    SELECT
+        (%(customers)s::bigint[])[1 + floor(random() * %(count)s)::int],
+        'Item ' || (n %% 100),
+        (1 + floor(random() * 10000)) / 100,
+        random() < 0.2,
+        %(now)s - random() * interval '730 days',
+        %(now)s,
+        %(tag)s || n
+    FROM generate_series(%(start)s, %(end)s) AS n
+"""
+
+
+def bench_queries(context):
+    """
+    Return the recent-order reads to measure, as ``(label, queryset)`` pairs.
+    """
+    return [
+        ("recent orders page", Order.objects.filter(timestamp__gte=context['since']).order_by('-timestamp', '-id')[:50]),
+        ("active orders page", Order.objects.filter(active=True).order_by('-timestamp', '-id')[:50]),
+        ("customer recent history", Order.objects.filter(
+            customer_id=context['customer'], timestamp__gte=context['since'],
+        ).order_by('-timestamp')[:50]),
+    ]
+
+
+class Command(BaseCommand):
+    help = "Seed orders and compare insert and recent-read latency before and after archiving."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000, help="Number of orders to seed.")
+        parser.add_argument('--customers', type=int, default=1000, help="Number of customers to seed.")
+        parser.add_argument('--repeat', type=int, default=50, help="Runs per measurement; the median is reported.")
+        parser.add_argument('--batch-size', type=int, default=5000, help="Rows per INSERT while seeding.")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            context = self.seed(options)
+            before = self.measure(context, options['repeat'])
+
+            started = time.perf_counter()
+            archived, batches = archive_orders(batch_size=10000, pause=0)
+            elapsed = time.perf_counter() - started
+            self.analyze()
+            self.stdout.write(
+                f"Archived {archived} orders in {batches} batches ({elapsed:.1f}s); "
+                f"{Order.objects.count()} remain, {OrderArchive.objects.count()} archived."
+            )
+            after = self.measure(context, options['repeat'])
+
+            self.stdout.write(f"\n{'operation':<24} {'before ms':>10} {'after ms':>10} {'speedup':>8}")
+            for label, before_ms in before.items():
+                after_ms = after[label]
+                self.stdout.write(
+                    f"{label:<24} {before_ms:>10.3f} {after_ms:>10.3f} {before_ms / max(after_ms, 1e-6):>7.1f}x"
+                )
+            transaction.set_rollback(True)  # Drop the seeded and archived rows
+
+    def seed(self, options):
+        tag = time.time_ns()
+        now = timezone.now()
+        customers = Customer.objects.bulk_create(
+            [Customer(name=f"Customer {i}", code=f"bench-{tag}-{i}") for i in range(options['customers'])],
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write(f"Seeding {options['rows']} orders for {len(customers)} customers...")
+        rng = random.Random(tag)
+        created = 0
+        while created < options['rows']:
+            size = min(options['batch_size'], options['rows'] - created)
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute(SEED_SQL.format(table=Order._meta.db_table), {
+                        'customers': [customer.pk for customer in customers], 'count': len(customers),
+                        'now': now, 'tag': f"bench-{tag}-", 'start': created, 'end': created + size - 1,
+                    })
+            else:
+                orders = Order.objects.bulk_create([
+                    Order(
+                        customer=rng.choice(customers), item=f"Item {rng.randrange(100)}",
+                        amount=rng.randrange(1, 10000), active=rng.random() < 0.2,
+                        slug=f"bench-{tag}-{created + i}",
+                    )
+                    for i in range(size)
+                ])
+                # auto_now_add stamps every row with the current time; spread them over two years
+                for order in orders:
+                    order.timestamp = now - timedelta(seconds=rng.randrange(730 * 24 * 3600))
+                Order.objects.bulk_update(orders, ['timestamp'], batch_size=1000)
+            created += size
+        self.analyze()
+        return {'customer': customers[0].pk, 'customers': customers, 'since': now - timedelta(days=7)}
+
+    @staticmethod
+    def analyze():
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    @staticmethod
+    def timed(run, repeat):
+        runs = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            runs.append((time.perf_counter() - started) * 1000)
+        return statistics.median(runs)
+
+    def measure(self, context, repeat):
+        rng = random.Random(0)
+        timings = {
+            "insert order": self.timed(
+                lambda: Order.objects.create(customer=rng.choice(context['customers']), item="Bench", amount=1), repeat
+            ),
+        }
+        for label, queryset in bench_queries(context):
+            timings[label] = self.timed(lambda queryset=queryset: list(queryset.all()), repeat)
+        return timings
@@ -0,0 +1,103 @@
+"""
+Management command that load-tests the sync and async order views in process.
+
+It places the same number of orders through order_view the way the gunicorn sync setup serves
+them, each worker thread (``--threads``) handling one request at a time, and through
+async_order_view on a single event loop with up to ``--concurrency`` requests in flight, as one
+uvicorn worker would. For each it reports the throughput and latency percentiles.
+
+The requests go through the views directly, without the middleware. The rows they create are
+deleted at the end. Use PostgreSQL for more than one thread: SQLite locks the whole database
+on writes.
+
+    python manage.py bench_async --requests 2000 --concurrency 200
+"""
+
+
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import AsyncRequestFactory, RequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
+
+from main_app.async_views import async_order_view
+from main_app.models import Customer, OutboundSms
+from main_app.views import order_view
+
+
+class Command(BaseCommand):
+    help = "Compare order POST throughput and latency of the sync and async order views."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000, help="Number of orders placed per view.")
+        parser.add_argument('--threads', type=int, default=1, help="Worker threads serving the sync view.")
+        parser.add_argument('--concurrency', type=int, default=100, help="Requests in flight on the async view.")
+
+    def handle(self, *args, **options):
+        tag = time.time_ns()
+        user = get_user_model().objects.create_user(username=f"bench-async-{tag}")
+        customer = Customer.objects.create(name='Async benchmark', code=f"bench-async-{tag}")
+        headers = {'Authorization': f"Bearer {AccessToken.for_user(user)}"}
+        payload = {'customer': customer.pk, 'item': 'Tea', 'amount': '1.00'}
+        try:
+            self.stdout.write(f"{'view':<10} {'requests/s':>11} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+            self.report('sync', *self.run_sync(options, payload, headers))
+            self.report('async', *asyncio.run(self.run_async(options, payload, headers)))
+        finally:
+            OutboundSms.objects.filter(order__customer=customer).delete()
+            customer.delete()
+            user.delete()
+
+    @staticmethod
+    def run_sync(options, payload, headers):
+        factory = RequestFactory()
+        threads = options['threads']
+
+        def worker(count):
+            latencies = []
+            try:
+                for _ in range(count):
+                    started = time.perf_counter()
+                    request = factory.post('/api/orders/', payload, content_type='application/json', headers=headers)
+                    response = order_view(request)
+                    assert response.status_code == 201, response.data
+                    latencies.append(time.perf_counter() - started)
+            finally:
+                connection.close()  # Each thread has its own connection
+            return latencies
+
+        counts = [options['requests'] // threads + (i < options['requests'] % threads) for i in range(threads)]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(threads) as executor:
+            latencies = [latency for result in executor.map(worker, counts) for latency in result]
+        return latencies, time.perf_counter() - started
+
+    @staticmethod
+    async def run_async(options, payload, headers):
+        factory = AsyncRequestFactory()
+        semaphore = asyncio.Semaphore(options['concurrency'])
+
+        async def place_order():
+            async with semaphore:
+                started = time.perf_counter()
+                response = await async_order_view(
+                    factory.post('/api/orders/', payload, content_type='application/json', headers=headers)
+                )
+                assert response.status_code == 201, response.content
+                return time.perf_counter() - started
+
+        started = time.perf_counter()
+        latencies = await asyncio.gather(*(place_order() for _ in range(options['requests'])))
+        return latencies, time.perf_counter() - started
+
+    def report(self, label, latencies, elapsed):
+        percentiles = statistics.quantiles([latency * 1000 for latency in latencies], n=100)
+        self.stdout.write(
+            f"{label:<10} {len(latencies) / elapsed:>11.1f} "
+            f"{percentiles[49]:>8.2f} {percentiles[94]:>8.2f} {percentiles[98]:>8.2f}"
+        )
@@ -0,0 +1,68 @@
+"""
+Management command that benchmarks JWT request authentication.
+
+It issues an access token for a temporary user and sends the same authenticated GET to the
+customer list with Simple JWT's JWTAuthentication and with ClaimsJWTAuthentication, reporting
+the average number of queries and the average time per request for each. All rows are
+rolled back at the end.
+
+    python manage.py bench_auth --requests 2000
+"""
+
+
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import AccessToken
+
+from main_app.authentication import ClaimsJWTAuthentication, user_cache
+from main_app.views import customer_view
+
+AUTHENTICATORS = {
+    'JWTAuthentication': JWTAuthentication,
+    'ClaimsJWTAuthentication': ClaimsJWTAuthentication,
+}
+
+
+class Command(BaseCommand):
+    help = "Compare per-request queries and latency of database-backed and claims-based JWT authentication."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000, help="Number of requests per authenticator.")
+
+    def handle(self, *args, **options):
+        queries = [0]
+
+        def count_queries(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        view_class = customer_view.cls
+        original = view_class.authentication_classes
+        self.stdout.write(f"{'authenticator':<26} {'queries/request':>16} {'ms/request':>11}")
+        try:
+            with transaction.atomic(), connection.execute_wrapper(count_queries):
+                user = get_user_model().objects.create_user(username=f"bench-auth-{time.time_ns()}")
+                factory = APIRequestFactory()
+                header = f"Bearer {AccessToken.for_user(user)}"
+                for name, authenticator in AUTHENTICATORS.items():
+                    view_class.authentication_classes = [authenticator]
+                    user_cache.clear()
+                    customer_view(factory.get('/api/customers/', HTTP_AUTHORIZATION=header))  # Warm up
+                    queries[0] = 0
+                    started = time.perf_counter()
+                    for _ in range(options['requests']):
+                        response = customer_view(factory.get('/api/customers/', HTTP_AUTHORIZATION=header))
+                        assert response.status_code == 200, response.data
+                    elapsed = time.perf_counter() - started
+                    self.stdout.write(
+                        f"{name:<26} {queries[0] / options['requests']:>16.2f} "
+                        f"{elapsed * 1000 / options['requests']:>11.3f}"
+                    )
+                transaction.set_rollback(True)  # Leave the database as it was
+        finally:
+            view_class.authentication_classes = original
@@ -0,0 +1,88 @@
+"""
+Management command that benchmarks the fanout of the real-time order feed.
+
+For each number of subscribers it subscribes them on one event loop, as the feed endpoint's
+streams of one ASGI worker are, and publishes orders to the feed from another thread, as a
+request committing an order does. It reports the orders and deliveries per second, and the
+median and tail latency from publishing an order to a subscriber receiving it and to the last
+subscriber receiving it. Orders are built in memory and published through the configured
+backend; nothing is written to the database.
+
+    python manage.py bench_feed
+    python manage.py bench_feed --subscribers 1000 5000 --events 500 --interval 0.001
+"""
+
+
+import asyncio
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from main_app.feed import order_event, order_feed
+from main_app.models import Customer, Order
+
+
+class Command(BaseCommand):
+    help = "Measure order feed fanout latency and throughput with many subscribers."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subscribers', type=int, nargs='+', default=[1, 100, 1000], help="Subscribers per run.")
+        parser.add_argument('--events', type=int, default=200, help="Orders published per run.")
+        parser.add_argument('--interval', type=float, default=0.005, help="Seconds between published orders.")
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'subscribers':>11} {'orders/s':>9} {'deliveries/s':>13} "
+            f"{'p50 ms':>7} {'p99 ms':>7} {'last p50 ms':>12} {'last p99 ms':>12} {'last max ms':>12}"
+        )
+        for subscribers in options['subscribers']:
+            latencies, last, elapsed = asyncio.run(self.run(subscribers, options['events'], options['interval']))
+            delivery = statistics.quantiles(latencies, n=100)
+            fanout = statistics.quantiles(last, n=100)
+            self.stdout.write(
+                f"{subscribers:>11} {len(last) / elapsed:>9.0f} {len(latencies) / elapsed:>13.0f} "
+                f"{delivery[49]:>7.2f} {delivery[98]:>7.2f} {fanout[49]:>12.2f} {fanout[98]:>12.2f} {max(last):>12.2f}"
+            )
+
+    @staticmethod
+    async def run(subscribers, events, interval):
+        """
+        Publish ``events`` orders to ``subscribers`` subscriptions.
+
+        Returns:
+            A tuple ``(latencies, last, elapsed)``: the milliseconds from publishing to each
+            delivery, and to the last delivery of each order, and the seconds the run took.
+        """
+        subscriptions = [order_feed.subscribe(maxsize=events + 1) for _ in range(subscribers)]
+        published, latencies, last = {}, [], {}
+
+        async def consume(subscription):
+            for _ in range(events):
+                event = await subscription.get()
+                latency = (time.perf_counter() - published[event.id]) * 1000
+                latencies.append(latency)
+                last[event.id] = max(last.get(event.id, 0.0), latency)
+
+        customer = Customer(pk=1, name="Bench Customer", code="bench-feed")
+
+        def publish():
+            for pk in range(1, events + 1):
+                order = Order(
+                    pk=pk, customer=customer, item=f"Item {pk}", amount=Decimal(pk % 1000) + Decimal('0.99'),
+                    active=True, timestamp=timezone.now(), slug=f"bench-feed-{pk}",
+                )
+                event = order_event(order)
+                published[pk] = time.perf_counter()
+                order_feed.publish([event])
+                time.sleep(interval)
+
+        started = time.perf_counter()
+        try:
+            await asyncio.gather(asyncio.to_thread(publish), *[consume(subscription) for subscription in subscriptions])
+        finally:
+            for subscription in subscriptions:
+                order_feed.unsubscribe(subscription)
+        return latencies, list(last.values()), time.perf_counter() - started
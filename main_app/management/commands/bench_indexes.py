@@ -0,0 +1,136 @@
+"""
+Management command that benchmarks the Order and Customer indexes.
+
+It seeds N orders spread over a year and a set of customers, then runs the main read paths
+twice: first with the indexes as they were before the composite/partial indexes were added
+(only the foreign key index on customer), then with the indexes declared on the models.
+For each query it prints the query plan and the median time. Everything, including the
+index changes, happens in one transaction that is rolled back at the end.
+
+    python manage.py bench_indexes --rows 200000
+"""
+
+
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, models, transaction
+from django.utils import timezone
+
+from main_app.models import Customer, Order
+
+# The customer foreign key index that the composite index replaced
+LEGACY_INDEXES = {
+    Order: [models.Index(fields=['customer'], name='bench_order_customer_idx')],
+    Customer: [],
+}
+
+
+def bench_queries(context):
+    """
+    Return the read paths to measure, as ``(label, queryset)`` pairs.
+    """
+    return [
+        ("customer history", Order.objects.filter(customer_id=context['customer']).order_by('-timestamp')[:50]),
+        ("time range", Order.objects.filter(
+            timestamp__gte=context['since'], timestamp__lt=context['until']
+        ).order_by('-timestamp', '-id')[:50]),
+        ("active orders page", Order.objects.filter(active=True).order_by('-timestamp', '-id')[:50]),
+        ("slug lookup", Order.objects.filter(slug=context['slug'])),
+        ("active customers page", Customer.objects.filter(active=True).order_by('-timestamp', '-id')[:50]),
+    ]
+
+
+class Command(BaseCommand):
+    help = "Seed orders and compare query plans and timings with and without the access-path indexes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000, help="Number of orders to seed.")
+        parser.add_argument('--customers', type=int, default=1000, help="Number of customers to seed.")
+        parser.add_argument('--repeat', type=int, default=20, help="Runs per query; the median is reported.")
+        parser.add_argument('--batch-size', type=int, default=5000, help="Rows per INSERT while seeding.")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            context = self.seed(options)
+            editor = connection.schema_editor()
+
+            self.swap_indexes(editor, remove=Order._meta.indexes, add=LEGACY_INDEXES[Order], model=Order)
+            self.swap_indexes(editor, remove=Customer._meta.indexes, add=LEGACY_INDEXES[Customer], model=Customer)
+            before = self.measure("Before", context, options['repeat'])
+
+            self.swap_indexes(editor, remove=LEGACY_INDEXES[Order], add=Order._meta.indexes, model=Order)
+            self.swap_indexes(editor, remove=LEGACY_INDEXES[Customer], add=Customer._meta.indexes, model=Customer)
+            after = self.measure("After", context, options['repeat'])
+
+            self.stdout.write(f"\n{'query':<24} {'before ms':>10} {'after ms':>10} {'speedup':>8}")
+            for label, before_ms in before.items():
+                after_ms = after[label]
+                self.stdout.write(
+                    f"{label:<24} {before_ms:>10.3f} {after_ms:>10.3f} {before_ms / max(after_ms, 1e-6):>7.1f}x"
+                )
+            transaction.set_rollback(True)  # Drop the seeded rows and restore the indexes
+
+    def seed(self, options):
+        tag = time.time_ns()
+        now = timezone.now()
+        customers = Customer.objects.bulk_create(
+            [
+                Customer(name=f"Customer {i}", code=f"bench-{tag}-{i}", active=i % 10 != 0)
+                for i in range(options['customers'])
+            ],
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write(f"Seeding {options['rows']} orders for {len(customers)} customers...")
+        rng = random.Random(tag)
+        created = 0
+        while created < options['rows']:
+            size = min(options['batch_size'], options['rows'] - created)
+            orders = Order.objects.bulk_create([
+                Order(
+                    customer=rng.choice(customers),
+                    item=f"Item {rng.randrange(100)}",
+                    amount=rng.randrange(1, 10000),
+                    active=rng.random() < 0.2,  # Most orders are old and no longer active
+                    slug=f"bench-{tag}-{created + i}",
+                )
+                for i in range(size)
+            ])
+            # auto_now_add stamps every row with the current time; spread them over a year
+            for order in orders:
+                order.timestamp = now - timedelta(seconds=rng.randrange(365 * 24 * 3600))
+            Order.objects.bulk_update(orders, ['timestamp'], batch_size=1000)
+            created += size
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        return {
+            'customer': customers[0].pk,
+            'since': now - timedelta(days=30),
+            'until': now - timedelta(days=29),
+            'slug': f"bench-{tag}-{options['rows'] // 2}",
+        }
+
+    @staticmethod
+    def swap_indexes(editor, remove, add, model):
+        for index in remove:
+            editor.execute(index.remove_sql(model, editor))
+        for index in add:
+            editor.execute(index.create_sql(model, editor))
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def measure(self, title, context, repeat):
+        self.stdout.write(f"\n=== {title}")
+        timings = {}
+        for label, queryset in bench_queries(context):
+            self.stdout.write(f"\n--- {label}\n{queryset.explain()}")
+            runs = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                list(queryset.all())  # .all() bypasses the result cache
+                runs.append((time.perf_counter() - started) * 1000)
+            timings[label] = statistics.median(runs)
+        return timings
@@ -0,0 +1,114 @@
+"""
+Management command that benchmarks JSON encoding, decoding and compression of API payloads.
+
+For order and customer list pages of several sizes it times rendering the page with DRF's
+JSONRenderer and with FastJSONRenderer, parsing it back (as a bulk request body would be) with
+DRF's JSONParser and with FastJSONParser, and compressing it with gzip and brotli. It prints
+the median times in milliseconds and the response size in bytes, raw and compressed. Seeded
+rows are rolled back at the end.
+
+    python manage.py bench_json
+    python manage.py bench_json --sizes 50 1000 --runs 20
+"""
+
+
+import statistics
+import time
+from decimal import Decimal
+from io import BytesIO
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils.text import compress_string
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from main_app.fast_serializers import FastCustomerSerializer, FastOrderListSerializer
+from main_app.models import Customer, Order
+from main_app.parsers import FastJSONParser, orjson
+from main_app.renderers import FastJSONRenderer
+
+try:
+    import brotli
+except ImportError:  # Brotli sizes are not reported
+    brotli = None
+
+
+class Command(BaseCommand):
+    help = "Compare JSON encode and decode times, and response sizes, with and without orjson and compression."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[50, 500, 5000], help="Rows per page.")
+        parser.add_argument(
+            '--runs', type=int,
+            help="Calls per measurement; the median is reported (default: enough for about 20,000 rows).",
+        )
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write("orjson is not installed; the fast renderer and parser use the standard library.")
+        self.stdout.write(
+            f"{'payload':<14} {'rows':>6} {'drf enc':>8} {'fast enc':>9} {'drf dec':>8} {'fast dec':>9} "
+            f"{'bytes':>9} {'gzip':>8} {'gzip ms':>8} {'br':>8} {'br ms':>6}"
+        )
+        tag = time.time_ns()
+        with transaction.atomic():
+            pages = self.seed(max(options['sizes']), tag)
+            for size in options['sizes']:
+                runs = options['runs'] or max(3, 20000 // size)
+                for label, rows in pages:
+                    self.report(label, {'next': None, 'results': rows[:size]}, runs)
+            transaction.set_rollback(True)  # Drop the seeded rows
+
+    def report(self, label, page, runs):
+        content = JSONRenderer().render(page)
+        timings = [
+            self.timed(lambda: JSONRenderer().render(page), runs),
+            self.timed(lambda: FastJSONRenderer().render(page), runs),
+            self.timed(lambda: JSONParser().parse(BytesIO(content)), runs),
+            self.timed(lambda: FastJSONParser().parse(BytesIO(content)), runs),
+        ]
+        gzipped = compress_string(content)
+        gzip_ms = self.timed(lambda: compress_string(content), runs)
+        if brotli is not None:
+            quality = settings.COMPRESSION_BROTLI_QUALITY
+            br_bytes = f"{len(brotli.compress(content, quality=quality)):>8}"
+            br_ms = f"{self.timed(lambda: brotli.compress(content, quality=quality), runs):>6.2f}"
+        else:
+            br_bytes, br_ms = f"{'-':>8}", f"{'-':>6}"
+        drf_enc, fast_enc, drf_dec, fast_dec = timings
+        self.stdout.write(
+            f"{label:<14} {len(page['results']):>6} {drf_enc:>8.2f} {fast_enc:>9.2f} {drf_dec:>8.2f} {fast_dec:>9.2f} "
+            f"{len(content):>9} {len(gzipped):>8} {gzip_ms:>8.2f} {br_bytes} {br_ms}"
+        )
+
+    @staticmethod
+    def seed(size, tag):
+        """
+        Create ``size`` customers with an order each, and return their list page rows.
+        """
+        customers = Customer.objects.bulk_create(
+            [Customer(name=f"Customer {i}", code=f"bench-{tag}-{i}") for i in range(size)]
+        )
+        Order.objects.bulk_create([
+            Order(customer=customer, item=f"Item {i}", amount=Decimal(i % 1000) + Decimal('0.99'), slug=f"bench-{tag}-{i}")
+            for i, customer in enumerate(customers)
+        ])
+        orders = Order.objects.select_related('customer').filter(slug__startswith=f"bench-{tag}-")
+        return [
+            ("order list", FastOrderListSerializer(orders, many=True).data),
+            ("customer list", FastCustomerSerializer(customers, many=True).data),
+        ]
+
+    @staticmethod
+    def timed(run, runs):
+        """
+        Return the median duration of ``run()`` in milliseconds.
+        """
+        def once():
+            started = time.perf_counter()
+            run()
+            return (time.perf_counter() - started) * 1000
+
+        return statistics.median(once() for _ in range(runs))
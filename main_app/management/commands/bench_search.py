@@ -0,0 +1,120 @@
+"""
+Management command that benchmarks the customer search.
+
+It seeds N customers with names made of common words, then times prefix, misspelt and code
+searches and prints their p50/p95 latency against a target. On PostgreSQL the customers are
+seeded with one INSERT ... SELECT per batch, so millions of rows are practical; elsewhere
+the time to build the in-memory index is reported too. Everything happens in one transaction
+that is rolled back at the end.
+
+    python manage.py bench_search --rows 100000
+    python manage.py bench_search --rows 5000000 --batch-size 500000 --target-ms 50   # PostgreSQL
+"""
+
+
+import random
+import statistics
+import string
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from main_app.models import Customer
+from main_app.search import customer_index, search_customers
+
+WORDS = [
+    'Savannah', 'Nairobi', 'Mombasa', 'Kisumu', 'Eldoret', 'Nakuru', 'Thika', 'Malindi', 'Highland',
+    'Lakeside', 'Sunrise', 'Baraka', 'Jambo', 'Amani', 'Uhuru', 'Tumaini', 'Green', 'Golden', 'Royal',
+]
+KINDS = ['Traders', 'Foods', 'Hardware', 'Grocers', 'Pharmacy', 'Supplies', 'Motors', 'Textiles', 'Bakery']
+
+SEED_SQL = """
+    INSERT INTO {table} (name, code, active, "timestamp", updated)
+    SELECT
+        (%(words)s::text[])[1 + floor(random() * %(word_count)s)::int] || ' '
+            || (%(words)s::text[])[1 + floor(random() * %(word_count)s)::int] || ' '
+            || (%(kinds)s::text[])[1 + floor(random() * %(kind_count)s)::int] || ' ' || n,
+        %(tag)s || n, true, now(), now()
+    FROM generate_series(%(start)s, %(end)s) AS n
+"""
+
+
+def misspell(word, rng):
+    """
+    Return ``word`` with one letter dropped, doubled or swapped with the next one.
+    """
+    i = rng.randrange(1, len(word) - 1)
+    return rng.choice([
+        word[:i] + word[i + 1:],
+        word[:i] + word[i] + word[i:],
+        word[:i] + word[i + 1] + word[i] + word[i + 2:],
+    ])
+
+
+class Command(BaseCommand):
+    help = "Seed customers and report the latency of prefix, fuzzy and code searches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000, help="Number of customers to seed.")
+        parser.add_argument('--queries', type=int, default=200, help="Searches per kind.")
+        parser.add_argument('--batch-size', type=int, default=10000, help="Rows per INSERT while seeding.")
+        parser.add_argument('--target-ms', type=float, default=50, help="p95 latency target in milliseconds.")
+
+    def handle(self, *args, **options):
+        rng = random.Random(time.time_ns())
+        tag = ''.join(rng.choices(string.ascii_uppercase, k=4)) + '-'  # Codes like "QZXK-12345"
+        try:
+            with transaction.atomic():
+                self.seed(options, tag, rng)
+                if connection.vendor != 'postgresql':
+                    customer_index.clear()
+                    started = time.perf_counter()
+                    search_customers('warm-up')
+                    self.stdout.write(f"Built the in-memory index in {time.perf_counter() - started:.1f}s")
+
+                queries = {
+                    'prefix': lambda: rng.choice(WORDS + KINDS)[:rng.randrange(2, 6)],
+                    'fuzzy': lambda: misspell(rng.choice(WORDS + KINDS), rng),
+                    'code': lambda: f"{tag}{rng.randrange(options['rows'])}",
+                }
+                self.stdout.write(f"\n{'search':<8} {'p50 ms':>8} {'p95 ms':>8} {'results':>8} {'target':>8}")
+                for kind, make_query in queries.items():
+                    runs, found = [], 0
+                    for _ in range(options['queries']):
+                        term = make_query()
+                        started = time.perf_counter()
+                        found += len(search_customers(term))
+                        runs.append((time.perf_counter() - started) * 1000)
+                    runs.sort()
+                    p95 = runs[max(int(len(runs) * 0.95) - 1, 0)]
+                    self.stdout.write(
+                        f"{kind:<8} {statistics.median(runs):>8.2f} {p95:>8.2f} {found / len(runs):>8.1f} "
+                        f"{'met' if p95 <= options['target_ms'] else 'MISSED':>8}"
+                    )
+                transaction.set_rollback(True)  # Drop the seeded customers
+        finally:
+            customer_index.clear()
+
+    def seed(self, options, tag, rng):
+        self.stdout.write(f"Seeding {options['rows']} customers...")
+        created = 0
+        while created < options['rows']:
+            size = min(options['batch_size'], options['rows'] - created)
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute(SEED_SQL.format(table=Customer._meta.db_table), {
+                        'words': WORDS, 'word_count': len(WORDS), 'kinds': KINDS, 'kind_count': len(KINDS),
+                        'tag': tag, 'start': created, 'end': created + size - 1,
+                    })
+            else:
+                Customer.objects.bulk_create([
+                    Customer(
+                        name=f"{rng.choice(WORDS)} {rng.choice(WORDS)} {rng.choice(KINDS)} {created + i}",
+                        code=f"{tag}{created + i}",
+                    )
+                    for i in range(size)
+                ])
+            created += size
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
@@ -0,0 +1,110 @@
+"""
+Management command that benchmarks the fast-path serializers against the DRF serializers.
+
+For 1, 100 and 10,000 objects it times validating customer and order payloads and representing
+customers and orders for a list, with the DRF serializers and their FastSerializer
+counterparts, and prints the median time per object. Payloads of more than one object are
+validated with ``many=True``. Seeded rows are rolled back at the end.
+
+    python manage.py bench_serializers
+    python manage.py bench_serializers --sizes 1 1000 --runs 5
+"""
+
+
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from main_app.cache import customer_cache
+from main_app.fast_serializers import FastCustomerSerializer, FastOrderListSerializer, FastOrderSerializer
+from main_app.models import Customer, Order
+from main_app.serializers import CustomerSerializer, OrderListSerializer, OrderSerializer
+
+
+def validate(serializer_class, payloads):
+    many = len(payloads) > 1
+    serializer = serializer_class(data=payloads if many else payloads[0], many=many)
+    assert serializer.is_valid(), serializer.errors
+    return serializer.validated_data
+
+
+def represent(serializer_class, instances):
+    return serializer_class(instances, many=True).data
+
+
+class Command(BaseCommand):
+    help = "Compare the per-object cost of the DRF and fast-path serializers."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1, 100, 10000], help="Objects per call.")
+        parser.add_argument(
+            '--runs', type=int,
+            help="Calls per measurement; the median is reported (default: enough for about 2000 objects).",
+        )
+
+    def handle(self, *args, **options):
+        tag = time.time_ns()
+        self.stdout.write(f"{'operation':<18} {'objects':>8} {'drf us/obj':>11} {'fast us/obj':>12} {'speedup':>8}")
+        with transaction.atomic():
+            for size in options['sizes']:
+                context = self.seed(size, tag)
+                runs = options['runs'] or max(3, 2000 // size)
+                for label, drf, fast in self.cases(context):
+                    drf_us = self.timed(drf, runs) / size * 1e6
+                    fast_us = self.timed(fast, runs) / size * 1e6
+                    self.stdout.write(
+                        f"{label:<18} {size:>8} {drf_us:>11.1f} {fast_us:>12.1f} {drf_us / max(fast_us, 1e-9):>7.1f}x"
+                    )
+            transaction.set_rollback(True)  # Drop the seeded rows
+        customer_cache.clear()
+
+    @staticmethod
+    def seed(size, tag):
+        customers = Customer.objects.bulk_create(
+            [Customer(name=f"Customer {i}", code=f"bench-{tag}-{size}-{i}") for i in range(size)]
+        )
+        customer_cache.get_many([customer.pk for customer in customers])  # Warm, as in steady state
+        orders = Order.objects.bulk_create([
+            Order(customer=customer, item=f"Item {i}", amount=Decimal(i % 1000) + Decimal('0.99'),
+                  slug=f"bench-{tag}-{size}-{i}")
+            for i, customer in enumerate(customers)
+        ])
+        return {
+            'customer_payloads': [
+                {'name': f"New customer {i}", 'code': f"new-{tag}-{size}-{i}", 'active': True} for i in range(size)
+            ],
+            'order_payloads': [
+                {'customer': customer.pk, 'item': f"Item {i}", 'amount': f"{i % 1000}.50"}
+                for i, customer in enumerate(customers)
+            ],
+            'customers': list(Customer.objects.filter(pk__in=[customer.pk for customer in customers])),
+            'orders': list(Order.objects.select_related('customer').filter(pk__in=[order.pk for order in orders])),
+        }
+
+    @staticmethod
+    def cases(context):
+        """
+        Return the ``(label, drf, fast)`` operations to time.
+        """
+        return [
+            ("customer write", lambda: validate(CustomerSerializer, context['customer_payloads']),
+             lambda: validate(FastCustomerSerializer, context['customer_payloads'])),
+            ("order write", lambda: validate(OrderSerializer, context['order_payloads']),
+             lambda: validate(FastOrderSerializer, context['order_payloads'])),
+            ("customer read", lambda: represent(CustomerSerializer, context['customers']),
+             lambda: represent(FastCustomerSerializer, context['customers'])),
+            ("order list read", lambda: represent(OrderListSerializer, context['orders']),
+             lambda: represent(FastOrderListSerializer, context['orders'])),
+        ]
+
+    @staticmethod
+    def timed(run, runs):
+        timings = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - started)
+        return statistics.median(timings)
@@ -0,0 +1,50 @@
+"""
+Management command that benchmarks slug allocation for orders sharing the same item.
+
+Every order goes through the pre_save slug signal. The command reports, per block of
+inserts, the average number of queries and the average time per insert, which should
+stay flat as the number of colliding slugs grows. All rows are rolled back at the end.
+
+    python manage.py bench_slugs --orders 10000
+"""
+
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from main_app.models import Customer, Order
+
+
+class Command(BaseCommand):
+    help = "Benchmark per-insert slug allocation cost for orders with the same item."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=10000, help="Number of orders to insert.")
+        parser.add_argument('--block', type=int, default=1000, help="Number of inserts per reported block.")
+        parser.add_argument('--item', default='Sugar', help="Item name shared by every order.")
+
+    def handle(self, *args, **options):
+        queries = [0]
+
+        def count_queries(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        self.stdout.write(f"{'orders':>10} {'queries/insert':>15} {'ms/insert':>10}")
+        with transaction.atomic(), connection.execute_wrapper(count_queries):
+            customer = Customer.objects.create(name='Slug benchmark', code=f"bench-slugs-{time.time_ns()}")
+            done = 0
+            while done < options['orders']:
+                block = min(options['block'], options['orders'] - done)
+                queries[0] = 0
+                started = time.perf_counter()
+                for _ in range(block):
+                    Order.objects.create(customer=customer, item=options['item'], amount=1)
+                elapsed = time.perf_counter() - started
+                done += block
+                self.stdout.write(
+                    f"{done:>10} {queries[0] / block:>15.2f} {elapsed * 1000 / block:>10.3f}"
+                )
+            transaction.set_rollback(True)  # Leave the database as it was
@@ -0,0 +1,82 @@
+"""
+Management command that measures how many gateway calls the SMS dispatcher makes.
+
+It queues ``--messages`` outbox messages spread over ``--bodies`` distinct bodies and
+``--recipients`` phone numbers, drains the outbox through a fake gateway answering after
+``--latency`` seconds, once sending each message on its own and once with identical bodies
+coalesced into multi-recipient calls, and reports the gateway calls per 1000 messages and the
+time taken. Everything runs in a transaction that is rolled back.
+
+    python manage.py bench_sms_batching --messages 1000 --bodies 10 --recipients 200
+"""
+
+
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+
+from main_app.models import OutboundSms
+from main_app.outbox import dispatch_pending, enqueue_sms
+from main_app.utils import FakeLatencyBackend
+
+
+class CountingBackend(FakeLatencyBackend):
+    """
+    Fake gateway that counts its calls.
+    """
+    outbox = []
+
+    def __init__(self):
+        self.calls = 0
+
+    def send(self, message, recipients):
+        self.calls += 1
+        return super().send(message, recipients)
+
+
+class Command(BaseCommand):
+    help = "Compare gateway calls of the SMS dispatcher with and without coalescing identical messages."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=1000, help="Messages queued per run.")
+        parser.add_argument('--bodies', type=int, default=10, help="Distinct message bodies.")
+        parser.add_argument('--recipients', type=int, default=200, help="Distinct phone numbers.")
+        parser.add_argument('--max-recipients', type=int, help="Recipients per gateway call.")
+        parser.add_argument('--latency', type=float, default=0.01, help="Fake gateway latency in seconds.")
+        parser.add_argument('--seed', type=int, default=1, help="Random seed for the message mix.")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'mode':<10} {'calls':>8} {'calls/1k':>9} {'seconds':>9} {'sent':>6}")
+        for label, max_recipients in [('single', 1), ('batched', options['max_recipients'])]:
+            self.report(label, options, *self.run(options, max_recipients))
+
+    @staticmethod
+    def run(options, max_recipients):
+        rng = random.Random(options['seed'])
+        backend = CountingBackend()
+        test_settings = {'SMS_BATCH_WINDOW': 0, 'SMS_FAKE_LATENCY': options['latency']}
+        if max_recipients:
+            test_settings['SMS_BATCH_MAX_RECIPIENTS'] = max_recipients
+        with transaction.atomic(), override_settings(**test_settings):
+            # Only the benchmark's messages are due
+            OutboundSms.objects.filter(status=OutboundSms.STATUS_PENDING).update(status=OutboundSms.STATUS_FAILED)
+            for _ in range(options['messages']):
+                phone_number = f"+2547{rng.randrange(options['recipients']):08d}"
+                enqueue_sms(phone_number, f"Your order of item {rng.randrange(options['bodies'])} has shipped.")
+            sent, started = 0, time.perf_counter()
+            while True:
+                stats = dispatch_pending(backend=backend)
+                if not any(stats.values()):
+                    break
+                sent += stats['sent']
+            elapsed = time.perf_counter() - started
+            transaction.set_rollback(True)
+        return backend.calls, elapsed, sent
+
+    def report(self, label, options, calls, elapsed, sent):
+        self.stdout.write(
+            f"{label:<10} {calls:>8} {calls * 1000 / options['messages']:>9.1f} {elapsed:>9.3f} {sent:>6}"
+        )
@@ -0,0 +1,59 @@
+"""
+Management command that drains the SMS outbox.
+
+Run it as a long-lived worker next to the web processes:
+
+    python manage.py dispatch_sms
+
+or once from cron with ``--once``. With ``--concurrency`` above 1 (the default is
+settings.SMS_OUTBOX_CONCURRENCY), each batch is sent through the async SMS path with that
+many gateway calls in flight, each bounded by settings.SMS_SEND_TIMEOUT.
+"""
+
+
+import time
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from main_app.outbox import adispatch_pending, dispatch_pending
+
+
+class Command(BaseCommand):
+    help = "Deliver pending SMS notifications from the outbox."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.SMS_OUTBOX_BATCH_SIZE,
+            help="Maximum number of messages to send per batch.",
+        )
+        parser.add_argument(
+            '--interval', type=float, default=settings.SMS_OUTBOX_POLL_INTERVAL,
+            help="Seconds to sleep when the outbox is empty.",
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=settings.SMS_OUTBOX_CONCURRENCY,
+            help="Maximum concurrent gateway calls; 1 sends messages one at a time.",
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help="Drain the outbox once and exit instead of polling forever.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        while True:
+            if options['concurrency'] > 1:
+                stats = async_to_sync(adispatch_pending)(batch_size=batch_size, concurrency=options['concurrency'])
+            else:
+                stats = dispatch_pending(batch_size=batch_size)
+            if any(stats.values()):
+                self.stdout.write(
+                    f"sent={stats['sent']} retried={stats['retried']} failed={stats['failed']}"
+                )
+            if sum(stats.values()) < batch_size:
+                # The outbox is drained for now
+                if options['once']:
+                    return
+                time.sleep(options['interval'])
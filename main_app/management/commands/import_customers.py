@@ -0,0 +1,48 @@
+"""
+Management command that imports customers from a CSV or NDJSON file.
+
+Rows are upserted on the customer code, so re-running an import updates existing customers:
+
+    python manage.py import_customers customers.csv
+    python manage.py import_customers customers.ndjson --format ndjson
+"""
+
+
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from main_app.importers import FORMATS, import_customers
+
+
+class Command(BaseCommand):
+    help = "Import customers from a CSV or NDJSON file, upserting on code."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Path of the file to import.")
+        parser.add_argument(
+            '--format', choices=sorted(FORMATS),
+            help="File format (default is guessed from the file extension).",
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=settings.CUSTOMER_IMPORT_CHUNK_SIZE,
+            help="Number of rows per upsert.",
+        )
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or os.path.splitext(options['path'])[1].lstrip('.').lower()
+        if fmt not in FORMATS:
+            raise CommandError("Cannot guess the file format, pass --format csv or --format ndjson.")
+        try:
+            with open(options['path'], 'rb') as stream:
+                result = import_customers(stream, fmt, chunk_size=options['chunk_size'])
+        except OSError as e:
+            raise CommandError(str(e)) from e
+
+        self.stdout.write(
+            f"created={result['created']} updated={result['updated']} rejected={result['rejected']}"
+        )
+        for error in result['errors']:
+            self.stderr.write(json.dumps(error))
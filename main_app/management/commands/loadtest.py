@@ -0,0 +1,166 @@
+"""
+Management command that load-tests the API.
+
+It seeds a user and customers through the API, sends a synthetic or recorded mix of signup,
+token, customer and order requests, and prints the p50/p95/p99 latency, requests per second
+and database queries per request of each kind of request:
+
+    python manage.py loadtest --requests 2000 --concurrency 20 --output run.json
+    python manage.py loadtest --target asgi --replay mix.jsonl --compare run.json
+    python manage.py loadtest --url http://localhost:8000 --requests 2000
+
+In process, the SMS gateway is replaced by FakeLatencyBackend, and ``--dispatch`` also drains
+the outbox through it afterwards. That sends every pending message in the database to the fake
+gateway, so use it against a disposable database only. Seeded rows are deleted at the end,
+unless ``--keep`` is passed or the target is a URL.
+"""
+
+
+import json
+import time
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from main_app import loadtest
+from main_app.models import Customer, OutboundSms
+from main_app.outbox import adispatch_pending
+
+COLUMNS = ['count', 'errors', 'rps', 'p50_ms', 'p95_ms', 'p99_ms', 'queries_per_request']
+
+
+def parse_mix(value):
+    """
+    Parse "order=70,customer=20" into a dict of request kind to weight.
+    """
+    try:
+        mix = {name.strip(): float(weight) for name, weight in (part.split('=') for part in value.split(','))}
+    except ValueError as e:
+        raise CommandError(f"Invalid mix {value!r}; expected e.g. order=70,customer=20.") from e
+    unknown = set(mix) - set(loadtest.DEFAULT_MIX)
+    if unknown:
+        raise CommandError(f"Unknown request kinds in mix: {', '.join(sorted(unknown))}.")
+    return mix
+
+
+class Command(BaseCommand):
+    help = "Replay a synthetic or recorded request mix against the API and report latency and throughput."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', choices=['wsgi', 'asgi'], default='wsgi', help="In-process application.")
+        parser.add_argument('--url', help="Base URL of a running server, instead of an in-process application.")
+        parser.add_argument('--requests', type=int, default=1000, help="Number of synthetic requests.")
+        parser.add_argument('--concurrency', type=int, default=10, help="Requests in flight.")
+        parser.add_argument('--customers', type=int, default=50, help="Customers to seed (at most 500).")
+        parser.add_argument(
+            '--mix', type=parse_mix, default=loadtest.DEFAULT_MIX,
+            help="Weights of the synthetic request kinds, e.g. order=70,customer=20,token=5,signup=5.",
+        )
+        parser.add_argument('--replay', help="JSON lines file of recorded requests to send instead.")
+        parser.add_argument('--record', help="Write the requests sent to this JSON lines file.")
+        parser.add_argument('--seed', type=int, help="Random seed, for repeatable mixes.")
+        parser.add_argument('--sms-latency', type=float, help="Fake SMS gateway latency in seconds.")
+        parser.add_argument('--dispatch', action='store_true', help="Drain the SMS outbox after the requests.")
+        parser.add_argument('--output', help="Write the results to this JSON file.")
+        parser.add_argument('--compare', help="JSON results of an earlier run to compare with.")
+        parser.add_argument('--keep', action='store_true', help="Keep the seeded and created rows.")
+
+    def handle(self, *args, **options):
+        if options['url']:
+            target = loadtest.HttpTarget(options['url'])
+        else:
+            target = loadtest.AsgiTarget() if options['target'] == 'asgi' else loadtest.WsgiTarget()
+        tag = f"loadtest-{time.time_ns()}"
+        context = {'tag': tag, 'username': f"{tag}-user", 'password': f"{tag}-password"}
+        # The in-process clients send requests to the host "testserver"
+        test_settings = {
+            'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'testserver'],
+            'SMS_BACKEND': 'main_app.utils.FakeLatencyBackend',
+        }
+        if options['sms_latency'] is not None:
+            test_settings['SMS_FAKE_LATENCY'] = options['sms_latency']
+
+        with override_settings(**test_settings), loadtest.counting_queries():
+            try:
+                loadtest.seed_data(target, context, min(options['customers'], 500))
+                if options['replay']:
+                    requests = list(loadtest.load_requests(options['replay'], context, options['seed']))
+                else:
+                    requests = list(loadtest.synthetic_requests(
+                        options['requests'], context, options['mix'], options['seed']
+                    ))
+                if options['record']:
+                    loadtest.save_requests(requests, options['record'], context)
+
+                samples, elapsed = loadtest.run(target, requests, options['concurrency'], context['token'])
+                results = {
+                    'started_at': timezone.now().isoformat(),
+                    'config': {
+                        'target': options['url'] or options['target'],
+                        'concurrency': options['concurrency'],
+                        'requests': len(requests),
+                        'replay': options['replay'],
+                        'seed': options['seed'],
+                    },
+                    'elapsed_s': round(elapsed, 3),
+                    **loadtest.summarize(samples, elapsed, target.counts_queries),
+                }
+                if options['dispatch'] and not options['url']:
+                    results['sms'] = self.dispatch()
+            finally:
+                if not options['keep'] and not options['url']:
+                    self.cleanup(tag)
+
+        self.print_results(results, self.load(options['compare']) if options['compare'] else None)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(results, output, indent=2)
+
+    @staticmethod
+    def dispatch():
+        """
+        Drain the outbox through the fake gateway and return the send rate.
+        """
+        sent, started = 0, time.perf_counter()
+        while True:
+            stats = async_to_sync(adispatch_pending)()
+            if not any(stats.values()):
+                break
+            sent += sum(stats.values())
+        elapsed = time.perf_counter() - started
+        return {'messages': sent, 'elapsed_s': round(elapsed, 3), 'per_second': round(sent / elapsed, 2)}
+
+    @staticmethod
+    def cleanup(tag):
+        OutboundSms.objects.filter(order__customer__code__startswith=tag).delete()
+        Customer.objects.filter(code__startswith=tag).delete()
+        get_user_model().objects.filter(username__startswith=tag).delete()
+
+    @staticmethod
+    def load(path):
+        try:
+            with open(path, encoding='utf-8') as previous:
+                return json.load(previous)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Cannot read {path}: {e}") from e
+
+    def print_results(self, results, previous=None):
+        self.stdout.write(f"{'request':<10}" + ''.join(f"{column:>21}" for column in COLUMNS))
+        rows = {**results['requests'], 'total': results['total']}
+        previous_rows = {**previous.get('requests', {}), 'total': previous.get('total')} if previous else {}
+        for name, row in rows.items():
+            before = previous_rows.get(name)
+            line = f"{name:<10}"
+            for column in COLUMNS:
+                value = row[column]
+                text = '-' if value is None else f"{value:g}"
+                if before and before.get(column) and value is not None:
+                    text += f" ({(value - before[column]) / before[column]:+.0%})"
+                line += f"{text:>21}"
+            self.stdout.write(line)
+        if 'sms' in results:
+            self.stdout.write(f"SMS: {results['sms']['messages']} sent, {results['sms']['per_second']:g}/s")
@@ -0,0 +1,86 @@
+"""
+Management command that profiles the start-up of the application.
+
+It starts a fresh interpreter with ``python -X importtime``, loads the WSGI or ASGI application
+(or only runs django.setup()) the way a gunicorn worker does, and prints the slowest imports by
+cumulative or self time, with the total import time and the wall-clock start-up time:
+
+    python manage.py profile_startup
+    python manage.py profile_startup --target asgi --sort self --limit 40
+    python manage.py profile_startup --prefix main_app --prefix africastalking
+
+Run it before and after a change to see what it adds to worker boot and to every management
+command.
+"""
+
+
+import os
+import re
+import subprocess
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+TARGETS = {
+    'setup': "import django; django.setup()",
+    'wsgi': "import backend.wsgi",
+    'asgi': "import backend.asgi",
+}
+
+# "import time:       self [us] |  cumulative | imported package"
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+)\s*\|\s*(\d+)\s*\|(\s*)(\S+)\s*$')
+
+
+def parse_importtime(lines):
+    """
+    Parse the ``-X importtime`` report.
+
+    Returns:
+        A list of ``(module, self_us, cumulative_us, depth)`` tuples, in import order. A module
+        imported at the top level has depth 0.
+    """
+    imports = []
+    for line in lines:
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            imports.append((module, int(self_us), int(cumulative_us), max(len(indent) - 1, 0) // 2))
+    return imports
+
+
+class Command(BaseCommand):
+    help = "Report the import time of each module loaded while the application starts."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', choices=list(TARGETS), default='wsgi', help="What to load.")
+        parser.add_argument('--sort', choices=['cumulative', 'self'], default='cumulative', help="Order of the report.")
+        parser.add_argument('--limit', type=int, default=25, help="Number of modules to print.")
+        parser.add_argument(
+            '--prefix', action='append', default=[],
+            help="Only print modules starting with this prefix; may be repeated.",
+        )
+
+    def handle(self, *args, **options):
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'backend.settings')}
+        started = time.perf_counter()
+        process = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', TARGETS[options['target']]],
+            capture_output=True, text=True, env=env, check=False,
+        )
+        elapsed = time.perf_counter() - started
+        if process.returncode:
+            raise CommandError(f"Loading {options['target']} failed:\n{process.stderr[-2000:]}")
+
+        imports = parse_importtime(process.stderr.splitlines())
+        total_us = sum(self_us for _, self_us, _, _ in imports)
+        rows = [row for row in imports if not options['prefix'] or row[0].startswith(tuple(options['prefix']))]
+        rows.sort(key=lambda row: row[2] if options['sort'] == 'cumulative' else row[1], reverse=True)
+
+        self.stdout.write(f"{'self_ms':>10}{'cumulative_ms':>15}  module")
+        for module, self_us, cumulative_us, _ in rows[:options['limit']]:
+            self.stdout.write(f"{self_us / 1000:>10.1f}{cumulative_us / 1000:>15.1f}  {module}")
+        self.stdout.write(
+            f"target={options['target']} modules={len(imports)} "
+            f"import_ms={total_us / 1000:.1f} startup_ms={elapsed * 1000:.1f}"
+        )
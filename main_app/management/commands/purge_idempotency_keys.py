@@ -0,0 +1,18 @@
+"""
+Management command that deletes Idempotency-Keys older than settings.IDEMPOTENCY_KEY_TTL.
+Run it periodically, for example hourly from cron:
+
+    python manage.py purge_idempotency_keys
+"""
+
+
+from django.core.management.base import BaseCommand
+
+from main_app.idempotency import purge_expired_keys
+
+
+class Command(BaseCommand):
+    help = "Delete expired Idempotency-Keys and their stored responses."
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"deleted={purge_expired_keys()}")
@@ -0,0 +1,21 @@
+"""
+Management command that recomputes the customer rollups from the current and archived orders.
+
+    python manage.py rebuild_rollups
+"""
+
+
+from django.core.management.base import BaseCommand
+
+from main_app.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute every customer and daily order rollup from the current and archived orders."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rows per INSERT.")
+
+    def handle(self, *args, **options):
+        customers, days = rebuild_rollups(batch_size=options['batch_size'])
+        self.stdout.write(f"customers={customers} days={days}")
@@ -0,0 +1,476 @@
+"""
+Metrics for the MainApp Django application, exposed in the Prometheus text format.
+
+Metrics are kept in memory by each process: recording a value takes a dict update under a
+lock, and nothing is sent anywhere. With several gunicorn workers, set settings.METRICS_DIR to a
+directory shared by the workers (and the SMS dispatcher). Each process then writes a snapshot
+of its metrics there at most every settings.METRICS_FLUSH_INTERVAL seconds and on exit, and
+whichever worker serves ``/metrics`` adds up the snapshots of all processes. When a process
+has exited, the next scrape (or a new process given the same pid) merges the counters and
+histograms of its snapshot into a single archive and deletes the snapshot, as
+prometheus_client's multiprocess mode does, so counters neither go backwards when a worker
+is restarted nor leave a file behind per worker ever run. Clear the directory when the
+service is deployed.
+
+- Counter: A monotonically increasing value, per combination of labels.
+- Histogram: Counts observations in buckets, per combination of labels, with their sum and count.
+- Registry: Holds the metrics and collectors, snapshots and merges them, and renders the text format.
+- registry: The process-wide Registry; the metrics below are registered on it.
+- measuring_queries: Context manager counting and timing the database queries run inside it.
+- render: Returns the metrics of every process in the Prometheus text format.
+"""
+
+
+import atexit
+import contextvars
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.files import locks
+from django.db.backends.signals import connection_created
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    A value that only goes up, such as a number of requests, per combination of label values.
+    """
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        self.registry = None
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        if self.registry is not None:
+            self.registry.maybe_flush()
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    @staticmethod
+    def merge(total, value):
+        return value if total is None else total + value
+
+    def samples(self, key, value):
+        labels = list(zip(self.labelnames, key))
+        yield self.name + ('' if self.name.endswith('_total') else '_total'), labels, value
+
+
+class Histogram(Counter):
+    """
+    Counts observed values, such as request durations, in cumulative buckets per combination
+    of label values, along with their sum and count.
+    """
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        # Index of the first bucket the value fits in; the last slot is the +Inf bucket
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            entry[index] += 1
+            entry[-1] += value
+        if self.registry is not None:
+            self.registry.maybe_flush()
+
+    @contextmanager
+    def timer(self, **labels):
+        """
+        Observe the seconds spent in the block. Also usable as a function decorator.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(key), list(entry)] for key, entry in self._values.items()]
+
+    @staticmethod
+    def merge(total, value):
+        return list(value) if total is None else [a + b for a, b in zip(total, value)]
+
+    def samples(self, key, value):
+        labels = list(zip(self.labelnames, key))
+        cumulative = 0
+        for bound, count in zip((*self.buckets, math.inf), value[:-1]):
+            cumulative += count
+            yield f"{self.name}_bucket", labels + [('le', _format_value(bound))], cumulative
+        yield f"{self.name}_sum", labels, value[-1]
+        yield f"{self.name}_count", labels, cumulative
+
+
+def _is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except (OSError, TypeError):
+        return False
+    return True
+
+
+class Registry:
+    """
+    The metrics of this process, plus collectors that read values kept elsewhere (such as
+    cache counters) when a snapshot is taken.
+    """
+
+    archive_filename = 'metrics-archive.json'
+    lock_filename = 'metrics-archive.lock'
+
+    def __init__(self):
+        self.metrics = {}
+        self.collectors = []
+        self._flush_lock = threading.Lock()
+        self._flushed_at = 0.0
+        self._instance = None  # (pid, id), renewed in forked children
+        self._owned = None  # (path, instance) of the snapshot file known to be this process's
+
+    @property
+    def instance(self):
+        """
+        A random id of this process, telling its snapshot apart from one left by an exited
+        process that had the same pid.
+        """
+        if self._instance is None or self._instance[0] != os.getpid():
+            self._instance = (os.getpid(), uuid.uuid4().hex)
+        return self._instance[1]
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        metric.registry = self
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def register_collector(self, collector):
+        """
+        Register a callable returning ``(name, documentation, type, labels, value)`` tuples,
+        where ``type`` is 'counter' (added up across processes) or 'gauge' (reported by live
+        processes only, and added up too).
+        """
+        self.collectors.append(collector)
+        return collector
+
+    def snapshot(self):
+        """
+        Return this process's metrics as a JSON-serialisable dict.
+        """
+        collected = []
+        for collector in self.collectors:
+            collected.extend([name, documentation, kind, sorted(labels.items()), value]
+                             for name, documentation, kind, labels, value in collector())
+        return {
+            'pid': os.getpid(),
+            'instance': self.instance,
+            'metrics': {name: metric.snapshot() for name, metric in self.metrics.items()},
+            'collected': collected,
+        }
+
+    def _path(self, pid):
+        return os.path.join(settings.METRICS_DIR, f"metrics-{pid}.json")
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path, encoding='utf-8') as snapshot:
+                return json.load(snapshot)
+        except (OSError, ValueError):
+            return None  # Removed or being replaced
+
+    @staticmethod
+    def _write(path, data):
+        handle, temporary = tempfile.mkstemp(dir=settings.METRICS_DIR, suffix='.tmp')
+        with os.fdopen(handle, 'w', encoding='utf-8') as output:
+            json.dump(data, output)
+        # Replace the previous file atomically, so readers never see a partial one
+        os.replace(temporary, path)
+
+    def flush(self):
+        """
+        Write this process's snapshot to settings.METRICS_DIR, if it is set.
+
+        The first flush of a process archives the snapshot an exited process with the same
+        pid left behind, instead of overwriting its counts.
+        """
+        if not settings.METRICS_DIR:
+            return
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        path, snapshot = self._path(os.getpid()), self.snapshot()
+        if self._owned != (path, snapshot['instance']):
+            previous = self._read(path)
+            if previous is not None and previous.get('instance') != snapshot['instance']:
+                self.archive(path, previous)
+            self._owned = (path, snapshot['instance'])
+        self._write(path, snapshot)
+
+    def maybe_flush(self):
+        """
+        Flush if settings.METRICS_FLUSH_INTERVAL seconds have passed since the last flush.
+        """
+        if not settings.METRICS_DIR or time.monotonic() - self._flushed_at < settings.METRICS_FLUSH_INTERVAL:
+            return
+        if not self._flush_lock.acquire(blocking=False):  # pylint: disable=R1732
+            return  # Another thread is flushing
+        try:
+            self._flushed_at = time.monotonic()
+            self.flush()
+        except OSError:
+            pass  # Metrics must never break a request; the next flush tries again
+        finally:
+            self._flush_lock.release()
+
+    def merge_into(self, archive, snapshot):
+        """
+        Add the metrics and collected counters of a snapshot to an archive snapshot, in place.
+
+        Gauges are dropped, as they describe processes that are still running.
+        """
+        for name, entries in snapshot.get('metrics', {}).items():
+            metric = self.metrics.get(name)
+            if metric is None:
+                continue  # Written by another version of the code
+            values = {tuple(key): value for key, value in archive['metrics'].get(name, [])}
+            for key, value in entries:
+                values[tuple(key)] = metric.merge(values.get(tuple(key)), value)
+            archive['metrics'][name] = [[list(key), value] for key, value in values.items()]
+        collected = {(entry[0], json.dumps(entry[3])): entry for entry in archive['collected']}
+        for name, documentation, kind, labels, value in snapshot.get('collected', []):
+            if kind != 'counter':
+                continue
+            entry = collected.setdefault((name, json.dumps(labels)), [name, documentation, kind, labels, 0])
+            entry[4] += value
+        archive['collected'] = list(collected.values())
+
+    def archive(self, path, snapshot):
+        """
+        Merge the snapshot file of an exited process into the archive, and delete it.
+
+        Processes archive one at a time, under a lock file, and only if the file still holds
+        the same snapshot, so a snapshot archived by another process is not counted twice.
+        """
+        with open(os.path.join(settings.METRICS_DIR, self.lock_filename), 'a', encoding='utf-8') as lock:
+            locks.lock(lock, locks.LOCK_EX)
+            try:
+                current = self._read(path)
+                if current is None or current.get('instance') != snapshot.get('instance'):
+                    return
+                archive_path = os.path.join(settings.METRICS_DIR, self.archive_filename)
+                archive = self._read(archive_path) or {'pid': None, 'metrics': {}, 'collected': []}
+                self.merge_into(archive, current)
+                self._write(archive_path, archive)
+                os.remove(path)
+            finally:
+                locks.unlock(lock)
+
+    def snapshots(self):
+        """
+        Return the snapshots of every process: this one's, taken now, the files of the others
+        that are running, and the archive of those that have exited, whose files are archived first.
+        """
+        current = self.snapshot()
+        snapshots = [current]
+        if settings.METRICS_DIR and os.path.isdir(settings.METRICS_DIR):
+            for filename in os.listdir(settings.METRICS_DIR):
+                if not (filename.startswith('metrics-') and filename.endswith('.json')):
+                    continue
+                if filename == self.archive_filename:
+                    continue  # Read last, once the exited processes are merged into it
+                path = os.path.join(settings.METRICS_DIR, filename)
+                data = self._read(path)
+                if data is None:
+                    continue
+                if data.get('pid') == current['pid']:
+                    exited = data.get('instance') != current['instance']  # A predecessor with this pid
+                else:
+                    exited = not _is_alive(data.get('pid'))
+                if exited:
+                    try:
+                        self.archive(path, data)
+                    except OSError:
+                        snapshots.append(data)  # Counted as it is until a scrape can archive it
+                elif data.get('pid') != current['pid']:
+                    snapshots.append(data)
+            archive = self._read(os.path.join(settings.METRICS_DIR, self.archive_filename))
+            if archive is not None:
+                snapshots.append(archive)
+        return snapshots
+
+    def merged(self):
+        """
+        Add up the snapshots of every process.
+
+        Returns:
+            A tuple ``(totals, collected)``: the merged values of each metric by label values,
+            and ``(documentation, type, values by labels)`` of each collected metric.
+        """
+        totals = {name: {} for name in self.metrics}
+        collected = {}
+        for index, snapshot in enumerate(self.snapshots()):
+            for name, entries in snapshot.get('metrics', {}).items():
+                metric = self.metrics.get(name)
+                if metric is None:
+                    continue  # Written by another version of the code
+                for key, value in entries:
+                    totals[name][tuple(key)] = metric.merge(totals[name].get(tuple(key)), value)
+            # Gauges describe the present, so only processes that are still running report them
+            alive = index == 0 or _is_alive(snapshot.get('pid'))
+            for name, documentation, kind, labels, value in snapshot.get('collected', []):
+                if kind == 'gauge' and not alive:
+                    continue
+                values = collected.setdefault(name, (documentation, kind, {}))[2]
+                key = tuple(tuple(label) for label in labels)
+                values[key] = values.get(key, 0) + value
+        return totals, collected
+
+    def render(self):
+        """
+        Merge the snapshots of every process and render them in the Prometheus text format.
+        """
+        totals, collected = self.merged()
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.type}")
+            for key, value in sorted(totals[name].items()):
+                for sample, labels, sample_value in metric.samples(key, value):
+                    lines.append(f"{sample}{_format_labels(labels)} {_format_value(sample_value)}")
+        for name, (documentation, kind, values) in sorted(collected.items()):
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in sorted(values.items()):
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+atexit.register(registry.flush)
+
+REQUEST_SECONDS = registry.histogram(
+    'http_request_duration_seconds', "Time spent serving a request.", ['method', 'route'],
+)
+REQUESTS = registry.counter(
+    'http_requests_total', "Requests served, by response status.", ['method', 'route', 'status'],
+)
+REQUEST_DB_QUERIES = registry.histogram(
+    'http_request_db_queries', "Database queries run while serving a request.", ['route'], QUERY_COUNT_BUCKETS,
+)
+REQUEST_DB_SECONDS = registry.histogram(
+    'http_request_db_duration_seconds', "Time spent in database queries while serving a request.", ['route'],
+)
+SMS_SEND_SECONDS = registry.histogram(
+    'sms_send_duration_seconds', "Time spent sending an SMS through the gateway, by outcome.", ['outcome'],
+)
+SMS_BATCH_RECIPIENTS = registry.histogram(
+    'sms_send_recipients', "Recipients per SMS gateway call.", buckets=(1, 2, 5, 10, 20, 50, 100, 500),
+)
+SMS_BREAKER_TRIPS = registry.counter(
+    'sms_breaker_trips_total', "Times an SMS gateway circuit breaker opened.", ['gateway'],
+)
+SMS_OUTBOX_ATTEMPTS = registry.counter(
+    'sms_outbox_attempts_total', "Outbox delivery attempts, by outcome (sent, retried, failed or deferred).", ['outcome'],
+)
+SIGNAL_HANDLER_SECONDS = registry.histogram(
+    'signal_handler_duration_seconds', "Time spent in model signal handlers.", ['handler'],
+)
+ORDER_FEED_DROPPED = registry.counter(
+    'order_feed_dropped_subscribers_total', "Order feed subscribers disconnected for falling behind.",
+)
+
+_query_stats = contextvars.ContextVar('metrics_query_stats', default=None)
+
+
+def _measure_query(execute, sql, params, many, context):
+    stats = _query_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats[0] += 1
+        stats[1] += time.perf_counter() - started
+
+
+@contextmanager
+def measuring_queries():
+    """
+    Count and time the database queries run in the block, including in threads started
+    through ``sync_to_async``, which copy the current context.
+
+    Yields:
+        A list ``[queries, seconds]`` that is updated as queries run.
+    """
+    stats = [0, 0.0]
+    token = _query_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _query_stats.reset(token)
+
+
+def install_query_timer(sender, connection, **kwargs):  # pylint: disable=W0613
+    """
+    connection_created handler adding the query timer to a new database connection.
+    """
+    if _measure_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_measure_query)
+
+
+connection_created.connect(install_query_timer)
+
+
+def render():
+    """
+    Return the metrics of every process in the Prometheus text format.
+    """
+    return registry.render()
@@ -0,0 +1,252 @@
+"""
+Middleware for the MainApp Django application.
+
+- MetricsMiddleware: Records the latency, status and database queries of each request, per route.
+- CompressionMiddleware: Compresses responses with brotli or gzip, as the client accepts.
+- ReplicaPinningMiddleware: Lets read-only requests read from the database replicas, and keeps
+    a client's (and a JWT user's) requests on the primary for a few seconds after it writes, so
+    it reads its writes.
+"""
+
+
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from . import metrics
+from .authentication import ClaimsJWTAuthentication
+from .routers import replica_reads
+
+try:
+    import brotli
+except ImportError:  # Responses are compressed with gzip only
+    brotli = None
+
+
+class MetricsMiddleware:
+    """
+    Records each request's duration and status, and the number and duration of its database
+    queries, labelled with the URL pattern that matched (not the path, which would give every
+    object its own series).
+
+    It should come first, so the time spent in the other middleware is included.
+    """
+    sync_capable = True
+    async_capable = True
+    unmatched_route = '<unmatched>'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def record(self, request, response, started, queries):
+        match = getattr(request, 'resolver_match', None)
+        route = match.route if match is not None and match.route else self.unmatched_route
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - started, method=request.method, route=route)
+        metrics.REQUESTS.inc(method=request.method, route=route, status=response.status_code)
+        metrics.REQUEST_DB_QUERIES.observe(queries[0], route=route)
+        metrics.REQUEST_DB_SECONDS.observe(queries[1], route=route)
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        with metrics.measuring_queries() as queries:
+            response = self.get_response(request)
+        return self.record(request, response, started, queries)
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        with metrics.measuring_queries() as queries:
+            response = await self.get_response(request)
+        return self.record(request, response, started, queries)
+
+
+def accepted_encodings(header):
+    """
+    Return the content codings an Accept-Encoding header accepts, mapped to their quality values.
+    """
+    encodings = {}
+    for item in header.split(','):
+        coding, *params = item.split(';')
+        quality = 1.0
+        for param in params:
+            name, _, value = param.strip().partition('=')
+            if name.lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding.strip():
+            encodings[coding.strip().lower()] = quality
+    return encodings
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses of settings.COMPRESSION_MIN_BYTES or more with brotli (when the
+    ``brotli`` package is installed) or gzip, whichever the client's Accept-Encoding prefers.
+
+    Streaming responses, such as the order export, and responses that already have a
+    Content-Encoding are passed through: they compress themselves when worth it. Only text
+    and JSON content types are compressed. As with Django's GZipMiddleware, gzip output is
+    padded with random bytes to mitigate BREACH, and strong ETags are made weak.
+
+    It should come after MetricsMiddleware, so compression time is included in the latency.
+    """
+    sync_capable = True
+    async_capable = True
+    max_random_bytes = 100
+    content_types = ('application/json', 'application/x-ndjson', 'application/javascript', 'text/')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def choose_encoding(header):
+        """
+        Return the coding the client prefers among those available, or None.
+        """
+        accepted = accepted_encodings(header)
+        best, best_quality = None, 0.0
+        for coding in ('br', 'gzip') if brotli is not None else ('gzip',):
+            quality = accepted.get(coding, accepted.get('*', 0.0))
+            if quality > best_quality:  # A tie keeps the earlier, smaller, coding
+                best, best_quality = coding, quality
+        return best
+
+    def compress(self, content, coding):
+        if coding == 'br':
+            return brotli.compress(content, quality=settings.COMPRESSION_BROTLI_QUALITY)
+        return compress_string(content, max_random_bytes=self.max_random_bytes)
+
+    def process(self, request, response):
+        if (
+            response.streaming or response.has_header('Content-Encoding')
+            or len(response.content) < settings.COMPRESSION_MIN_BYTES
+            or not response.get('Content-Type', '').startswith(self.content_types)
+        ):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        coding = self.choose_encoding(request.headers.get('Accept-Encoding', ''))
+        if coding is None:
+            return response
+        content = self.compress(response.content, coding)
+        if len(content) >= len(response.content):
+            return response
+        response.content = content
+        response.headers['Content-Length'] = str(len(content))
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = coding
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.process(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.process(request, await self.get_response(request))
+
+
+class ReplicaPinningMiddleware:
+    """
+    Enables replica reads for GET, HEAD and OPTIONS requests.
+
+    Any other request reads the primary and keeps the client's following requests on the
+    primary for settings.DATABASE_REPLICA_PIN_SECONDS, which should exceed the replication lag.
+    The client is pinned with a cookie and, since API clients sending a bearer token often
+    keep no cookies, by the token's user id in the settings.DATABASE_REPLICA_PIN_CACHE_ALIAS
+    cache, which must be shared by the workers. The token's signature and expiry are checked
+    here; the view still authenticates the request.
+    """
+    sync_capable = True
+    async_capable = True
+    cookie_name = 'db_pin'
+    key_prefix = 'main_app:db_pin:'
+    safe_methods = ('GET', 'HEAD', 'OPTIONS')
+    authenticator = ClaimsJWTAuthentication()
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    @property
+    def cache(self):
+        return caches[settings.DATABASE_REPLICA_PIN_CACHE_ALIAS]
+
+    def pin_key(self, request):
+        """
+        Return the cache key pinning the user of the request's bearer token, or None without a valid one.
+        """
+        header = self.authenticator.get_header(request)
+        if header is None:
+            return None
+        try:
+            raw_token = self.authenticator.get_raw_token(header)
+            if raw_token is None:
+                return None
+            user_id = self.authenticator.get_validated_token(raw_token)[jwt_settings.USER_ID_CLAIM]
+        except (AuthenticationFailed, KeyError):  # The view rejects the request
+            return None
+        return f"{self.key_prefix}{user_id}"
+
+    def may_read_replicas(self, request):
+        """
+        Return the pin key to check, or False when the request must read the primary regardless.
+        """
+        if not settings.DATABASE_REPLICAS or request.method not in self.safe_methods:
+            return False
+        if self.cookie_name in request.COOKIES:
+            return False
+        return self.pin_key(request)
+
+    def reads_replicas(self, request):
+        key = self.may_read_replicas(request)
+        return key is None or (key is not False and self.cache.get(key) is None)
+
+    async def areads_replicas(self, request):
+        key = self.may_read_replicas(request)
+        return key is None or (key is not False and await self.cache.aget(key) is None)
+
+    def pin(self, request, response):
+        """
+        Return the pin key to set after a write, or None; sets the pin cookie on the response.
+        """
+        if not settings.DATABASE_REPLICAS or request.method in self.safe_methods:
+            return None
+        response.set_cookie(
+            self.cookie_name, '1', max_age=settings.DATABASE_REPLICA_PIN_SECONDS, httponly=True, samesite='Lax'
+        )
+        return self.pin_key(request)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with replica_reads(self.reads_replicas(request)):
+            response = self.get_response(request)
+        key = self.pin(request, response)
+        if key is not None:
+            self.cache.set(key, 1, settings.DATABASE_REPLICA_PIN_SECONDS)
+        return response
+
+    async def __acall__(self, request):
+        with replica_reads(await self.areads_replicas(request)):
+            response = await self.get_response(request)
+        key = self.pin(request, response)
+        if key is not None:
+            await self.cache.aset(key, 1, settings.DATABASE_REPLICA_PIN_SECONDS)
+        return response
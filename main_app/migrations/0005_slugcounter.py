@@ -0,0 +1,58 @@
+# Generated by Django 4.2.16 on 2026-10-18 19:19
+
+from django.db import migrations, models
+from django.utils.text import slugify
+
+
+def seed_slug_counters(apps, schema_editor):
+    """
+    Make existing order slugs unique and start each counter past the slugs already in use,
+    so slugs handed out by the counters never collide with the legacy ones.
+    """
+    Order = apps.get_model('main_app', 'Order')
+    SlugCounter = apps.get_model('main_app', 'SlugCounter')
+
+    seen, counters = set(), {}
+    for pk, item, slug in Order.objects.order_by('pk').values_list('pk', 'item', 'slug').iterator():
+        if slug is None:
+            continue
+        if slug in seen:
+            # Duplicate left behind by concurrent saves; rename it like the old allocator did
+            while slug in seen:
+                slug = f"{slug}-{pk}"
+            Order.objects.filter(pk=pk).update(slug=slug)
+        seen.add(slug)
+
+        base = slugify(item)[:240].strip('-') or 'order'
+        suffix = slug[len(base) + 1:] if slug.startswith(f"{base}-") else ''
+        number = 1 if slug == base else int(suffix) if suffix.isdigit() else 0
+        counters[base] = max(counters.get(base, 0), number)
+
+    SlugCounter.objects.bulk_create(
+        [SlugCounter(scope='main_app.order', base=base, value=value) for base, value in counters.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0004_outboundsms'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlugCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(max_length=100)),
+                ('base', models.CharField(max_length=255)),
+                ('value', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='slugcounter',
+            constraint=models.UniqueConstraint(fields=('scope', 'base'), name='unique_slug_counter'),
+        ),
+        migrations.RunPython(seed_slug_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.16 on 2026-10-18 19:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0005_slugcounter'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='slug',
+            field=models.SlugField(blank=True, editable=False, max_length=255, null=True, unique=True, verbose_name='Slug'),
+        ),
+    ]
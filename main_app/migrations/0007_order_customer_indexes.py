@@ -0,0 +1,39 @@
+# Generated by Django 4.2.16 on 2026-10-18 19:24
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0006_alter_order_slug_unique'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='customer',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='orders', to='main_app.customer'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['timestamp', 'id'], name='customer_ts_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(condition=models.Q(('active', True)), fields=['timestamp', 'id'], name='customer_active_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['customer', 'timestamp'], name='order_customer_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['timestamp', 'id'], name='order_ts_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('active', True)), fields=['timestamp', 'id'], name='order_active_ts_idx'),
+        ),
+    ]
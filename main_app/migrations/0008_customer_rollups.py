@@ -0,0 +1,74 @@
+# Generated by Django 4.2.16 on 2026-10-18 19:26
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import TruncDate
+import django.db.models.deletion
+
+
+def backfill_rollups(apps, schema_editor):
+    """
+    Compute the rollups of the orders that already exist.
+    """
+    Order = apps.get_model('main_app', 'Order')
+    CustomerRollup = apps.get_model('main_app', 'CustomerRollup')
+    CustomerDailyRollup = apps.get_model('main_app', 'CustomerDailyRollup')
+
+    CustomerRollup.objects.bulk_create(
+        [
+            CustomerRollup(
+                customer_id=row['customer'], order_count=row['count'],
+                total_amount=row['amount'], last_order_at=row['last'],
+            )
+            for row in Order.objects.values('customer').annotate(
+                count=Count('id'), amount=Sum('amount'), last=Max('timestamp')
+            ).order_by()
+        ],
+        batch_size=1000,
+    )
+    CustomerDailyRollup.objects.bulk_create(
+        [
+            CustomerDailyRollup(
+                customer_id=row['customer'], day=row['day'], order_count=row['count'], total_amount=row['amount'],
+            )
+            for row in Order.objects.annotate(day=TruncDate('timestamp')).values('customer', 'day').annotate(
+                count=Count('id'), amount=Sum('amount')
+            ).order_by()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0007_order_customer_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerRollup',
+            fields=[
+                ('customer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rollup', serialize=False, to='main_app.customer')),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('last_order_at', models.DateTimeField(blank=True, null=True, verbose_name='Last Order At')),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='Updated At')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CustomerDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='main_app.customer')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='customerdailyrollup',
+            constraint=models.UniqueConstraint(fields=('customer', 'day'), name='unique_customer_day_rollup'),
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
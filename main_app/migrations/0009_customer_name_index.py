@@ -0,0 +1,18 @@
+# Generated by Django 4.2.16 on 2026-10-18 19:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0008_customer_rollups'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customer',
+            name='name',
+            field=models.CharField(db_index=True, max_length=255),
+        ),
+    ]
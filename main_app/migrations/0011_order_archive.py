@@ -0,0 +1,80 @@
+# Generated by Django 4.2.16 on 2026-10-18 20:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+# A partitioned table's primary key must include the partition key, which Django cannot
+# express, so the PostgreSQL table is created by hand. Monthly partitions are added by the
+# archiver as it needs them; the default partition catches anything outside them.
+POSTGRESQL_CREATE = [
+    """
+    CREATE TABLE main_app_orderarchive (
+        id bigint NOT NULL,
+        customer_id bigint NOT NULL
+            REFERENCES main_app_customer (id) DEFERRABLE INITIALLY DEFERRED,
+        item varchar(255) NOT NULL,
+        amount numeric(10, 2) NOT NULL,
+        active boolean NOT NULL,
+        "timestamp" timestamp with time zone NOT NULL,
+        updated timestamp with time zone NOT NULL,
+        slug varchar(255) NULL,
+        archived_at timestamp with time zone NOT NULL,
+        PRIMARY KEY (id, "timestamp")
+    ) PARTITION BY RANGE ("timestamp")
+    """,
+    'CREATE INDEX orderarchive_customer_ts_idx ON main_app_orderarchive (customer_id, "timestamp")',
+    'CREATE INDEX orderarchive_ts_id_idx ON main_app_orderarchive ("timestamp", id)',
+    "CREATE TABLE main_app_orderarchive_default PARTITION OF main_app_orderarchive DEFAULT",
+]
+
+
+def create_archive_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for statement in POSTGRESQL_CREATE:
+            schema_editor.execute(statement)
+    else:
+        schema_editor.create_model(apps.get_model('main_app', 'OrderArchive'))
+
+
+def drop_archive_table(apps, schema_editor):
+    schema_editor.delete_model(apps.get_model('main_app', 'OrderArchive'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0010_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='OrderArchive',
+                    fields=[
+                        ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                        ('item', models.CharField(max_length=255)),
+                        ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                        ('active', models.BooleanField(default=True, verbose_name='Active')),
+                        ('timestamp', models.DateTimeField(verbose_name='Created At')),
+                        ('updated', models.DateTimeField(verbose_name='Updated At')),
+                        ('slug', models.SlugField(blank=True, db_index=False, max_length=255, null=True, verbose_name='Slug')),
+                        ('archived_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Archived At')),
+                        ('customer', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='archived_orders', to='main_app.customer')),
+                    ],
+                    options={
+                        'indexes': [
+                            models.Index(fields=['customer', 'timestamp'], name='orderarchive_customer_ts_idx'),
+                            models.Index(fields=['timestamp', 'id'], name='orderarchive_ts_id_idx'),
+                        ],
+                    },
+                ),
+            ],
+        ),
+        migrations.RunPython(create_archive_table, drop_archive_table),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('active', False)), fields=['timestamp'], name='order_inactive_ts_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.16 on 2026-10-18 20:41
+
+from django.db import migrations
+
+# Trigram indexes for the customer search. They only exist on PostgreSQL, so they are not
+# declared on the model; other databases search an in-memory index instead (main_app.search).
+# Creating the pg_trgm extension needs a role allowed to create extensions in the database.
+TRIGRAM_INDEXES = {
+    'customer_name_trgm_idx': 'name',
+    'customer_code_trgm_idx': 'code',
+}
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, column in TRIGRAM_INDEXES.items():
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {name} ON main_app_customer USING gin ({column} gin_trgm_ops)"
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name in TRIGRAM_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0011_order_archive'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
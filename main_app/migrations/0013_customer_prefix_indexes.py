@@ -0,0 +1,37 @@
+# Generated by Django 4.2.16 on 2026-10-18 22:05
+
+from django.db import migrations
+
+# Prefix indexes for customer searches too short for the trigram indexes (main_app.search).
+# text_pattern_ops lets LIKE 'term%' use them whatever the database collation.
+PREFIX_INDEXES = {
+    'customer_name_prefix_idx': 'name',
+    'customer_code_prefix_idx': 'code',
+}
+
+
+def create_prefix_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, column in PREFIX_INDEXES.items():
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {name} ON main_app_customer (lower({column}) text_pattern_ops)"
+        )
+
+
+def drop_prefix_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name in PREFIX_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0012_customer_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_prefix_indexes, drop_prefix_indexes),
+    ]
@@ -5,17 +5,29 @@ This module defines the Customer and Order models, which store information about
 
 - Customer: Represents a customer with attributes like name, unique code, and status.
 - Order: Represents an order with details such as the associated customer, item, amount, and status.
+- OrderArchive: Orders moved out of the Order table once they are old or inactive. On PostgreSQL
+    the table is range-partitioned by month of the order's timestamp.
+- CustomerRollup: Running order count, revenue and last order time of a customer.
+- CustomerDailyRollup: The same totals per customer and day.
+- SlugCounter: Per-base counter used to allocate unique slugs without scanning existing ones.
+- OutboundSms: Outbox entry for an SMS notification, written in the same transaction as the Order
+    and delivered later by the SMS dispatcher.
+- IdempotencyKey: The Idempotency-Key of a customer or order POST and the response it got,
+    so a retried request is answered without being executed again.
 """
 
 
+from django.conf import settings
 from django.db import models
+from django.db.models import Q
+from django.utils import timezone
 
 class Customer(models.Model):
     """
     Model for Customer.
     Stores basic customer information such as name, code, and status.
     """
-    name = models.CharField(max_length=255)
+    name = models.CharField(max_length=255, db_index=True)  # Admin prefix search
     code = models.CharField(max_length=100, unique=True)
     active = models.BooleanField(("Active"), default=True)
     timestamp = models.DateTimeField(
@@ -25,6 +37,13 @@ class Customer(models.Model):
         ("Updated At"), auto_now=True
     )
 
+    class Meta:
+        indexes = [
+            # Keyset pagination of the customer list, newest first
+            models.Index(fields=['timestamp', 'id'], name='customer_ts_id_idx'),
+            models.Index(fields=['timestamp', 'id'], condition=Q(active=True), name='customer_active_ts_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -35,7 +54,8 @@ class Order(models.Model):
     Stores order details such as customer, item, amount, and status.
     Automatically generates a slug for the order.
     """
-    customer = models.ForeignKey(Customer, related_name='orders', on_delete=models.CASCADE)
+    # Indexed by the (customer, timestamp) index below, which also serves plain customer lookups
+    customer = models.ForeignKey(Customer, related_name='orders', on_delete=models.CASCADE, db_index=False)
     item = models.CharField(max_length=255)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     active = models.BooleanField(("Active"), default=True)
@@ -46,8 +66,175 @@ class Order(models.Model):
         ("Updated At"), auto_now=True
     )
     slug = models.SlugField(
-        ("Slug"), max_length=255, null=True, blank=True, editable=False
+        ("Slug"), max_length=255, unique=True, null=True, blank=True, editable=False
     )
 
+    class Meta:
+        indexes = [
+            # A customer's order history, in time order
+            models.Index(fields=['customer', 'timestamp'], name='order_customer_ts_idx'),
+            # Time ranges and keyset pagination of the order list
+            models.Index(fields=['timestamp', 'id'], name='order_ts_id_idx'),
+            models.Index(fields=['timestamp', 'id'], condition=Q(active=True), name='order_active_ts_idx'),
+            # Inactive orders waiting to be archived; they leave the table, so this stays small
+            models.Index(fields=['timestamp'], condition=Q(active=False), name='order_inactive_ts_idx'),
+        ]
+
     def __str__(self):
         return f"Order {self.item} by {self.customer.name}"
+
+
+class OrderArchive(models.Model):
+    """
+    Model for OrderArchive.
+    Stores orders moved out of the Order table by the archiver, with their original id, slug
+    and timestamps. Archived orders still count in the customer rollups.
+
+    On PostgreSQL the table is partitioned by range of ``timestamp``, one partition per month,
+    and its primary key is ``(id, timestamp)``; queries filtering on ``timestamp`` only scan
+    the matching partitions. Slugs are not unique here, as a unique index on a partitioned
+    table would have to include the timestamp.
+    """
+    id = models.BigIntegerField(primary_key=True)  # The id the order had in the Order table
+    customer = models.ForeignKey(Customer, related_name='archived_orders', on_delete=models.CASCADE, db_index=False)
+    item = models.CharField(max_length=255)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    active = models.BooleanField(("Active"), default=True)
+    timestamp = models.DateTimeField(("Created At"))
+    updated = models.DateTimeField(("Updated At"))
+    slug = models.SlugField(("Slug"), max_length=255, null=True, blank=True, db_index=False)
+    archived_at = models.DateTimeField(("Archived At"), default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['customer', 'timestamp'], name='orderarchive_customer_ts_idx'),
+            models.Index(fields=['timestamp', 'id'], name='orderarchive_ts_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archived order {self.item} by {self.customer.name}"
+
+
+class CustomerRollup(models.Model):
+    """
+    Model for CustomerRollup.
+    Stores running order totals for a customer, maintained incrementally as orders are
+    saved and deleted so they can be read without aggregating the customer's orders.
+    """
+    customer = models.OneToOneField(
+        Customer, related_name='rollup', on_delete=models.CASCADE, primary_key=True
+    )
+    order_count = models.PositiveIntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    last_order_at = models.DateTimeField(("Last Order At"), null=True, blank=True)
+    updated = models.DateTimeField(
+        ("Updated At"), auto_now=True
+    )
+
+    def __str__(self):
+        return f"Rollup for customer {self.customer_id}"
+
+
+class CustomerDailyRollup(models.Model):
+    """
+    Model for CustomerDailyRollup.
+    Stores order totals for a customer on one day.
+    """
+    customer = models.ForeignKey(Customer, related_name='daily_rollups', on_delete=models.CASCADE)
+    day = models.DateField()
+    order_count = models.PositiveIntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['customer', 'day'], name='unique_customer_day_rollup'),
+        ]
+
+    def __str__(self):
+        return f"Rollup for customer {self.customer_id} on {self.day}"
+
+
+class SlugCounter(models.Model):
+    """
+    Model for SlugCounter.
+    Stores, for each model and slug base, how many slugs have been handed out so far.
+    """
+    scope = models.CharField(max_length=100)
+    base = models.CharField(max_length=255)
+    value = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'base'], name='unique_slug_counter'),
+        ]
+
+    def __str__(self):
+        return f"{self.scope}:{self.base} ({self.value})"
+
+
+class OutboundSms(models.Model):
+    """
+    Model for OutboundSms.
+    Stores SMS notifications waiting to be delivered by the dispatcher, along with
+    their delivery status and retry bookkeeping.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    order = models.ForeignKey(
+        Order, related_name='sms_messages', on_delete=models.SET_NULL, null=True, blank=True
+    )
+    phone_number = models.CharField(max_length=32)
+    message = models.TextField()
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(("Next Attempt At"), default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    timestamp = models.DateTimeField(
+        ("Created At"), auto_now_add=True
+    )
+    updated = models.DateTimeField(
+        ("Updated At"), auto_now=True
+    )
+
+    class Meta:
+        indexes = [
+            # The dispatcher polls for due pending messages
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"SMS to {self.phone_number} ({self.status})"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Model for IdempotencyKey.
+    Stores the Idempotency-Key a user sent to an endpoint, a fingerprint of the request, and
+    the response once the request has completed. A row without a response is a request in
+    progress; the unique constraint lets only one request claim a key.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='+', on_delete=models.CASCADE)
+    endpoint = models.CharField(max_length=255)
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)  # SHA-256 of the method, path and data
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_data = models.JSONField(null=True, blank=True)
+    locked_at = models.DateTimeField(("Locked At"), default=timezone.now)
+    timestamp = models.DateTimeField(
+        ("Created At"), auto_now_add=True, db_index=True  # Expired keys are purged by age
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'endpoint', 'key'], name='unique_idempotency_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.key} for {self.endpoint} ({self.response_status or 'in progress'})"
@@ -0,0 +1,244 @@
+"""
+SMS outbox for the MainApp Django application.
+
+Views never talk to the SMS gateway directly. They write an OutboundSms row in the same
+transaction as the data that triggered the notification, and the dispatcher delivers
+pending rows in batches, retrying failures with exponential backoff.
+
+Within a batch, messages with identical bodies are sent together in multi-recipient gateway
+calls (see SmsBatcher), and each message gets the outcome reported for its recipient. When
+fewer messages than a full batch are due, the dispatcher waits settings.SMS_BATCH_WINDOW
+seconds once for a burst to finish arriving before sending.
+
+While the gateway's circuit breaker is open the dispatcher claims nothing, and messages whose
+call was refused by the breaker are handled by settings.SMS_BREAKER_FALLBACK: 'defer'
+reschedules them for when the breaker lets calls through again without using up an attempt.
+
+- order_confirmation_message: Builds the SMS body sent when an order is placed.
+- enqueue_sms: Adds an SMS to the outbox.
+- retry_delay: Computes the backoff delay before the next delivery attempt.
+- lease_duration: How long a dispatcher holds the messages it claims.
+- claim_batch: Leases a batch of due messages so concurrent dispatchers do not send them twice.
+- collect_batch: Claims a batch, topping up a partial one after the batching window.
+- dispatch_pending: Delivers one batch of due messages through the configured gateway backend.
+- record_attempt: Saves the outcome of one delivery attempt.
+- adispatch_pending: Async version of dispatch_pending that makes the gateway calls concurrently.
+"""
+
+
+import asyncio
+import math
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .breaker import CircuitBreaker, CircuitOpenError
+from .metrics import SMS_OUTBOX_ATTEMPTS
+from .models import OutboundSms
+from .utils import SmsBatcher, gateway_breaker, get_sms_backend
+
+
+def order_confirmation_message(order):
+    """
+    Return the SMS body confirming that ``order`` has been placed.
+    """
+    return f"Dear {order.customer.name}, your order for {order.item} has been successfully placed."
+
+
+def enqueue_sms(phone_number, message, order=None):
+    """
+    Add an SMS to the outbox.
+
+    Call this inside the transaction that creates the related data, so the message is
+    only visible to the dispatcher once that data has been committed.
+
+    Args:
+        phone_number: The recipient's phone number.
+        message: The SMS body.
+        order: The Order the message relates to, if any.
+
+    Returns:
+        The created OutboundSms instance.
+    """
+    return OutboundSms.objects.create(order=order, phone_number=phone_number, message=message)
+
+
+def retry_delay(attempts):
+    """
+    Return the delay before the next attempt after ``attempts`` failed attempts.
+    """
+    delay = settings.SMS_OUTBOX_RETRY_BASE_SECONDS * (2 ** max(attempts - 1, 0))
+    return timedelta(seconds=min(delay, settings.SMS_OUTBOX_RETRY_MAX_SECONDS))
+
+
+def lease_duration(batch_size, concurrency=1):
+    """
+    Return how long a dispatcher sending up to ``batch_size`` messages may hold them.
+
+    That is the batching window, then one gateway call per message at worst (messages with
+    different bodies are not combined), ``concurrency`` at a time and each bounded by
+    settings.SMS_SEND_TIMEOUT, plus settings.SMS_OUTBOX_LEASE_SECONDS to record the outcomes.
+    A lease that expired while its batch was still being sent would let another dispatcher
+    send the same messages again.
+    """
+    calls = math.ceil(batch_size / concurrency)
+    return timedelta(
+        seconds=settings.SMS_BATCH_WINDOW + calls * settings.SMS_SEND_TIMEOUT + settings.SMS_OUTBOX_LEASE_SECONDS
+    )
+
+
+def claim_batch(batch_size, lease=None):
+    """
+    Lease up to ``batch_size`` due messages.
+
+    Claimed rows have their ``next_attempt_at`` pushed forward by the lease duration, so
+    another dispatcher will not pick them up unless this one dies before recording the outcome.
+
+    Args:
+        batch_size: Maximum number of messages to claim.
+        lease: A timedelta (default is ``lease_duration(batch_size)``, for sending them one at a time).
+
+    Returns:
+        A list of OutboundSms instances.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            OutboundSms.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=OutboundSms.STATUS_PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        if batch:
+            lease_until = now + (lease or lease_duration(batch_size))
+            OutboundSms.objects.filter(pk__in=[sms.pk for sms in batch]).update(next_attempt_at=lease_until)
+    return batch
+
+
+def collect_batch(batch_size, window=None, concurrency=1):
+    """
+    Claim up to ``batch_size`` due messages. If fewer are due, wait ``window`` seconds
+    (default settings.SMS_BATCH_WINDOW) and claim the messages that arrived meanwhile.
+
+    Both claims are leased for sending the whole batch, ``concurrency`` messages at a time.
+
+    Returns:
+        A list of OutboundSms instances.
+    """
+    window = settings.SMS_BATCH_WINDOW if window is None else window
+    lease = lease_duration(batch_size, concurrency)
+    batch = claim_batch(batch_size, lease)
+    if batch and len(batch) < batch_size and window > 0:
+        time.sleep(window)
+        batch += claim_batch(batch_size - len(batch), lease)
+    return batch
+
+
+def _batcher(batch):
+    batcher = SmsBatcher()
+    for sms in batch:
+        batcher.add(sms.pk, sms.phone_number, sms.message)
+    return batcher
+
+
+def dispatch_pending(batch_size=None, backend=None):
+    """
+    Deliver one batch of due messages.
+
+    Args:
+        batch_size: Maximum number of messages to send (default is settings.SMS_OUTBOX_BATCH_SIZE).
+        backend: Gateway backend instance to use (default is the SMS_BACKEND setting).
+
+    Returns:
+        A dict with the number of messages ``sent``, ``retried`` (including deferred) and ``failed``.
+    """
+    stats = {'sent': 0, 'retried': 0, 'failed': 0}
+    backend = backend or get_sms_backend()
+    if gateway_breaker(backend).state == CircuitBreaker.OPEN:
+        return stats
+    batch = collect_batch(batch_size or settings.SMS_OUTBOX_BATCH_SIZE)
+    if not batch:
+        return stats
+
+    errors = _batcher(batch).send(backend)
+    for sms in batch:
+        record_attempt(sms, errors[sms.pk], stats)
+    return stats
+
+
+def record_attempt(sms, error, stats):
+    """
+    Save the outcome of a delivery attempt and count it in ``stats``.
+
+    Args:
+        sms: The OutboundSms that was sent.
+        error: The exception raised by the gateway, or None if the message was sent.
+        stats: The dict of ``sent``, ``retried`` and ``failed`` counts to update.
+    """
+    if isinstance(error, CircuitOpenError) and settings.SMS_BREAKER_FALLBACK == 'defer':
+        # The gateway was not called, so this does not count as an attempt
+        sms.next_attempt_at = datetime.fromtimestamp(error.retry_at, tz=dt_timezone.utc)
+        sms.last_error = str(error)
+        stats['retried'] += 1
+        SMS_OUTBOX_ATTEMPTS.inc(outcome='deferred')
+        sms.save(update_fields=['next_attempt_at', 'last_error', 'updated'])
+        return
+    sms.attempts += 1
+    if error is None:
+        sms.status = OutboundSms.STATUS_SENT
+        sms.last_error = ''
+        outcome = 'sent'
+    else:
+        sms.last_error = str(error)
+        if sms.attempts >= settings.SMS_OUTBOX_MAX_ATTEMPTS:
+            sms.status = OutboundSms.STATUS_FAILED
+            outcome = 'failed'
+        else:
+            sms.next_attempt_at = timezone.now() + retry_delay(sms.attempts)
+            outcome = 'retried'
+    stats[outcome] += 1
+    SMS_OUTBOX_ATTEMPTS.inc(outcome=outcome)
+    sms.save(update_fields=['status', 'attempts', 'next_attempt_at', 'last_error', 'updated'])
+
+
+async def adispatch_pending(batch_size=None, backend=None, concurrency=None):
+    """
+    Deliver one batch of due messages, with up to ``concurrency`` gateway calls in flight.
+
+    Each call is bounded by settings.SMS_SEND_TIMEOUT; a timeout counts as a failed attempt.
+
+    Args:
+        batch_size: Maximum number of messages to send (default is settings.SMS_OUTBOX_BATCH_SIZE).
+        backend: Gateway backend instance to use (default is the SMS_BACKEND setting).
+        concurrency: Maximum concurrent gateway calls (default is settings.SMS_OUTBOX_CONCURRENCY).
+
+    Returns:
+        A dict with the number of messages ``sent``, ``retried`` (including deferred) and ``failed``.
+    """
+    stats = {'sent': 0, 'retried': 0, 'failed': 0}
+    backend = backend or get_sms_backend()
+    if gateway_breaker(backend).state == CircuitBreaker.OPEN:
+        return stats
+    batch_size = batch_size or settings.SMS_OUTBOX_BATCH_SIZE
+    concurrency = concurrency or settings.SMS_OUTBOX_CONCURRENCY
+    lease = lease_duration(batch_size, concurrency)
+    batch = await sync_to_async(claim_batch)(batch_size, lease)
+    if not batch:
+        return stats
+    if len(batch) < batch_size and settings.SMS_BATCH_WINDOW > 0:
+        await asyncio.sleep(settings.SMS_BATCH_WINDOW)
+        batch += await sync_to_async(claim_batch)(batch_size - len(batch), lease)
+
+    errors = await _batcher(batch).asend(backend, concurrency=concurrency)
+
+    @sync_to_async
+    def record_all():
+        for sms in batch:
+            record_attempt(sms, errors[sms.pk], stats)
+
+    await record_all()
+    return stats
@@ -0,0 +1,132 @@
+"""
+Pagination classes for the MainApp Django application.
+
+- KeysetPagination: Cursor pagination on ``(timestamp, id)``. Each page is fetched with an
+    indexed range condition instead of an OFFSET, so deep pages cost the same as the first one.
+- EstimatedCountPaginator: Django paginator for the admin that never runs an unbounded COUNT(*).
+"""
+
+
+import base64
+import binascii
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):  # pylint: disable=W0223
+    """
+    Paginates a queryset newest first, on ``(timestamp, id)``.
+
+    The ``cursor`` query parameter is an opaque token pointing after the last row of the
+    previous page; ``page_size`` can be lowered or raised up to settings.LIST_MAX_PAGE_SIZE.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = "Invalid cursor"
+
+    def __init__(self):
+        self.request = None
+        self.page_size = None
+        self.next_position = None
+
+    @staticmethod
+    def encode_cursor(timestamp, pk):
+        return base64.urlsafe_b64encode(f"{timestamp.isoformat()}|{pk}".encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            timestamp, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+            timestamp = parse_datetime(timestamp)
+            if timestamp is None:
+                raise ValueError
+            return timestamp, int(pk)
+        except (binascii.Error, UnicodeError, ValueError) as e:
+            raise NotFound(self.invalid_cursor_message) from e
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return settings.LIST_PAGE_SIZE
+        return min(max(page_size, 1), settings.LIST_MAX_PAGE_SIZE)
+
+    def _page_queryset(self, queryset, request):
+        """
+        Return the queryset of the requested page, with one extra row telling whether there is a next page.
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        queryset = queryset.order_by('-timestamp', '-id')
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            timestamp, pk = self.decode_cursor(cursor)
+            queryset = queryset.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=pk))
+        return queryset[:self.page_size + 1]
+
+    def _trim_page(self, page):
+        if len(page) > self.page_size:
+            page = page[:self.page_size]
+            self.next_position = (page[-1].timestamp, page[-1].pk)
+        return page
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self._trim_page(list(self._page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request):
+        """
+        Async version of ``paginate_queryset``, for async views.
+        """
+        return self._trim_page([row async for row in self._page_queryset(queryset, request)])
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(*self.next_position))
+
+    def get_paginated_data(self, data):
+        return {'next': self.get_next_link(), 'results': data}
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator whose count is either an estimate or bounded.
+
+    An unfiltered queryset on PostgreSQL uses the planner's row estimate for the table once it
+    exceeds settings.ADMIN_COUNT_LIMIT. Otherwise rows are counted up to that limit only, so
+    pages beyond it are not linked, and a filter is needed to reach older rows.
+    """
+
+    def _estimated_count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql' or queryset.query.where:
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples FROM pg_class WHERE oid = %s::regclass",
+                [connection.ops.quote_name(queryset.model._meta.db_table)],
+            )
+            row = cursor.fetchone()
+        return int(row[0]) if row else None
+
+    @cached_property
+    def count(self):
+        limit = settings.ADMIN_COUNT_LIMIT
+        estimate = self._estimated_count()
+        if estimate is not None and estimate > limit:
+            return estimate
+        return self.object_list[:limit].count()
@@ -0,0 +1,76 @@
+"""
+Request parsers for the MainApp Django application.
+
+orjson decodes JSON several times faster than the standard library. It is optional: without
+it the standard library decoder is used.
+
+- loads: Decodes a JSON document, rejecting NaN and Infinity as DRF's JSON parser does.
+- FastJSONParser: DRF's JSONParser, decoding with orjson when it is installed.
+- NDJSONParser: Parses newline-delimited JSON bodies into a list of objects, for bulk endpoints.
+"""
+
+
+import json
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+from rest_framework.utils.json import strict_constant
+
+try:
+    import orjson
+except ImportError:  # The standard library decoder is used instead
+    orjson = None
+
+
+def loads(content):
+    """
+    Decode a JSON document from UTF-8 bytes or a string.
+
+    Raises:
+        ValueError: The document is not valid JSON, or holds NaN or Infinity.
+    """
+    if orjson is not None:
+        return orjson.loads(content)  # orjson.JSONDecodeError is a ValueError
+    return json.loads(content, parse_constant=strict_constant)
+
+
+class FastJSONParser(JSONParser):
+    """
+    Parses ``application/json`` request bodies into the same data as DRF's JSONParser, with
+    orjson when it is installed. Bodies in a charset other than UTF-8, or with the STRICT_JSON
+    setting turned off, are parsed by DRF's parser.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or not self.strict or encoding.lower().replace('_', '-') not in ('utf-8', 'utf8'):
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return loads(stream.read())
+        except ValueError as e:
+            raise ParseError(f"JSON parse error - {e}") from e
+
+
+class NDJSONParser(BaseParser):
+    """
+    Parses ``application/x-ndjson`` request bodies.
+
+    Each non-blank line must hold one JSON value; the parsed result is a list of those values.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        rows = []
+        for line_number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rows.append(loads(line.decode(encoding)))
+            except ValueError as e:
+                raise ParseError(f"NDJSON parse error on line {line_number} - {e}") from e
+        return rows
@@ -0,0 +1,198 @@
+"""
+Per-customer order rollups for the MainApp Django application.
+
+CustomerRollup and CustomerDailyRollup rows are kept up to date incrementally: the Order
+signal handlers add or remove each order's contribution with single UPDATE statements, and
+bulk inserts apply the contributions of a whole batch at once. Writes that bypass both
+(e.g. ``QuerySet.update()`` on amounts) can be repaired with ``manage.py rebuild_rollups``.
+
+- add_orders: Adds the contribution of new orders to their customers' rollups.
+- remove_order: Removes the contribution of a deleted (or changed) order.
+- rebuild_rollups: Recomputes every rollup from the current and archived orders.
+
+Archived orders (see main_app.archive) keep counting in the rollups.
+"""
+
+
+from collections import defaultdict
+from itertools import islice
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, TruncDate
+from django.utils import timezone
+
+from .models import CustomerDailyRollup, CustomerRollup, Order, OrderArchive
+
+
+def _bump(model, lookup, count, amount, *, create=True, updates=None, initial=None):  # pylint: disable=R0913
+    """
+    Add ``count`` and ``amount`` to the rollup row matching ``lookup``.
+
+    The row is updated in place, along with any extra ``updates`` expressions. If it does
+    not exist yet and ``create`` is set, it is inserted with the ``initial`` extra values,
+    falling back to the update if a concurrent transaction inserted it first.
+    """
+    rows = model.objects.filter(**lookup)
+    changes = {'order_count': F('order_count') + count, 'total_amount': F('total_amount') + amount, **(updates or {})}
+    if rows.update(**changes) or not create:
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, order_count=count, total_amount=amount, **(initial or {}))
+    except IntegrityError:
+        rows.update(**changes)
+
+
+def _amount(value):
+    """
+    Return an order amount as a Decimal, whatever numeric type it was assigned as.
+    """
+    return Order._meta.get_field('amount').to_python(value)
+
+
+def add_orders(orders):
+    """
+    Add the contribution of the given saved orders to the customer and daily rollups.
+
+    Orders are grouped per customer and per day, so a batch costs one UPDATE per group.
+    """
+    totals, daily = defaultdict(lambda: [0, 0, None]), defaultdict(lambda: [0, 0])
+    for order in orders:
+        total = totals[order.customer_id]
+        total[0] += 1
+        total[1] += _amount(order.amount)
+        total[2] = order.timestamp if total[2] is None else max(total[2], order.timestamp)
+        day = daily[(order.customer_id, timezone.localdate(order.timestamp))]
+        day[0] += 1
+        day[1] += _amount(order.amount)
+
+    with transaction.atomic():
+        for customer_id, (count, amount, last_order_at) in totals.items():
+            _bump(
+                CustomerRollup, {'customer_id': customer_id}, count, amount,
+                # Greatest() is NULL on some databases when either side is NULL
+                updates={'last_order_at': Coalesce(Greatest('last_order_at', Value(last_order_at)), Value(last_order_at))},
+                initial={'last_order_at': last_order_at},
+            )
+        for (customer_id, day), (count, amount) in daily.items():
+            _bump(CustomerDailyRollup, {'customer_id': customer_id, 'day': day}, count, amount)
+
+
+def remove_order(customer_id, amount, timestamp):
+    """
+    Remove the contribution of an order with the given values from the rollups.
+
+    Rows are never created here: a customer being deleted takes its rollups with it.
+    """
+    amount = _amount(amount)
+    with transaction.atomic():
+        _bump(CustomerRollup, {'customer_id': customer_id}, -1, -amount, create=False)
+        _bump(
+            CustomerDailyRollup, {'customer_id': customer_id, 'day': timezone.localdate(timestamp)},
+            -1, -amount, create=False,
+        )
+        rollup = CustomerRollup.objects.filter(customer_id=customer_id, last_order_at=timestamp)
+        if rollup.exists():
+            # The removed order was the latest one; served by the (customer, timestamp) index
+            latest = Order.objects.filter(customer_id=customer_id).aggregate(latest=Max('timestamp'))['latest']
+            if latest is None:
+                latest = OrderArchive.objects.filter(customer_id=customer_id).aggregate(
+                    latest=Max('timestamp')
+                )['latest']
+            rollup.update(last_order_at=latest)
+
+
+def _bulk_insert(model, objs, batch_size):
+    """
+    Insert the model instances yielded by ``objs`` in batches, without materialising them all.
+
+    Returns:
+        The number of rows inserted.
+    """
+    inserted = 0
+    objs = iter(objs)
+    while batch := list(islice(objs, batch_size)):
+        model.objects.bulk_create(batch)
+        inserted += len(batch)
+    return inserted
+
+
+def _bulk_merge(model, keys, objs, batch_size):
+    """
+    Add the totals of the rollup instances yielded by ``objs`` to the saved rows with the same
+    ``keys``, in batches, inserting the instances that have no saved row.
+
+    Returns:
+        The number of rows inserted.
+    """
+    inserted = 0
+    objs = iter(objs)
+    while batch := list(islice(objs, batch_size)):
+        saved = {
+            tuple(getattr(row, key) for key in keys): row
+            for row in model.objects.filter(**{f"{key}__in": {getattr(obj, key) for obj in batch} for key in keys})
+        }
+        new, changed = [], []
+        for obj in batch:
+            row = saved.get(tuple(getattr(obj, key) for key in keys))
+            if row is None:
+                new.append(obj)
+                continue
+            row.order_count += obj.order_count
+            row.total_amount += obj.total_amount
+            if model is CustomerRollup:
+                row.last_order_at = max(row.last_order_at, obj.last_order_at)
+            changed.append(row)
+        model.objects.bulk_create(new)
+        fields = ['order_count', 'total_amount'] + (['last_order_at'] if model is CustomerRollup else [])
+        model.objects.bulk_update(changed, fields)
+        inserted += len(new)
+    return inserted
+
+
+def _rollups_of(orders, batch_size):
+    """
+    Return generators of the unsaved customer and daily rollups of an Order or OrderArchive queryset.
+    """
+    totals = orders.values('customer').annotate(
+        count=Count('id'), amount=Sum('amount'), last=Max('timestamp')
+    ).order_by()
+    daily = orders.annotate(day=TruncDate('timestamp')).values('customer', 'day').annotate(
+        count=Count('id'), amount=Sum('amount')
+    ).order_by()
+    return (
+        (
+            CustomerRollup(
+                customer_id=row['customer'], order_count=row['count'],
+                total_amount=row['amount'], last_order_at=row['last'],
+            )
+            for row in totals.iterator(chunk_size=batch_size)
+        ),
+        (
+            CustomerDailyRollup(
+                customer_id=row['customer'], day=row['day'], order_count=row['count'], total_amount=row['amount'],
+            )
+            for row in daily.iterator(chunk_size=batch_size)
+        ),
+    )
+
+
+def rebuild_rollups(batch_size=1000):
+    """
+    Recompute every customer and daily rollup from the current and archived orders.
+
+    Returns:
+        A tuple with the number of customer and daily rollup rows written.
+    """
+    with transaction.atomic():
+        CustomerRollup.objects.all().delete()
+        CustomerDailyRollup.objects.all().delete()
+        totals, daily = _rollups_of(Order.objects.all(), batch_size)
+        customers = _bulk_insert(CustomerRollup, totals, batch_size)
+        days = _bulk_insert(CustomerDailyRollup, daily, batch_size)
+        # Customers with archived orders mostly have current ones too, so add to their rows
+        totals, daily = _rollups_of(OrderArchive.objects.all(), batch_size)
+        customers += _bulk_merge(CustomerRollup, ['customer_id'], totals, batch_size)
+        days += _bulk_merge(CustomerDailyRollup, ['customer_id', 'day'], daily, batch_size)
+    return customers, days
@@ -0,0 +1,60 @@
+"""
+Database routing for the MainApp Django application.
+
+Writes always go to the primary ('default'). Reads go to one of the aliases listed in
+settings.DATABASE_REPLICAS, but only inside ``replica_reads()``: ReplicaPinningMiddleware
+enters it for read-only requests from clients that have not written recently. Everything
+else, including transactions, management commands and the SMS dispatcher, reads the primary,
+so a replica never serves ``select_for_update`` or data that has not been replicated yet.
+
+- replica_reads: Context manager allowing reads from the replicas.
+- ReplicaRouter: Database router sending allowed reads to a random replica.
+"""
+
+
+import contextvars
+import random
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+_use_replicas = contextvars.ContextVar('use_replicas', default=False)
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """
+    Let reads in the current context (thread or task) go to the replicas, or force them to
+    the primary with ``enabled=False``.
+    """
+    token = _use_replicas.set(enabled)
+    try:
+        yield
+    finally:
+        _use_replicas.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Routes reads to the replicas inside ``replica_reads()`` and everything else to the primary.
+    """
+
+    def db_for_read(self, model, **hints):  # pylint: disable=W0613
+        if settings.DATABASE_REPLICAS and _use_replicas.get():
+            return random.choice(settings.DATABASE_REPLICAS)
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):  # pylint: disable=W0613
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):  # pylint: disable=W0613
+        # Replicas hold the same data as the primary
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:  # pylint: disable=W0212
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):  # pylint: disable=W0613
+        # Replicas get their schema through replication
+        return db not in settings.DATABASE_REPLICAS
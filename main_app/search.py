@@ -0,0 +1,284 @@
+"""
+Customer search for the MainApp Django application.
+
+Type-ahead lookup of customers by name or code, with prefix and fuzzy (trigram) matching.
+Customers whose name or code starts with the search term come first, then the others by how
+closely the term matches a word of their name or code; at most ``limit`` are returned.
+
+On PostgreSQL the search is one query served by the trigram (pg_trgm) GIN indexes on name and
+code: ``ILIKE 'term%'`` and ``~* '\\mterm'`` for prefixes of the name, the code or any word of
+them, and the ``<%`` word-similarity operator for fuzzy matches, with
+settings.CUSTOMER_SEARCH_MIN_SIMILARITY as the threshold. Both rank like the in-memory index below.
+Terms shorter than MIN_TRIGRAM_TERM_LENGTH match most of the table that way and get no help
+from the trigram indexes, so they only look for names and codes starting with the term, the
+first ``limit`` of each in the btree ``text_pattern_ops`` indexes on lower(name) and
+lower(code), ranked by similarity.
+
+Other databases have neither, so each process keeps a CustomerSearchIndex in memory: a sorted
+list of the words of every name and code for prefix matches, and an inverted trigram index for
+fuzzy ones, scored like pg_trgm. It is built on the first search, kept up to date on Customer
+save and delete in this process, and rebuilt after settings.CUSTOMER_SEARCH_INDEX_TTL seconds
+to pick up other processes' writes and bulk imports. It holds every customer in memory, so it
+is meant for development and small deployments; large ones should run PostgreSQL.
+
+- trigrams: The pg_trgm trigrams of a text.
+- word_prefix_pattern: The PostgreSQL regular expression matching words that start with a term.
+- search_query: The PostgreSQL search query and parameters for a term.
+- CustomerSearchIndex: The in-memory prefix and trigram index.
+- customer_index: The process-wide CustomerSearchIndex instance.
+- search_customers: Returns the customers matching a term, best first.
+"""
+
+
+import bisect
+import copy
+import math
+import re
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connections, router, transaction
+
+from .models import Customer
+
+WORD = re.compile(r'\w+')
+PREFIX_CANDIDATES_PER_RESULT = 50
+MIN_TRIGRAM_TERM_LENGTH = 3
+
+SEARCH_SQL = """
+    SELECT id, name, code, active, "timestamp",
+        GREATEST(word_similarity(%(term)s, name), word_similarity(%(term)s, code)) AS score,
+        (name ILIKE %(prefix)s OR code ILIKE %(prefix)s OR name ~* %(word_prefix)s OR code ~* %(word_prefix)s)
+            AS prefix_match
+    FROM {table}
+    WHERE name ILIKE %(prefix)s OR code ILIKE %(prefix)s OR name ~* %(word_prefix)s OR code ~* %(word_prefix)s
+        OR %(term)s <%% name OR %(term)s <%% code
+    ORDER BY prefix_match DESC, score DESC, id
+    LIMIT %(limit)s
+"""
+
+# Each branch reads at most ``limit`` rows, in the order of its text_pattern_ops index
+SHORT_SEARCH_SQL = """
+    SELECT id, name, code, active, "timestamp",
+        GREATEST(word_similarity(%(term)s, name), word_similarity(%(term)s, code)) AS score,
+        TRUE AS prefix_match
+    FROM {table}
+    WHERE id IN (
+        (SELECT id FROM {table} WHERE lower(name) LIKE %(prefix)s ORDER BY lower(name) USING ~<~ LIMIT %(limit)s)
+        UNION
+        (SELECT id FROM {table} WHERE lower(code) LIKE %(prefix)s ORDER BY lower(code) USING ~<~ LIMIT %(limit)s)
+    )
+    ORDER BY score DESC, id
+    LIMIT %(limit)s
+"""
+
+
+def trigrams(text):
+    """
+    Return the set of trigrams of ``text`` the way pg_trgm extracts them: lower-cased, per
+    word, with each word padded by two spaces in front and one behind.
+    """
+    grams = set()
+    for word in WORD.findall(text.lower()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def word_prefix_pattern(term):
+    """
+    Return a PostgreSQL regular expression matching text with a word that starts with ``term``,
+    as the in-memory index's prefix matches do. ``\\m`` anchors at the start of a word.
+    """
+    # re.escape only backslashes non-alphanumeric characters, which PostgreSQL reads literally
+    return r'\m' + re.escape(term)
+
+
+def search_query(term, limit, table):
+    """
+    Return the PostgreSQL search query for ``term`` on ``table`` (quoted), and its parameters.
+    """
+    if len(term) < MIN_TRIGRAM_TERM_LENGTH:
+        return SHORT_SEARCH_SQL.format(table=table), {
+            'term': term, 'prefix': f"{_escape_like(term.lower())}%", 'limit': limit,
+        }
+    return SEARCH_SQL.format(table=table), {
+        'term': term, 'prefix': f"{_escape_like(term)}%", 'word_prefix': word_prefix_pattern(term), 'limit': limit,
+    }
+
+
+def _similarity(a, b):
+    # The best score over a customer's name, code and their words approximates pg_trgm's word_similarity()
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+def _escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+class CustomerSearchIndex:
+    """
+    In-memory prefix and trigram index of customer names and codes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._built_at = None
+        self._customers = {}  # pk -> (Customer, trigram sets of its name, code and their words)
+        self._words = []  # Sorted (word, pk) pairs
+        self._trigrams = {}  # trigram -> set of pks
+
+    def clear(self):
+        """
+        Drop the index; the next search rebuilds it.
+        """
+        with self._lock:
+            self._built_at = None
+            self._customers, self._words, self._trigrams = {}, [], {}
+
+    @staticmethod
+    def _words_of(customer):
+        # Each word, plus the whole name and code, so "savannah tr" matches as a prefix too
+        words = {word.lower() for word in WORD.findall(f"{customer.name} {customer.code}")}
+        return words | {customer.name.lower(), customer.code.lower()}
+
+    def _add(self, customer, sort=True):
+        texts = [customer.name, customer.code, *WORD.findall(f"{customer.name} {customer.code}")]
+        grams = [trigrams(text) for text in texts]
+        self._customers[customer.pk] = (customer, grams)
+        for word in self._words_of(customer):
+            if sort:
+                bisect.insort(self._words, (word, customer.pk))
+            else:
+                self._words.append((word, customer.pk))
+        for gram in set().union(*grams):
+            self._trigrams.setdefault(gram, set()).add(customer.pk)
+
+    def _remove(self, pk):
+        customer, grams = self._customers.pop(pk, (None, []))
+        if customer is None:
+            return
+        for word in self._words_of(customer):
+            position = bisect.bisect_left(self._words, (word, pk))
+            if position < len(self._words) and self._words[position] == (word, pk):
+                del self._words[position]
+        for gram in set().union(*grams):
+            self._trigrams.get(gram, set()).discard(pk)
+
+    def _ensure_built(self):
+        if self._built_at is not None and time.monotonic() - self._built_at < settings.CUSTOMER_SEARCH_INDEX_TTL:
+            return
+        customers = list(Customer.objects.only('id', 'name', 'code', 'active', 'timestamp').iterator(chunk_size=10000))
+        with self._lock:
+            self._customers, self._words, self._trigrams = {}, [], {}
+            for customer in customers:
+                self._add(customer, sort=False)
+            self._words.sort()
+            self._built_at = time.monotonic()
+
+    def update(self, customer):
+        """
+        Add or replace a saved customer, if the index has been built.
+        """
+        with self._lock:
+            if self._built_at is not None:
+                self._remove(customer.pk)
+                self._add(copy.copy(customer))
+
+    def remove(self, pk):
+        """
+        Remove a deleted customer, if the index has been built.
+        """
+        with self._lock:
+            if self._built_at is not None:
+                self._remove(pk)
+
+    def _prefix_matches(self, term, most):
+        """
+        Return up to ``most`` pks of customers with a word, name or code starting with ``term``.
+        """
+        matches = set()
+        position = bisect.bisect_left(self._words, (term,))
+        while position < len(self._words) and self._words[position][0].startswith(term) and len(matches) < most:
+            matches.add(self._words[position][1])
+            position += 1
+        return matches
+
+    def _fuzzy_candidates(self, term_grams, min_similarity, most):
+        """
+        Return up to ``most`` pks of the customers sharing the most trigrams with the term.
+
+        A word with similarity s to the term shares at least s * len(term_grams) trigrams with
+        it, so it has one of the rarest len - needed + 1 of them: only those posting lists are
+        counted.
+        """
+        postings = sorted((self._trigrams.get(gram, set()) for gram in term_grams), key=len)
+        needed = max(math.ceil(min_similarity * len(term_grams)), 1)
+        shared = Counter()
+        for pks in postings[:len(postings) - needed + 1]:
+            shared.update(pks)
+        return {pk for pk, _ in shared.most_common(most)}
+
+    def search(self, term, limit, min_similarity):
+        """
+        Return up to ``limit`` ``(customer, score, prefix_match)`` tuples, best first.
+        """
+        self._ensure_built()
+        term = term.lower()
+        term_grams = trigrams(term)
+        # Short terms are the prefix of many words; rank only the first few hundred
+        most = limit * PREFIX_CANDIDATES_PER_RESULT
+        with self._lock:
+            prefix = self._prefix_matches(term, most)
+            candidates = set(prefix)
+            if len(prefix) < limit:  # Prefix matches rank first; fuzzy ones only fill up the rest
+                candidates |= self._fuzzy_candidates(term_grams, min_similarity, most)
+            results = []
+            for pk in candidates:
+                customer, grams = self._customers[pk]
+                score = max(_similarity(term_grams, text_grams) for text_grams in grams)
+                if pk in prefix or score >= min_similarity:
+                    results.append((copy.copy(customer), score, pk in prefix))
+        results.sort(key=lambda result: (not result[2], -result[1], result[0].pk))
+        return results[:limit]
+
+
+customer_index = CustomerSearchIndex()
+
+
+def search_customers(term, limit=None):
+    """
+    Return the customers whose name or code starts with, or resembles, ``term``.
+
+    Args:
+        term: The search term.
+        limit: Maximum number of customers (default settings.CUSTOMER_SEARCH_LIMIT).
+
+    Returns:
+        A list of Customers, best match first, each with a ``score`` (0 to 1, the trigram
+        similarity of the term to the best matching word) and a ``prefix_match`` flag.
+    """
+    term = term.strip()
+    limit = limit or settings.CUSTOMER_SEARCH_LIMIT
+    if not term:
+        return []
+    using = router.db_for_read(Customer)
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        with transaction.atomic(using=using):
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT set_config('pg_trgm.word_similarity_threshold', %s, true)",
+                    [str(settings.CUSTOMER_SEARCH_MIN_SIMILARITY)],
+                )
+            return list(Customer.objects.using(using).raw(
+                *search_query(term, limit, connection.ops.quote_name(Customer._meta.db_table))
+            ))
+
+    customers = []
+    for customer, score, prefix_match in customer_index.search(term, limit, settings.CUSTOMER_SEARCH_MIN_SIMILARITY):
+        customer.score, customer.prefix_match = score, prefix_match
+        customers.append(customer)
+    return customers
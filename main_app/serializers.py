@@ -4,19 +4,103 @@ Serializers for the main_app models.
 This module defines serializers for User, Customer, and Order models,
     converting complex data types and handling validation.
 
+- ConstraintFirstMixin: Leaves unique fields to the database's unique constraints instead of
+    checking them with a query before the INSERT.
 - UserSerializer: Manages user creation with hashed passwords.
+- CachedCustomerField: Resolves an order's customer through the customer cache instead of a query per request.
 - CustomerSerializer: Handles Customer model data, with read-only fields.
-- OrderSerializer: Manages Order model data, with specific fields read-only.
+- CustomerSearchSerializer: A customer search result, with its match score.
+- CustomerImportSerializer: Validates one imported customer row; the upsert updates existing codes.
+- OrderSerializer: Manages Order model data, with specific fields read-only and the customer resolved
+    through the customer cache.
+- OrderListSerializer: Read representation of an Order for list endpoints, with the customer's name and code.
+- CustomerRollupSerializer / CustomerDailyRollupSerializer: Read-only representations of customer rollups.
 """
 
 
+from contextlib import nullcontext
+
 from django.contrib.auth import get_user_model
+from django.core.exceptions import FieldDoesNotExist
+from django.db import IntegrityError, router, transaction
 from rest_framework import serializers
-from .models import Customer, Order
+from rest_framework.exceptions import ErrorDetail
+from rest_framework.utils.field_mapping import get_unique_error_message
+from rest_framework.validators import UniqueValidator
+from .cache import customer_cache
+from .models import Customer, CustomerDailyRollup, CustomerRollup, Order
 
 User = get_user_model()  # Get the user model
 
-class UserSerializer(serializers.ModelSerializer):
+
+class ConstraintFirstMixin:
+    """
+    ModelSerializer mixin that leaves unique fields to the database.
+
+    DRF's UniqueValidator checks a unique field with a SELECT before every INSERT, which costs
+    a round trip and still lets two concurrent requests pass the check, so one of them fails
+    with an IntegrityError. This mixin drops those validators and saves straight away; when
+    the INSERT violates a unique constraint, the fields whose values are taken get the error
+    UniqueValidator would have given (found with one query, on that path only).
+
+    A request with errors in other fields reports only those, since it never reaches the INSERT.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        for field in fields.values():
+            field.validators = [validator for validator in field.validators if not isinstance(validator, UniqueValidator)]
+        return fields
+
+    def unique_errors(self, attrs):
+        """
+        Return the UniqueValidator errors of the unique fields whose values in ``attrs`` are taken.
+        """
+        model = self.Meta.model
+        instance = getattr(self, 'instance', None)
+        errors = {}
+        for name, field in self.fields.items():
+            if field.read_only or field.source not in attrs:
+                continue
+            try:
+                model_field = model._meta.get_field(field.source)  # pylint: disable=W0212
+            except FieldDoesNotExist:
+                continue
+            if not model_field.unique or model_field.primary_key:
+                continue
+            taken = model._default_manager.filter(**{field.source: attrs[field.source]})  # pylint: disable=W0212
+            if instance is not None:
+                taken = taken.exclude(pk=instance.pk)
+            if taken.exists():
+                errors[name] = [ErrorDetail(get_unique_error_message(model_field), code='unique')]
+        return errors
+
+    def write(self, save, attrs):
+        """
+        Call ``save()``, turning a unique constraint violation into a ValidationError.
+
+        Inside a transaction the INSERT runs in a savepoint, because a failed statement aborts
+        the whole transaction on PostgreSQL; outside one it fails on its own.
+
+        Raises:
+            ValidationError: A unique field's value is taken.
+        """
+        connection = transaction.get_connection(router.db_for_write(self.Meta.model))
+        try:
+            with transaction.atomic(using=connection.alias) if connection.in_atomic_block else nullcontext():
+                return save()
+        except IntegrityError as e:
+            errors = self.unique_errors(attrs)
+            if not errors:
+                raise
+            raise serializers.ValidationError(errors) from e
+
+    def save(self, **kwargs):
+        save = super().save
+        return self.write(lambda: save(**kwargs), {**self.validated_data, **kwargs})
+
+
+class UserSerializer(ConstraintFirstMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['username', 'password', 'email']
@@ -29,9 +113,38 @@ class UserSerializer(serializers.ModelSerializer):
         return user
 
 
-class CustomerSerializer(serializers.ModelSerializer):
+class CachedCustomerField(serializers.PrimaryKeyRelatedField):
+    """
+    Customer field that resolves the primary key through the two-tier customer cache.
+    Error messages are the same as PrimaryKeyRelatedField's.
+    """
+
+    def lookup(self, pk):
+        return customer_cache.get(pk)
+
+    def resolve(self, data, lookup):
+        """
+        Return the customer ``lookup`` finds for the primary key ``data``, or fail as
+        PrimaryKeyRelatedField would.
+        """
+        try:
+            if isinstance(data, bool):
+                raise TypeError
+            customer = lookup(int(data))
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if customer is None:
+            self.fail('does_not_exist', pk_value=data)
+        return customer
+
+    def to_internal_value(self, data):
+        return self.resolve(data, self.lookup)
+
+
+class CustomerSerializer(ConstraintFirstMixin, serializers.ModelSerializer):
     """
     Serializer for the Customer model.
+    A taken code is reported when the INSERT hits the unique constraint, not checked beforehand.
     """
 
     class Meta:
@@ -46,10 +159,30 @@ class CustomerSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'timestamp']  # These fields cannot be modified directly
 
 
+class CustomerSearchSerializer(CustomerSerializer):
+    """
+    Serializer for a customer search result.
+    Adds the trigram similarity of the search term and whether the name or code starts with it.
+    """
+    score = serializers.FloatField(read_only=True)
+    prefix_match = serializers.BooleanField(read_only=True)
+
+    class Meta(CustomerSerializer.Meta):
+        fields = CustomerSerializer.Meta.fields + ['score', 'prefix_match']
+
+
+class CustomerImportSerializer(CustomerSerializer):
+    """
+    Serializer for one row of a customer import.
+    Existing codes are updated rather than rejected; rows are written by the importer's upsert.
+    """
+
+
 class OrderSerializer(serializers.ModelSerializer):
     """
     Serializer for the Order model.
     """
+    customer = CachedCustomerField(queryset=Customer.objects.all())
 
     class Meta:
         model = Order
@@ -63,3 +196,37 @@ class OrderSerializer(serializers.ModelSerializer):
             'slug'
         ]
         read_only_fields = ['id', 'timestamp', 'slug']  # These fields cannot be modified directly
+
+
+class OrderListSerializer(OrderSerializer):
+    """
+    Serializer for listing Orders.
+    Adds the customer's name and code; use it with ``select_related('customer')``.
+    """
+    customer_name = serializers.CharField(source='customer.name', read_only=True)
+    customer_code = serializers.CharField(source='customer.code', read_only=True)
+
+    class Meta(OrderSerializer.Meta):
+        fields = OrderSerializer.Meta.fields + ['customer_name', 'customer_code']
+
+
+class CustomerDailyRollupSerializer(serializers.ModelSerializer):
+    """
+    Serializer for the CustomerDailyRollup model.
+    """
+
+    class Meta:
+        model = CustomerDailyRollup
+        fields = ['day', 'order_count', 'total_amount']
+        read_only_fields = fields
+
+
+class CustomerRollupSerializer(serializers.ModelSerializer):
+    """
+    Serializer for the CustomerRollup model.
+    """
+
+    class Meta:
+        model = CustomerRollup
+        fields = ['customer', 'order_count', 'total_amount', 'last_order_at']
+        read_only_fields = fields
@@ -4,18 +4,127 @@ Signal handlers for the MainApp Django application.
 This module defines signals that are triggered during specific model events, such as saving an Order.
 It includes functionality for generating unique slugs for Order instances before they are saved.
 
-- create_slug: A helper function that generates a unique slug based on a specified field and checks for existing slugs.
+Slugs are allocated from a per-base SlugCounter instead of probing existing slugs, so the
+number of queries per save stays the same however many orders share an item name. The first
+order for a base gets ``<base>``, later ones get ``<base>-<n>``; the unique index on the slug
+column guarantees that concurrent saves can never store the same slug.
+
+- slug_base: Builds the slug base for an instance.
+- reserve_slug_numbers: Atomically reserves a range of counter values for a slug base.
+- assign_slugs: Assigns unique slugs to a batch of unsaved instances, for bulk inserts
+    that bypass the pre_save signal.
+- create_slug: Generates a unique slug for a single instance.
 - presave_order: A signal handler that sets a unique slug for Order instances before saving them to the database.
+- order_saved / order_deleted: Signal handlers that keep the customer rollups in step with orders.
+- order_created: A signal handler that publishes a new Order to the real-time order feed on commit.
+- customer_changed: A signal handler that drops a saved or deleted Customer from the customer cache.
+- customer_search_saved / customer_search_deleted: Signal handlers that keep this process's in-memory
+    customer search index up to date.
+- user_changed: A signal handler that drops a saved or deleted User from the authentication cache.
+
+The time spent in each handler is recorded in the signal_handler_duration_seconds metric.
 """
 
 
-from django.db.models.signals import pre_save
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.utils.text import slugify
-from .models import Order
+from .authentication import user_cache
+from .cache import customer_cache
+from .feed import publish_orders
+from .metrics import SIGNAL_HANDLER_SECONDS
+from .models import Customer, Order, SlugCounter
+from .rollups import add_orders, remove_order
+from .search import customer_index
+
+# Leave room for the "-<n>" suffix within the 255 characters of the slug column
+SLUG_BASE_MAX_LENGTH = 240
+
+
+def slug_base(instance, field_name='item'):
+    """
+    Return the slug base for the given instance, built from ``field_name``.
+    Falls back to the model name when the field has nothing to slugify.
+    """
+    return slugify(getattr(instance, field_name))[:SLUG_BASE_MAX_LENGTH].strip('-') or instance._meta.model_name
+
+
+def reserve_slug_numbers(model_class, base, count=1):
+    """
+    Reserve ``count`` consecutive slug numbers for ``base``.
+
+    The counter row is incremented before it is read, so the row lock taken by the UPDATE
+    serialises concurrent reservations for the same base. This costs two queries, plus one
+    INSERT the first time a base is seen.
+
+    Args:
+        model_class: The model class the slugs are for.
+        base: The slug base.
+        count: How many numbers to reserve.
+
+    Returns:
+        A range of reserved numbers, starting at 1 for a new base.
+    """
+    scope = model_class._meta.label_lower
+    counters = SlugCounter.objects.filter(scope=scope, base=base)
+    with transaction.atomic():
+        if not counters.update(value=F('value') + count):
+            try:
+                with transaction.atomic():
+                    SlugCounter.objects.create(scope=scope, base=base, value=count)
+                return range(1, count + 1)
+            except IntegrityError:
+                # Another transaction created the counter first
+                counters.update(value=F('value') + count)
+        end = counters.values_list('value', flat=True).get()
+    return range(end - count + 1, end + 1)
+
+
+def _numbered_slug(base, number):
+    return base if number == 1 else f"{base}-{number}"
+
+
+def assign_slugs(instances, model_class, field_name='item', slug_field='slug'):
+    """
+    Assign unique slugs to a batch of unsaved model instances.
+
+    Counter values are reserved once per distinct base in the batch, then a single query
+    checks the candidates against slugs that another base happened to produce
+    (e.g. a "Sugar 2" item against the second "Sugar"); clashing instances are re-numbered.
+
+    Args:
+        instances: The unsaved model instances.
+        model_class: The model class to check for existing slugs.
+        field_name: The name of the field to base the slug on (default is 'item').
+        slug_field: The name of the field to store the slug (default is 'slug').
+    """
+    pending = [instance for instance in instances if not getattr(instance, slug_field)]
+    while pending:
+        groups = {}
+        for instance in pending:
+            groups.setdefault(slug_base(instance, field_name), []).append(instance)
+        for base, group in groups.items():
+            for instance, number in zip(group, reserve_slug_numbers(model_class, base, len(group))):
+                setattr(instance, slug_field, _numbered_slug(base, number))
+
+        candidates, pending = {}, []
+        for instance in [instance for group in groups.values() for instance in group]:
+            slug = getattr(instance, slug_field)
+            if slug in candidates:  # Two bases produced the same slug within the batch
+                setattr(instance, slug_field, None)
+                pending.append(instance)
+            else:
+                candidates[slug] = instance
+        taken = model_class.objects.filter(**{f"{slug_field}__in": list(candidates)})
+        for slug in taken.values_list(slug_field, flat=True):
+            setattr(candidates[slug], slug_field, None)
+            pending.append(candidates[slug])
 
 
-def create_slug(instance, model_class, field_name='item', slug_field='slug', new_slug=None):
+def create_slug(instance, model_class, field_name='item', slug_field='slug'):
     """
     Generate a unique slug for the given model instance.
 
@@ -24,25 +133,102 @@ def create_slug(instance, model_class, field_name='item', slug_field='slug', new
         model_class: The model class to check for existing slugs.
         field_name: The name of the field to base the slug on (default is 'item').
         slug_field: The name of the field to store the slug (default is 'slug').
-        new_slug: A new slug to use if provided.
 
     Returns:
         A unique slug string.
     """
-    slug = slugify(getattr(instance, field_name))  # Create slug from the 'item' field
-    if new_slug is not None:
-        slug = new_slug
-    model_class_qs = model_class.objects.filter(**{slug_field: slug})  # Check if slug exists
-    if model_class_qs.exists():
-        new_slug = f"{slug}-{model_class_qs.first().id}"  # Append ID to slug if it already exists
-        return create_slug(instance, model_class, field_name, slug_field, new_slug=new_slug)
-    return slug
+    base = slug_base(instance, field_name)
+    while True:
+        slug = _numbered_slug(base, reserve_slug_numbers(model_class, base)[0])
+        if not model_class.objects.filter(**{slug_field: slug}).exists():
+            return slug
 
 
 @receiver(pre_save, sender=Order)
+@SIGNAL_HANDLER_SECONDS.timer(handler='presave_order')
 def presave_order(sender, instance, *args, **kwargs):  # pylint: disable=W0613
     """
     Signal handler to set a unique slug for Order instances before saving.
     """
     if not instance.slug:  # Only set the slug if it doesn't exist
         instance.slug = create_slug(instance, Order)  # Generate and set the unique slug
+    if instance.pk and not instance._state.adding:  # pylint: disable=W0212
+        # Remember what the order contributed to the rollups before this update
+        instance._rollup_previous = Order.objects.filter(pk=instance.pk).values(  # pylint: disable=W0212
+            'customer_id', 'amount', 'timestamp'
+        ).first()
+
+
+@receiver(post_save, sender=Order)
+@SIGNAL_HANDLER_SECONDS.timer(handler='order_saved')
+def order_saved(sender, instance, created, *args, **kwargs):  # pylint: disable=W0613
+    """
+    Signal handler to add a saved Order to the customer rollups, replacing its previous values on update.
+    """
+    previous = getattr(instance, '_rollup_previous', None)
+    instance._rollup_previous = None  # pylint: disable=W0212
+    if not created:
+        current = {'customer_id': instance.customer_id, 'amount': instance.amount, 'timestamp': instance.timestamp}
+        if previous is None or previous == current:
+            return  # Nothing the rollups depend on has changed
+        remove_order(**previous)
+    add_orders([instance])
+
+
+@receiver(post_save, sender=Order)
+@SIGNAL_HANDLER_SECONDS.timer(handler='order_created')
+def order_created(sender, instance, created, *args, **kwargs):  # pylint: disable=W0613
+    """
+    Signal handler to publish a new Order to the order feed once the transaction commits.
+    """
+    if created:
+        publish_orders([instance], using=kwargs.get('using'))
+
+
+@receiver(post_delete, sender=Order)
+@SIGNAL_HANDLER_SECONDS.timer(handler='order_deleted')
+def order_deleted(sender, instance, *args, **kwargs):  # pylint: disable=W0613
+    """
+    Signal handler to remove a deleted Order from the customer rollups.
+    """
+    remove_order(instance.customer_id, instance.amount, instance.timestamp)
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+@SIGNAL_HANDLER_SECONDS.timer(handler='customer_changed')
+def customer_changed(sender, instance, *args, **kwargs):  # pylint: disable=W0613
+    """
+    Signal handler to invalidate the cached copy of a saved or deleted Customer.
+    """
+    customer_cache.invalidate_on_commit(instance.pk)
+
+
+@receiver(post_save, sender=Customer)
+@SIGNAL_HANDLER_SECONDS.timer(handler='customer_search_saved')
+def customer_search_saved(sender, instance, *args, **kwargs):  # pylint: disable=W0613
+    """
+    Signal handler to add a saved Customer to the search index once the transaction commits.
+    """
+    transaction.on_commit(lambda: customer_index.update(instance))
+
+
+@receiver(post_delete, sender=Customer)
+@SIGNAL_HANDLER_SECONDS.timer(handler='customer_search_deleted')
+def customer_search_deleted(sender, instance, *args, **kwargs):  # pylint: disable=W0613
+    """
+    Signal handler to remove a deleted Customer from the search index once the transaction commits.
+    """
+    pk = instance.pk  # Cleared when the delete completes
+    transaction.on_commit(lambda: customer_index.remove(pk))
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+@SIGNAL_HANDLER_SECONDS.timer(handler='user_changed')
+def user_changed(sender, instance, *args, **kwargs):  # pylint: disable=W0613
+    """
+    Signal handler to drop a saved or deleted User from this process's authentication cache,
+    so deactivation takes effect here at once. Other processes reload it within the cache TTL.
+    """
+    user_cache.invalidate(instance.pk)
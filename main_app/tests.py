@@ -4,20 +4,96 @@ Tests for the MainApp Django application.
 This module contains tests for the views that handle requests related to customers and orders.
 
 - SignUpView: Tests for user registration functionality.
+- TokenAuthenticationTest: Tests for resolving API users from JWT claims.
 - CustomerAPITest: Tests for creating and managing customers.
+- CustomerSearchTest: Tests for the type-ahead customer search.
+- CustomerImportAPITest: Tests for importing customers from CSV and NDJSON.
 - OrderAPITest: Tests for creating and managing orders.
+- ListAPITest: Tests for the keyset-paginated customer and order lists.
+- AsyncViewTest: Tests for the async customer and order views.
+- IdempotencyTest: Tests for Idempotency-Key handling on customer and order POSTs.
+- OrderBulkAPITest: Tests for creating orders in bulk.
+- FastSerializerTest: Tests that the fast-path serializers match the DRF serializers.
+- JSONRenderingTest: Tests for the orjson renderer and parser and for response compression.
+- CustomerRollupTest: Tests for the incrementally maintained customer rollups.
+- OrderArchiveTest: Tests for moving old and inactive orders to the archive.
+- OrderExportTest: Tests for streaming order exports as CSV and NDJSON.
+- OrderFeedTest: Tests for the real-time order feed and its fanout.
+- CustomerCacheTest: Tests for the two-tier customer lookup cache.
+- AdminChangelistTest: Tests for the admin changelists on large tables.
+- ReplicaRoutingTest: Tests for routing reads to the database replicas.
+- SlugAllocationTest: Tests for allocating unique order slugs.
+- SmsDispatcherTest: Tests for delivering queued SMS notifications from the outbox in batches.
+- LoadTestHarnessTest: Tests for the load-test request mixes and result summaries.
+- MetricsTest: Tests for the request, SMS and signal metrics and the /metrics endpoint.
+- StartupTest: Tests for the lazy SMS SDK initialisation and the start-up profiler.
 """
+# pylint: disable=C0302
 
 # Standard library imports
+import asyncio
+import concurrent.futures
+import csv
+import gzip
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection, router
+from django.http import HttpResponse
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 
 # Third-party imports
 from rest_framework import status
-from rest_framework.test import APITestCase, APIClient
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase, APIClient, force_authenticate
+from rest_framework_simplejwt.tokens import AccessToken
 
 # Local application imports
-from .models import Customer, Order
+from . import loadtest, metrics, parsers, renderers
+from .archive import archive_orders
+from .async_views import async_customer_view, async_order_view, order_feed_view
+from .authentication import ClaimsUser, FeedToken, user_cache
+from .breaker import CircuitBreaker, CircuitOpenError
+from .bulk import create_orders_in_bulk
+from .cache import customer_cache
+from .fast_serializers import FastCustomerSerializer, FastOrderListSerializer, FastOrderSerializer
+from .feed import FeedEvent, order_feed
+from .idempotency import fingerprint
+from .management.commands.profile_startup import parse_importtime
+from .middleware import CompressionMiddleware, ReplicaPinningMiddleware, accepted_encodings
+from .models import (
+    Customer, CustomerDailyRollup, CustomerRollup, IdempotencyKey, Order, OrderArchive, OutboundSms,
+)
+from .pagination import EstimatedCountPaginator
+from .parsers import FastJSONParser
+from .renderers import FastJSONRenderer
+from .outbox import adispatch_pending, claim_batch, dispatch_pending, enqueue_sms
+from .rollups import rebuild_rollups
+from .routers import replica_reads
+from .search import customer_index, search_query, trigrams, word_prefix_pattern
+from .serializers import CustomerSerializer, OrderListSerializer, OrderSerializer
+from .signals import assign_slugs
+from .utils import LocmemBackend, SmsBatcher, africastalking_sms, gateway_breaker, send_bulk_sms, send_sms
+from .views import order_export_view
 
 User = get_user_model()
 
@@ -40,6 +116,59 @@ class SignUpAPITest(APITestCase):
         self.assertEqual(User.objects.get().username, 'testuser')
 
 
+class TokenAuthenticationTest(APITestCase):
+
+    def setUp(self):
+        user_cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+        self.customer_url = reverse('customer_view')
+
+    def test_user_row_is_loaded_once(self):
+        """
+        Ensure only the first request of a user loads the User row.
+        """
+        with CaptureQueriesContext(connection) as cold:
+            response = self.client.get(self.customer_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsInstance(response.wsgi_request.user, ClaimsUser)
+        with CaptureQueriesContext(connection) as warm:
+            self.client.get(self.customer_url)
+        self.assertEqual(len(warm), len(cold) - 1)
+        self.assertEqual(user_cache.stats()['hits'], 1)
+
+    def test_deactivated_user_is_rejected(self):
+        """
+        Ensure saving a deactivated user rejects their token at once.
+        """
+        self.client.get(self.customer_url)
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(self.customer_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response.data['detail'].code, 'user_inactive')
+
+    def test_deactivation_bypassing_signals_is_bounded_by_ttl(self):
+        """
+        Ensure a deactivation made without saving the user applies once the cached row expires.
+        """
+        self.client.get(self.customer_url)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.client.get(self.customer_url).status_code, status.HTTP_200_OK)
+        with override_settings(AUTH_USER_CACHE_TTL=0):
+            user_cache.invalidate(self.user.pk)
+            self.assertEqual(self.client.get(self.customer_url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_staff_flag_comes_from_user_row(self):
+        """
+        Ensure staff-only endpoints see the user's current staff flag.
+        """
+        self.assertEqual(self.client.get(reverse('cache_stats_view')).status_code, status.HTTP_403_FORBIDDEN)
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(self.client.get(reverse('cache_stats_view')).status_code, status.HTTP_200_OK)
+
+
 class CustomerAPITest(APITestCase):
 
     def setUp(self):
@@ -91,6 +220,35 @@ class CustomerAPITest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertEqual(Customer.objects.count(), 0)  # No new customer should be created
 
+    def test_duplicate_code_is_rejected_by_the_database(self):
+        """
+        Ensure a taken code gets the same 400 payload as before, found by the INSERT instead of a SELECT before it.
+        """
+        self.client.post(self.customer_url, self.customer_data, format='json')
+        response = self.client.post(self.customer_url, {**self.customer_data, 'name': 'Other'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json(), {'code': ['customer with this code already exists.']})
+        self.assertEqual(Customer.objects.count(), 1)
+
+        # The same error from within a transaction (an idempotent request) leaves it usable
+        response = self.client.post(
+            self.customer_url, self.customer_data, format='json', HTTP_IDEMPOTENCY_KEY='duplicate',
+        )
+        self.assertEqual(response.json(), {'code': ['customer with this code already exists.']})
+        retry = self.client.post(self.customer_url, self.customer_data, format='json', HTTP_IDEMPOTENCY_KEY='duplicate')
+        self.assertEqual((retry.status_code, retry['Idempotent-Replayed']), (status.HTTP_400_BAD_REQUEST, 'true'))
+
+    def test_create_customer_skips_uniqueness_query(self):
+        """
+        Ensure creating a customer touches the customer table once, with the INSERT.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.customer_url, self.customer_data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        customer_queries = [query['sql'] for query in queries if 'main_app_customer"' in query['sql']]
+        self.assertEqual(len(customer_queries), 1)
+        self.assertTrue(customer_queries[0].startswith('INSERT'))
+
     def test_create_customer_unauthenticated(self):
         """
         Test creating a customer when not authenticated.
@@ -100,6 +258,189 @@ class CustomerAPITest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
+class CustomerSearchTest(APITestCase):
+
+    def setUp(self):
+        customer_index.clear()
+        self.addCleanup(customer_index.clear)
+        user = User.objects.create_user(username='testuser', password='testpassword')
+        self.client.force_authenticate(user=user)
+        for name, code in [
+            ('Savannah Traders', 'SAV001'), ('Savanna Foods', 'SF002'),
+            ('Nairobi Savings', 'NS003'), ('Mombasa Hardware', 'MB004'),
+        ]:
+            Customer.objects.create(name=name, code=code)
+
+    def search(self, q, **params):
+        response = self.client.get(reverse('customer_search_view'), {'q': q, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['results']
+
+    def test_trigrams_match_pg_trgm(self):
+        """
+        Ensure trigrams are extracted per word, lower-cased and padded like pg_trgm does.
+        """
+        self.assertEqual(trigrams('Ab c'), {'  a', ' ab', 'ab ', '  c', ' c '})
+
+    def test_prefix_matches_come_first(self):
+        """
+        Ensure customers whose name, a word of it, or code starts with the term are returned first.
+        """
+        results = self.search('sav')
+        self.assertEqual({row['code'] for row in results}, {'SAV001', 'SF002', 'NS003'})
+        self.assertTrue(all(row['prefix_match'] for row in results))
+        self.assertEqual(self.search('mb0')[0]['code'], 'MB004')
+        self.assertEqual(self.search('savannah tr')[0]['code'], 'SAV001')
+
+    def test_word_prefix_pattern_matches_words_literally(self):
+        """
+        Ensure the PostgreSQL word prefix pattern anchors at a word start and escapes regex syntax.
+        """
+        self.assertEqual(word_prefix_pattern('sav'), r'\msav')
+        self.assertEqual(word_prefix_pattern('a.b+(c'), r'\ma\.b\+\(c')
+
+    def test_short_terms_use_bounded_prefix_query(self):
+        """
+        Ensure PostgreSQL terms too short for the trigram indexes get a prefix-only query limited per index.
+        """
+        sql, params = search_query('S_', 10, '"main_app_customer"')
+        self.assertEqual(params, {'term': 'S_', 'prefix': 's\\_%', 'limit': 10})
+        self.assertNotIn('<%%', sql)
+        self.assertEqual(sql.count('LIMIT %(limit)s'), 3)
+        sql, params = search_query('sav', 10, '"main_app_customer"')
+        self.assertIn('<%%', sql)
+        self.assertEqual(params['word_prefix'], r'\msav')
+
+    def test_fuzzy_matches_are_ranked_by_similarity(self):
+        """
+        Ensure misspelt terms find the closest names, best first.
+        """
+        results = self.search('savanah')
+        self.assertEqual([row['code'] for row in results[:2]], ['SAV001', 'SF002'])
+        self.assertFalse(results[0]['prefix_match'])
+        self.assertGreater(results[0]['score'], results[-1]['score'])
+        self.assertEqual([row['code'] for row in self.search('mombsa')], ['MB004'])
+        self.assertEqual(self.search('zzzz'), [])
+
+    def test_results_are_bounded_and_validated(self):
+        """
+        Ensure the limit is applied and capped, and a missing term is rejected.
+        """
+        self.assertEqual(len(self.search('sav', limit=1)), 1)
+        self.assertEqual(len(self.search('sav', limit=1000)), 3)
+        response = self.client.get(reverse('customer_search_view'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(reverse('customer_search_view'), {'q': 'sav', 'limit': 'x'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_index_follows_customer_writes(self):
+        """
+        Ensure saved and deleted customers are added to and removed from a built index on commit.
+        """
+        self.assertEqual(self.search('kisumu'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            customer = Customer.objects.create(name='Kisumu Grocers', code='KG005')
+        self.assertEqual([row['code'] for row in self.search('kisumu')], ['KG005'])
+        with self.captureOnCommitCallbacks(execute=True):
+            customer.name = 'Eldoret Grocers'
+            customer.save()
+        self.assertEqual(self.search('kisumu'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            customer.delete()
+        self.assertEqual(self.search('eldoret'), [])
+
+
+class CustomerImportAPITest(APITestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.signup_url = reverse('signup')
+        self.import_url = reverse('customer_import_view')
+
+        # Create a user for authentication
+        self.client.post(self.signup_url, {
+            'username': 'testuser',
+            'password': 'testpassword',
+            'email': 'test@example.com'
+        })
+
+        # Obtain JWT token
+        response = self.client.post(reverse('token_obtain_pair'), {
+            'username': 'testuser',
+            'password': 'testpassword'
+        })
+        self.token = response.data['access']
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.token)  # Set the token for authentication
+
+        Customer.objects.create(name='Old Name', code='CUST1', active=True)
+
+    def test_import_csv_upserts_on_code(self):
+        """
+        Ensure a CSV body creates new customers, updates existing codes and rejects invalid rows.
+        """
+        body = "name,code,active\nNew Name,CUST1,false\nSecond,CUST2,\n,CUST3,true\n"
+        response = self.client.post(self.import_url, body, content_type='text/csv')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(response.data['updated'], 1)
+        self.assertEqual(response.data['rejected'], 1)
+        self.assertEqual(response.data['errors'][0]['line'], 4)
+        updated = Customer.objects.get(code='CUST1')
+        self.assertEqual(updated.name, 'New Name')
+        self.assertFalse(updated.active)
+        self.assertTrue(Customer.objects.get(code='CUST2').active)
+        self.assertEqual(Customer.objects.count(), 2)
+
+    def test_reimport_without_active_keeps_status(self):
+        """
+        Ensure rows that do not supply ``active`` leave a deactivated customer inactive, and rows that do still set it.
+        """
+        Customer.objects.filter(code='CUST1').update(active=False)
+        Customer.objects.create(name='Other', code='CUST2', active=False)
+        response = self.client.post(self.import_url, "name,code\nRenamed,CUST1\n", content_type='text/csv')
+        self.assertEqual((response.data['created'], response.data['updated']), (0, 1))
+        body = "name,code,active\nRenamed Again,CUST1,\nOther,CUST2,true\nNew,CUST3,\n"
+        response = self.client.post(self.import_url, body, content_type='text/csv')
+        self.assertEqual((response.data['created'], response.data['updated']), (1, 2))
+        customers = {customer.code: customer for customer in Customer.objects.all()}
+        self.assertEqual((customers['CUST1'].name, customers['CUST1'].active), ('Renamed Again', False))
+        self.assertTrue(customers['CUST2'].active)
+        self.assertTrue(customers['CUST3'].active)
+
+    def test_import_ndjson_upload(self):
+        """
+        Ensure an NDJSON file uploaded as multipart form data is imported.
+        """
+        upload = SimpleUploadedFile(
+            'customers.ndjson',
+            b'{"name": "A", "code": "CUST2"}\n\n{"name": "B", "code": "CUST3"}\nnot json\n',
+            content_type='application/x-ndjson',
+        )
+        response = self.client.post(self.import_url, {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['created'], response.data['rejected']), (2, 1))
+        self.assertEqual(Customer.objects.count(), 3)
+
+    def test_import_rejects_unsupported_format(self):
+        """
+        Ensure bodies that are neither CSV nor NDJSON are rejected.
+        """
+        response = self.client.post(self.import_url, [{'name': 'A', 'code': 'B'}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+    def test_import_command(self):
+        """
+        Ensure the management command imports a file in chunks and reports the counts.
+        """
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as csv_file:
+            csv_file.write("name,code\n" + "".join(f"Customer {i},CODE{i}\n" for i in range(5)))
+            csv_file.flush()
+            out = StringIO()
+            call_command('import_customers', csv_file.name, '--chunk-size', '2', stdout=out)
+        self.assertIn("created=5 updated=0 rejected=0", out.getvalue())
+        self.assertEqual(Customer.objects.count(), 6)
+
+
 class OrderAPITest(APITestCase):
 
     def setUp(self):
@@ -142,6 +483,10 @@ class OrderAPITest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(Order.objects.count(), 1)
         self.assertEqual(Order.objects.get().item, 'Test Item')
+        # The SMS is queued for the dispatcher instead of being sent inline
+        sms = OutboundSms.objects.get()
+        self.assertEqual(sms.order, Order.objects.get())
+        self.assertEqual(sms.status, OutboundSms.STATUS_PENDING)
 
     def test_create_order_invalid_data(self):
         """
@@ -157,6 +502,7 @@ class OrderAPITest(APITestCase):
         response = self.client.post(self.order_url, invalid_order_data, format='json')
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertEqual(Order.objects.count(), 0)  # No new order should be created
+        self.assertEqual(OutboundSms.objects.count(), 0)  # Nor any SMS
 
     def test_create_order_unauthenticated(self):
         """
@@ -165,3 +511,1561 @@ class OrderAPITest(APITestCase):
         self.client.force_authenticate(user=None)  # Force unauthenticated state
         response = self.client.post(self.order_url, self.order_data, format='json')
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class ListAPITest(APITestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.signup_url = reverse('signup')
+        self.customer_url = reverse('customer_view')
+        self.order_url = reverse('order_view')
+
+        # Create a user for authentication
+        self.client.post(self.signup_url, {
+            'username': 'testuser',
+            'password': 'testpassword',
+            'email': 'test@example.com'
+        })
+
+        # Obtain JWT token
+        response = self.client.post(reverse('token_obtain_pair'), {
+            'username': 'testuser',
+            'password': 'testpassword'
+        })
+        self.token = response.data['access']
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.token)  # Set the token for authentication
+
+        self.customers = [
+            Customer.objects.create(name=f'Customer {i}', code=f'CUST{i}', active=i != 2) for i in range(3)
+        ]
+        self.orders = [
+            Order.objects.create(customer=self.customers[i % 3], item=f'Item {i}', amount=i, active=i % 2 == 0)
+            for i in range(7)
+        ]
+
+    def test_order_pages_cover_every_order_with_constant_queries(self):
+        """
+        Ensure following the next links returns every order once, newest first, with the same query count per page.
+        """
+        ids, query_counts = [], []
+        self.client.get(self.order_url)  # Loads the user into the authentication cache
+        url = f'{self.order_url}?page_size=3'
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            query_counts.append(len(queries))
+            ids += [order['id'] for order in response.data['results']]
+            url = response.data['next']
+        expected = sorted(self.orders, key=lambda order: (order.timestamp, order.id), reverse=True)
+        self.assertEqual(ids, [order.id for order in expected])
+        self.assertEqual(len(set(query_counts)), 1)
+
+        first = response.data['results'][0]
+        self.assertEqual(first['customer_name'], Order.objects.get(pk=first['id']).customer.name)
+
+    def test_order_filters(self):
+        """
+        Ensure orders can be filtered by customer, active flag and creation range.
+        """
+        response = self.client.get(self.order_url, {'customer': self.customers[0].id, 'active': 'true'})
+        self.assertEqual(
+            {order['id'] for order in response.data['results']},
+            {order.id for order in self.orders if order.customer == self.customers[0] and order.active},
+        )
+        response = self.client.get(self.order_url, {'since': self.orders[5].timestamp.isoformat()})
+        self.assertEqual({order['id'] for order in response.data['results']}, {self.orders[5].id, self.orders[6].id})
+
+        response = self.client.get(self.order_url, {'customer': 'abc'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_impossible_dates_are_rejected(self):
+        """
+        Ensure a well-formed but impossible date in a creation range filter is rejected, not a server error.
+        """
+        for url, params in [
+            (self.order_url, {'since': '2024-02-30T00:00:00Z'}),
+            (self.customer_url, {'until': '2024-13-01T00:00'}),
+            (reverse('order_export_view'), {'since': '2024-02-30T00:00:00Z'}),
+        ]:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(response.json(), {next(iter(params)): ["Expected an ISO 8601 datetime."]})
+
+    def test_customer_list(self):
+        """
+        Ensure customers are listed newest first and can be filtered by active flag.
+        """
+        response = self.client.get(self.customer_url, {'active': 'false'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([customer['code'] for customer in response.data['results']], ['CUST2'])
+        self.assertIsNone(response.data['next'])
+
+    def test_invalid_cursor(self):
+        """
+        Ensure a malformed cursor is rejected.
+        """
+        response = self.client.get(self.order_url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_list_unauthenticated(self):
+        """
+        Test listing orders when not authenticated.
+        """
+        self.client.force_authenticate(user=None)  # Force unauthenticated state
+        response = self.client.get(self.order_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class AsyncViewTest(APITestCase):
+
+    def setUp(self):
+        user_cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.headers = {'Authorization': f"Bearer {AccessToken.for_user(self.user)}"}
+        self.client.credentials(HTTP_AUTHORIZATION=self.headers['Authorization'])
+        self.factory = AsyncRequestFactory()
+        self.customer = Customer.objects.create(name='Test Customer', code='CUST123')
+
+    async def test_create_order(self):
+        """
+        Ensure the async order view creates the order and queues its SMS.
+        """
+        request = self.factory.post(
+            reverse('order_view'), {'customer': self.customer.pk, 'item': 'Tea', 'amount': '1.00'},
+            content_type='application/json', headers=self.headers,
+        )
+        response = await async_order_view(request)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(await Order.objects.acount(), 1)
+        self.assertEqual(await OutboundSms.objects.acount(), 1)
+
+    async def test_order_list_reads_archive_on_request(self):
+        """
+        Ensure the async order list returns archived orders with archived=true, as the DRF view does.
+        """
+        old = await Order.objects.acreate(customer=self.customer, item='Tea', amount=1)
+        recent = await Order.objects.acreate(customer=self.customer, item='Tea', amount=2)
+        await Order.objects.filter(pk=old.pk).aupdate(timestamp=timezone.now() - timedelta(days=400))
+        await sync_to_async(archive_orders)(pause=0)
+        for params, expected in (({}, [recent.pk]), ({'archived': 'true'}, [old.pk])):
+            response = await async_order_view(self.factory.get(reverse('order_view'), params, headers=self.headers))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual([row['id'] for row in json.loads(response.content)['results']], expected)
+        response = await async_order_view(self.factory.get(reverse('order_view'), {'archived': 'maybe'}, headers=self.headers))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_responses_match_sync_views(self):
+        """
+        Ensure the async views return the same lists and validation errors as the DRF views.
+        """
+        for i in range(3):
+            Order.objects.create(customer=self.customer, item=f'Item {i}', amount=i)
+        cases = [
+            (async_order_view, 'get', f"{reverse('order_view')}?page_size=2", None),
+            (async_customer_view, 'get', reverse('customer_view'), None),
+            (async_order_view, 'post', reverse('order_view'), {'customer': 999999, 'item': '', 'amount': 'x'}),
+            (async_customer_view, 'post', reverse('customer_view'), {'name': 'Dup', 'code': 'CUST123'}),
+        ]
+        for view, method, url, data in cases:
+            sync_response = getattr(self.client, method)(url, data, format='json')
+            request = getattr(self.factory, method)(
+                url, data, content_type='application/json', headers=self.headers,
+            ) if data else self.factory.get(url, headers=self.headers)
+            async_response = async_to_sync(view)(request)
+            self.assertEqual(async_response.status_code, sync_response.status_code)
+            self.assertEqual(json.loads(async_response.content), json.loads(sync_response.content))
+
+    async def test_missing_token_is_rejected(self):
+        """
+        Ensure the async views require a valid token, like the DRF views.
+        """
+        response = await async_order_view(self.factory.get(reverse('order_view')))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response['WWW-Authenticate'], 'Bearer realm="api"')
+        response = await async_order_view(self.factory.get(reverse('order_view'), headers={'Authorization': 'Bearer x'}))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class IdempotencyTest(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.token = str(AccessToken.for_user(self.user))
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.token)
+        self.customer = Customer.objects.create(name='Test Customer', code='CUST123')
+        self.order_url = reverse('order_view')
+        self.order_data = {'customer': self.customer.pk, 'item': 'Tea', 'amount': '1.00'}
+
+    def post(self, data, key, url=None):
+        return self.client.post(url or self.order_url, data, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_is_not_executed_again(self):
+        """
+        Ensure a retried order gets the stored response without another order or SMS.
+        """
+        first = self.post(self.order_data, 'key-1')
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn('Idempotent-Replayed', first)
+        with CaptureQueriesContext(connection) as queries:
+            retry = self.post(self.order_data, 'key-1')
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertFalse([query for query in queries if 'main_app_order' in query['sql']])
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(OutboundSms.objects.count(), 1)
+
+        self.assertEqual(self.post(self.order_data, 'key-2').status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_validation_errors_are_replayed(self):
+        """
+        Ensure a rejected request's errors are stored and replayed.
+        """
+        data = {'name': 'Dup', 'code': 'CUST123'}
+        first = self.post(data, 'key-1', reverse('customer_view'))
+        retry = self.post(data, 'key-1', reverse('customer_view'))
+        self.assertEqual(first.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual((retry.status_code, retry.data), (first.status_code, first.data))
+
+    def test_key_reused_with_different_request(self):
+        """
+        Ensure a key cannot be reused for a different request.
+        """
+        self.post(self.order_data, 'key-1')
+        response = self.post({**self.order_data, 'amount': '2.00'}, 'key-1')
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_concurrent_duplicate_conflicts_until_claim_is_stale(self):
+        """
+        Ensure a duplicate of a request in progress gets 409, and that the key of a request
+        that died can be claimed again.
+        """
+        claim = IdempotencyKey.objects.create(
+            user=self.user, endpoint=self.order_url, key='key-1',
+            fingerprint=fingerprint('POST', self.order_url, self.order_data),
+        )
+        response = self.post(self.order_data, 'key-1')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(Order.objects.count(), 0)
+
+        IdempotencyKey.objects.filter(pk=claim.pk).update(
+            locked_at=timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS + 1)
+        )
+        self.assertEqual(self.post(self.order_data, 'key-1').status_code, status.HTTP_201_CREATED)
+        self.assertEqual(IdempotencyKey.objects.get().response_status, status.HTTP_201_CREATED)
+
+    def test_keys_are_scoped_per_user(self):
+        """
+        Ensure two users may use the same key.
+        """
+        self.post(self.order_data, 'key-1')
+        other = User.objects.create_user(username='other', password='testpassword')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(other)}")
+        self.assertNotIn('Idempotent-Replayed', self.post(self.order_data, 'key-1'))
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_async_view_shares_stored_responses(self):
+        """
+        Ensure the async order view replays a response stored by the DRF view.
+        """
+        self.post(self.order_data, 'key-1')
+        request = AsyncRequestFactory().post(
+            self.order_url, self.order_data, content_type='application/json',
+            headers={'Authorization': 'Bearer ' + self.token, 'Idempotency-Key': 'key-1'},
+        )
+        response = async_to_sync(async_order_view)(request)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_purge_expired_keys(self):
+        """
+        Ensure keys older than the TTL are purged, and their requests can run again.
+        """
+        self.post(self.order_data, 'key-1')
+        IdempotencyKey.objects.update(
+            timestamp=timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL + 1)
+        )
+        out = StringIO()
+        call_command('purge_idempotency_keys', stdout=out)
+        self.assertEqual(out.getvalue().strip(), 'deleted=1')
+        self.assertNotIn('Idempotent-Replayed', self.post(self.order_data, 'key-1'))
+
+
+class OrderBulkAPITest(APITestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.signup_url = reverse('signup')
+        self.bulk_url = reverse('order_bulk_view')
+
+        # Create a user for authentication
+        self.client.post(self.signup_url, {
+            'username': 'testuser',
+            'password': 'testpassword',
+            'email': 'test@example.com'
+        })
+
+        # Obtain JWT token
+        response = self.client.post(reverse('token_obtain_pair'), {
+            'username': 'testuser',
+            'password': 'testpassword'
+        })
+        self.token = response.data['access']
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.token)  # Set the token for authentication
+
+        self.customer = Customer.objects.create(
+            name='Test Customer',
+            code='CUST123',
+            active=True
+        )
+
+    def order_rows(self, count, item='Sugar'):
+        return [
+            {'customer': self.customer.id, 'item': item, 'amount': '10.00', 'active': True}
+            for _ in range(count)
+        ]
+
+    def test_bulk_create_orders(self):
+        """
+        Ensure a JSON array of orders is created with unique slugs and queued SMS notifications.
+        """
+        Order.objects.create(customer=self.customer, item='Sugar', amount=1)  # Existing 'sugar' slug
+        response = self.client.post(self.bulk_url, self.order_rows(3), format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data, {'created': 3, 'errors': []})
+        slugs = list(Order.objects.values_list('slug', flat=True))
+        self.assertEqual(len(slugs), 4)
+        self.assertEqual(len(set(slugs)), 4)
+        self.assertEqual(OutboundSms.objects.filter(order__isnull=False).count(), 3)
+        self.assertEqual(CustomerRollup.objects.get(customer=self.customer).order_count, 4)
+
+    def test_bulk_create_reports_errors_per_row(self):
+        """
+        Ensure invalid rows are reported by index while valid rows are still created.
+        """
+        rows = self.order_rows(2)
+        rows.insert(1, {'customer': 999999, 'item': '', 'amount': 'abc'})
+        response = self.client.post(self.bulk_url, rows, format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(response.data['errors'][0]['index'], 1)
+        self.assertEqual(
+            set(response.data['errors'][0]['errors']), {'customer', 'item', 'amount'}
+        )
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_bulk_create_ndjson(self):
+        """
+        Ensure an NDJSON body is accepted.
+        """
+        body = '\n'.join(
+            f'{{"customer": {self.customer.id}, "item": "Tea", "amount": "5.50"}}' for _ in range(2)
+        )
+        response = self.client.post(self.bulk_url, body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Order.objects.filter(item='Tea').count(), 2)
+
+    def test_bulk_create_query_count_does_not_grow_with_rows(self):
+        """
+        Ensure the number of queries is independent of the number of orders in the batch.
+        """
+        self.client.post(self.bulk_url, self.order_rows(1), format='json')  # Creates the slug counter
+        with CaptureQueriesContext(connection) as small:
+            self.client.post(self.bulk_url, self.order_rows(2), format='json')
+        with CaptureQueriesContext(connection) as large:
+            self.client.post(self.bulk_url, self.order_rows(50), format='json')
+        self.assertEqual(len(small), len(large))
+
+    def test_bulk_create_rejects_non_list(self):
+        """
+        Ensure a payload that is not a list is rejected.
+        """
+        response = self.client.post(self.bulk_url, self.order_rows(1)[0], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class FastSerializerTest(TestCase):
+
+    def setUp(self):
+        customer_cache.clear()
+        self.customer = Customer.objects.create(name='Test Customer', code='CUST123')
+
+    def assert_same_validation(self, drf, fast):
+        self.assertEqual(drf.is_valid(), fast.is_valid())
+        errors = drf.errors
+        if isinstance(errors, list):
+            errors = [dict(row) for row in errors]
+        self.assertEqual(json.dumps(errors), json.dumps(fast.errors))  # Same keys, order and messages
+        self.assertEqual(drf.validated_data, fast.validated_data)
+
+    def test_validation_matches_drf(self):
+        """
+        Ensure the fast serializers accept and reject the same payloads, with the same errors.
+        """
+        customers = [
+            {'name': 'New', 'code': 'NEW1', 'active': 'false'}, {}, {'name': 'x' * 300, 'code': 'CUST123'},
+            {'name': 'New', 'code': 'NEW2', 'active': 'maybe'}, None, ['not', 'a', 'dict'],
+        ]
+        orders = [
+            {'customer': self.customer.pk, 'item': 'Tea', 'amount': '2.50'}, {'customer': 'x', 'item': '', 'amount': 'x'},
+            {'customer': 999999, 'item': 'Tea', 'amount': '1.001'}, {'customer': True, 'item': 'Tea', 'amount': '1'},
+        ]
+        for data in customers:
+            self.assert_same_validation(CustomerSerializer(data=data), FastCustomerSerializer(data=data))
+        for data in orders:
+            self.assert_same_validation(OrderSerializer(data=data), FastOrderSerializer(data=data))
+        for data in [customers[:4], customers[:1], {'name': 'New'}]:
+            self.assert_same_validation(CustomerSerializer(data=data, many=True), FastCustomerSerializer(data=data, many=True))
+        self.assert_same_validation(OrderSerializer(data=orders, many=True), FastOrderSerializer(data=orders, many=True))
+
+    def test_representation_matches_drf(self):
+        """
+        Ensure the fast serializers represent customers and orders exactly as the DRF serializers do.
+        """
+        for amount in ['2.50', '1000.00']:
+            Order.objects.create(customer=self.customer, item='Tea', amount=Decimal(amount), active=False)
+        orders = list(Order.objects.select_related('customer'))
+        self.assertEqual(
+            json.dumps(OrderListSerializer(orders, many=True).data),
+            json.dumps(FastOrderListSerializer(orders, many=True).data),
+        )
+        self.assertEqual(CustomerSerializer(self.customer).data, FastCustomerSerializer(self.customer).data)
+
+    def test_batches_are_validated_with_one_query_per_lookup(self):
+        """
+        Ensure a batch loads its customers with one query, and leaves code uniqueness to the database.
+        """
+        rows = [{'name': f"Customer {i}", 'code': f"BATCH{i}"} for i in range(20)]
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(FastCustomerSerializer(data=rows, many=True).is_valid())
+        self.assertEqual(len(queries), 0)
+
+        others = Customer.objects.bulk_create([Customer(name=f"Other {i}", code=f"OTHER{i}") for i in range(5)])
+        rows = [{'customer': customer.pk, 'item': 'Tea', 'amount': '1.00'} for customer in others * 4]
+        serializer = FastOrderSerializer(data=rows, many=True)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(serializer.is_valid())
+        self.assertEqual(len(queries), 1)
+        serializer.save()
+        self.assertEqual(Order.objects.count(), 20)
+
+
+class JSONRenderingTest(APITestCase):
+
+    def setUp(self):
+        customer_cache.clear()
+        self.customer = Customer.objects.create(name='Caf\u00e9 \u2028 Customer', code='JSON001')
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.client.force_authenticate(user=self.user)
+        Order.objects.bulk_create([
+            Order(customer=self.customer, item=f"Item {i}", amount=Decimal(i) + Decimal('0.50'), slug=f"json-{i}")
+            for i in range(40)
+        ])
+
+    def test_renderer_matches_drf_with_and_without_orjson(self):
+        """
+        Ensure the renderer writes the same bytes as DRF's, Decimals and datetimes included.
+        """
+        invalid = CustomerSerializer(data={})
+        self.assertFalse(invalid.is_valid())
+        data = {
+            'results': OrderListSerializer(Order.objects.select_related('customer'), many=True).data,
+            'raw': [Decimal('2.50'), timezone.now(), timezone.now().date(), None],
+            'errors': invalid.errors,
+        }
+        expected = JSONRenderer().render(data)
+        self.assertEqual(FastJSONRenderer().render(data), expected)
+        self.assertIn(b'\\u2028', expected)
+        with mock.patch.object(renderers, 'orjson', None):
+            self.assertEqual(FastJSONRenderer().render(data), expected)
+        indented = 'application/json; indent=4'
+        self.assertEqual(FastJSONRenderer().render(data, indented), JSONRenderer().render(data, indented))
+
+    def test_parser_matches_drf_with_and_without_orjson(self):
+        """
+        Ensure the parser returns the same data as DRF's, and rejects what DRF's parser rejects.
+        """
+        body = '{"item": "Caf\u00e9", "amount": 2.5, "customer": 1, "tags": [null, true]}'.encode()
+        for orjson in (parsers.orjson, None):
+            with mock.patch.object(parsers, 'orjson', orjson):
+                self.assertEqual(FastJSONParser().parse(BytesIO(body)), JSONParser().parse(BytesIO(body)))
+                for invalid in (b'{"amount": NaN}', b'{"amount": ', b'[Infinity]'):
+                    with self.assertRaises(ParseError):
+                        FastJSONParser().parse(BytesIO(invalid))
+        response = self.client.post(reverse('customer_view'), b'{"name": ', content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(response.json()['detail'].startswith('JSON parse error'))
+
+    def test_responses_are_compressed_as_negotiated(self):
+        """
+        Ensure large responses are compressed with the coding the client prefers, and small,
+        streamed or unaccepted ones are sent as they are.
+        """
+        url = reverse('order_view')
+        plain = self.client.get(url, {'page_size': 40})
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertIn('Accept-Encoding', plain['Vary'])
+        gzipped = self.client.get(url, {'page_size': 40}, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(gzipped['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(gzipped.content), plain.content)
+        self.assertEqual(int(gzipped['Content-Length']), len(gzipped.content))
+        refused = self.client.get(url, {'page_size': 40}, HTTP_ACCEPT_ENCODING='gzip;q=0, identity')
+        self.assertNotIn('Content-Encoding', refused)
+        small = self.client.get(url, {'page_size': 1}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotIn('Content-Encoding', small)
+        export = self.client.get(reverse('order_export_view'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(export['Content-Encoding'], 'gzip')  # Compressed once, by the export itself
+        self.assertTrue(gzip.decompress(b''.join(export.streaming_content)).startswith(b'id,customer'))
+
+        self.assertEqual(accepted_encodings('br;q=0.5, GZIP, *;q=0'), {'br': 0.5, 'gzip': 1.0, '*': 0.0})
+        with mock.patch('main_app.middleware.brotli', None):
+            self.assertEqual(CompressionMiddleware.choose_encoding('br, gzip;q=0.5'), 'gzip')
+            self.assertIsNone(CompressionMiddleware.choose_encoding('br'))
+        self.assertEqual(CompressionMiddleware.choose_encoding('*'), 'br')
+        self.assertEqual(CompressionMiddleware.choose_encoding('br;q=0.5, gzip'), 'gzip')
+        self.assertEqual(self.client.get(url, {'page_size': 40}, HTTP_ACCEPT_ENCODING='gzip, br')['Content-Encoding'], 'br')
+
+
+class CustomerRollupTest(APITestCase):
+
+    def setUp(self):
+        self.customer = Customer.objects.create(name='Test Customer', code='CUST123')
+        self.other = Customer.objects.create(name='Other Customer', code='CUST456')
+        user = User.objects.create_user(username='testuser', password='testpassword')
+        self.client.force_authenticate(user=user)
+
+    def rollup(self, customer=None):
+        return CustomerRollup.objects.get(customer=customer or self.customer)
+
+    def test_rollup_follows_order_writes(self):
+        """
+        Ensure creating, updating and deleting orders keeps the rollup in step.
+        """
+        first = Order.objects.create(customer=self.customer, item='Tea', amount=Decimal('10.50'))
+        second = Order.objects.create(customer=self.customer, item='Tea', amount=Decimal('4.50'))
+        rollup = self.rollup()
+        self.assertEqual((rollup.order_count, rollup.total_amount), (2, Decimal('15.00')))
+        self.assertEqual(rollup.last_order_at, second.timestamp)
+
+        first.amount = Decimal('20.50')
+        first.save()
+        self.assertEqual(self.rollup().total_amount, Decimal('25.00'))
+
+        second.customer = self.other
+        second.save()
+        self.assertEqual(self.rollup().order_count, 1)
+        self.assertEqual(self.rollup().last_order_at, first.timestamp)
+        self.assertEqual(self.rollup(self.other).total_amount, Decimal('4.50'))
+
+        first.delete()
+        rollup = self.rollup()
+        self.assertEqual((rollup.order_count, rollup.total_amount, rollup.last_order_at), (0, Decimal('0'), None))
+        daily = CustomerDailyRollup.objects.get(customer=self.other)
+        self.assertEqual((daily.order_count, daily.total_amount), (1, Decimal('4.50')))
+
+    def test_rebuild_matches_incremental_rollups(self):
+        """
+        Ensure rebuilding from the orders table gives the same rollups as the incremental updates.
+        """
+        for amount in ['1.00', '2.00', '3.25']:
+            Order.objects.create(customer=self.customer, item='Tea', amount=Decimal(amount))
+        Order.objects.create(customer=self.other, item='Tea', amount=Decimal('7.00'))
+        fields = ['customer', 'order_count', 'total_amount', 'last_order_at']
+        incremental = list(CustomerRollup.objects.order_by('customer').values_list(*fields))
+        daily = list(CustomerDailyRollup.objects.order_by('customer').values_list('customer', 'day', 'order_count'))
+
+        self.assertEqual(rebuild_rollups(), (2, 2))
+        self.assertEqual(list(CustomerRollup.objects.order_by('customer').values_list(*fields)), incremental)
+        self.assertEqual(
+            list(CustomerDailyRollup.objects.order_by('customer').values_list('customer', 'day', 'order_count')), daily
+        )
+
+    def test_rollup_endpoint(self):
+        """
+        Ensure the rollup endpoint reads the rollup with a constant number of queries.
+        """
+        for _ in range(3):
+            Order.objects.create(customer=self.customer, item='Tea', amount=Decimal('2.00'))
+        url = reverse('customer_rollup_view', args=[self.customer.pk])
+        with self.assertNumQueries(2):  # The rollup and its per-day rows
+            response = self.client.get(url, {'days': 7})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['order_count'], 3)
+        self.assertEqual(response.data['total_amount'], '6.00')
+        self.assertEqual(response.data['daily'][0]['order_count'], 3)
+
+        response = self.client.get(reverse('customer_rollup_view', args=[self.other.pk]))
+        self.assertEqual(response.data['order_count'], 0)
+        response = self.client.get(reverse('customer_rollup_view', args=[999999]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class OrderArchiveTest(APITestCase):
+
+    def setUp(self):
+        self.customer = Customer.objects.create(name='Test Customer', code='CUST123')
+        user = User.objects.create_user(username='testuser', password='testpassword')
+        self.client.force_authenticate(user=user)
+
+    def order(self, days_ago, active=True):
+        order = Order.objects.create(customer=self.customer, item='Tea', amount=Decimal('2.50'), active=active)
+        Order.objects.filter(pk=order.pk).update(timestamp=timezone.now() - timedelta(days=days_ago))
+        return order
+
+    def snapshot(self):
+        return (
+            list(CustomerRollup.objects.values_list('customer', 'order_count', 'total_amount', 'last_order_at')),
+            list(CustomerDailyRollup.objects.order_by('day').values_list('customer', 'day', 'order_count')),
+        )
+
+    @override_settings(ORDER_ARCHIVE_AFTER_DAYS=365, ORDER_ARCHIVE_INACTIVE_AFTER_DAYS=30)
+    def test_archives_old_and_inactive_orders(self):
+        """
+        Ensure old orders and old inactive orders move to the archive, and the rollups keep counting them.
+        """
+        old, old_inactive = self.order(400), self.order(40, active=False)
+        recent, recent_inactive = self.order(40), self.order(5, active=False)
+        sms = enqueue_sms('+254700000000', 'Order received', order=old)
+        rebuild_rollups()  # Account for the backdated timestamps
+        rollups = self.snapshot()
+
+        self.assertEqual(archive_orders(batch_size=1, pause=0), (2, 2))
+        self.assertEqual(set(Order.objects.values_list('pk', flat=True)), {recent.pk, recent_inactive.pk})
+        archived = OrderArchive.objects.get(pk=old.pk)
+        self.assertEqual((archived.slug, archived.customer_id, archived.amount), (old.slug, self.customer.pk, Decimal('2.50')))
+        self.assertTrue(OrderArchive.objects.filter(pk=old_inactive.pk, active=False).exists())
+        sms.refresh_from_db()
+        self.assertIsNone(sms.order_id)
+        self.assertEqual(self.snapshot(), rollups)
+        self.assertEqual(archive_orders(pause=0), (0, 0))
+
+        rebuild_rollups()
+        self.assertEqual(self.snapshot(), rollups)
+
+    def test_archive_stops_after_max_batches(self):
+        """
+        Ensure the archiver moves at most max_batches batches per run.
+        """
+        for _ in range(5):
+            self.order(400)
+        self.assertEqual(archive_orders(batch_size=2, pause=0, max_batches=2), (4, 2))
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_order_list_reads_archive_on_request(self):
+        """
+        Ensure the order list returns current orders, and archived ones with archived=true.
+        """
+        old, recent = self.order(400), self.order(1)
+        archive_orders(pause=0)
+        response = self.client.get(reverse('order_view'))
+        self.assertEqual([row['id'] for row in response.data['results']], [recent.pk])
+        response = self.client.get(reverse('order_view'), {'archived': 'true', 'customer': self.customer.pk})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['id'] for row in response.data['results']], [old.pk])
+        self.assertEqual(response.data['results'][0]['customer_code'], 'CUST123')
+
+
+class OrderExportTest(APITestCase):
+
+    def setUp(self):
+        self.customer = Customer.objects.create(name='Export, Customer', code='EXP001')
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.client.force_authenticate(user=self.user)
+        self.orders = []
+        for days_ago, active in [(400, True), (3, False), (1, True)]:
+            order = Order.objects.create(customer=self.customer, item='Tea', amount=Decimal('2.50'), active=active)
+            Order.objects.filter(pk=order.pk).update(timestamp=timezone.now() - timedelta(days=days_ago))
+            self.orders.append(order)
+        archive_orders(pause=0)  # Archives the oldest order
+
+    def export(self, **params):
+        headers = params.pop('headers', {})
+        response = self.client.get(reverse('order_export_view'), params, **headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response, b''.join(response.streaming_content)
+
+    def test_csv_export_streams_current_then_archived_orders(self):
+        """
+        Ensure the CSV export lists current orders, then archived ones, with the customer joined in.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response, body = self.export()
+        self.assertEqual(len(queries), 2)  # One query per table, however many orders
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('attachment', response['Content-Disposition'])
+        rows = list(csv.DictReader(body.decode().splitlines()))
+        self.assertEqual([int(row['id']) for row in rows], [self.orders[1].pk, self.orders[2].pk, self.orders[0].pk])
+        self.assertEqual([row['archived'] for row in rows], ['false', 'false', 'true'])
+        self.assertEqual(
+            (rows[0]['customer_name'], rows[0]['customer_code'], rows[0]['amount'], rows[0]['active']),
+            ('Export, Customer', 'EXP001', '2.50', 'false'),
+        )
+        self.assertTrue(rows[0]['timestamp'].endswith('Z'))
+
+    def test_ndjson_export_is_filtered_and_gzipped(self):
+        """
+        Ensure the NDJSON export honours the filters and is gzip-compressed when the client accepts it.
+        """
+        since = (timezone.now() - timedelta(days=2)).isoformat()
+        response, body = self.export(output='ndjson', since=since, headers={'HTTP_ACCEPT_ENCODING': 'gzip, br'})
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        rows = [json.loads(line) for line in gzip.decompress(body).decode().splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['id'], self.orders[2].pk)
+        self.assertEqual((rows[0]['amount'], rows[0]['active'], rows[0]['archived']), ('2.50', True, False))
+
+    def test_export_rejects_bad_requests(self):
+        """
+        Ensure the export requires authentication and rejects unknown formats and invalid filters.
+        """
+        self.assertEqual(
+            self.client.get(reverse('order_export_view'), {'output': 'xml'}).status_code, status.HTTP_400_BAD_REQUEST
+        )
+        self.assertEqual(
+            self.client.get(reverse('order_export_view'), {'since': 'yesterday'}).status_code,
+            status.HTTP_400_BAD_REQUEST,
+        )
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.client.get(reverse('order_export_view')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_asgi_export_streams_asynchronously(self):
+        """
+        Ensure under ASGI the export is streamed from an async iterator instead of being buffered.
+        """
+        request = AsyncRequestFactory().get(reverse('order_export_view'), {'output': 'ndjson'})
+        force_authenticate(request, user=self.user)
+
+        response = order_export_view(request)
+        self.assertTrue(response.is_async)
+
+        async def consume():
+            return b''.join([chunk async for chunk in response.streaming_content])
+
+        self.assertEqual(len(async_to_sync(consume)().splitlines()), 3)
+
+    def test_export_command_writes_file(self):
+        """
+        Ensure the export_orders command writes a gzip file and reports its throughput.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'orders.ndjson.gz')
+            out = StringIO()
+            call_command('export_orders', path, '--customer', str(self.customer.pk), '--active', 'true', stdout=out)
+            with gzip.open(path, 'rt') as stream:
+                rows = [json.loads(line) for line in stream]
+        self.assertEqual([row['id'] for row in rows], [self.orders[2].pk, self.orders[0].pk])
+        self.assertIn('rows=2 ', out.getvalue())
+        self.assertIn('rows_per_second=', out.getvalue())
+
+
+class OrderFeedTest(APITestCase):
+
+    def setUp(self):
+        user_cache.clear()
+        customer_cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.headers = {'Authorization': f"Bearer {AccessToken.for_user(self.user)}"}
+        self.factory = AsyncRequestFactory()
+        self.customer = Customer.objects.create(name='Feed Customer', code='FEED001')
+        self.orders = [
+            Order.objects.create(customer=self.customer, item='Tea', amount=Decimal('2.50')) for _ in range(3)
+        ]
+
+    def create_orders(self):
+        """
+        Create an order, then two in bulk, and run their on-commit callbacks.
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.create(customer=self.customer, item='Coffee', amount=Decimal('3.00'))
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk, errors = create_orders_in_bulk([{'customer': self.customer.pk, 'item': 'Cake', 'amount': '4.00'}] * 2)
+        self.assertEqual(errors, [])
+        return [order, *bulk]
+
+    async def test_feed_replays_missed_orders_then_streams_new_ones(self):
+        """
+        Ensure a client resuming from an order id gets the later orders, then new ones as they commit.
+        """
+        request = self.factory.get(
+            reverse('order_feed_view'), headers={**self.headers, 'Last-Event-ID': str(self.orders[0].pk)},
+        )
+        response = await order_feed_view(request)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = response.streaming_content
+        replayed = [await anext(stream) for _ in range(2)]
+        self.assertEqual(
+            [frame.split(b'\n')[0] for frame in replayed], [f"id: {order.pk}".encode() for order in self.orders[1:]],
+        )
+
+        created = await sync_to_async(self.create_orders)()
+        frames = [await asyncio.wait_for(anext(stream), timeout=5) for _ in created]
+        for order, frame in zip(created, frames):
+            self.assertTrue(frame.startswith(f"id: {order.pk}\nevent: order\ndata: ".encode()))
+            self.assertTrue(frame.endswith(b'\n\n'))
+        data = json.loads(frames[0].split(b'data: ', 1)[1])
+        self.assertEqual(
+            (data['id'], data['customer_code'], data['amount'], data['item']), (created[0].pk, 'FEED001', '3.00', 'Coffee'),
+        )
+        self.assertEqual(order_feed.subscriber_count(), 1)
+
+        order_feed.drop_all()  # As when a backend loses events; the stream ends for the client to resume
+        self.assertEqual([frame async for frame in stream], [])
+        self.assertEqual(order_feed.subscriber_count(), 0)
+
+    def test_slow_subscribers_are_dropped_without_holding_back_others(self):
+        """
+        Ensure a subscriber whose queue is full is disconnected after reading it, and the others get every event.
+        """
+        dropped = sum(value for _, value in metrics.ORDER_FEED_DROPPED.snapshot())
+
+        async def fanout():
+            slow, fast = order_feed.subscribe(maxsize=2), order_feed.subscribe(maxsize=10)
+            order_feed.deliver([FeedEvent(pk, '{}') for pk in range(1, 6)])
+            received = [(await fast.get()).id for _ in range(5)]
+            behind = [(await slow.get()).id for _ in range(2)]
+            end = await slow.get()
+            order_feed.unsubscribe(fast)
+            return received, behind, end
+
+        received, behind, end = async_to_sync(fanout)()
+        self.assertEqual(received, [1, 2, 3, 4, 5])
+        self.assertEqual(behind, [1, 2])
+        self.assertIsNone(end)
+        self.assertEqual(order_feed.subscriber_count(), 0)
+        self.assertEqual(sum(value for _, value in metrics.ORDER_FEED_DROPPED.snapshot()), dropped + 1)
+
+    def test_feed_requires_authentication_a_valid_id_and_asgi(self):
+        """
+        Ensure the feed rejects anonymous clients and invalid ids, and is not served under WSGI.
+        """
+        url = reverse('order_feed_view')
+        response = async_to_sync(order_feed_view)(self.factory.get(url))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = async_to_sync(order_feed_view)(self.factory.get(url, {'after': 'latest'}, headers=self.headers))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = async_to_sync(order_feed_view)(RequestFactory().get(url, headers=self.headers))
+        self.assertEqual(response.status_code, status.HTTP_501_NOT_IMPLEMENTED)
+
+    def test_feed_accepts_feed_tokens_in_its_url(self):
+        """
+        Ensure an EventSource client can pass a feed token in the URL, and that feed tokens work nowhere else.
+        """
+        response = self.client.post(reverse('order_feed_token_view'), headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['expires_in'], settings.ORDER_FEED_TOKEN_SECONDS)
+        token = response.json()['token']
+        self.assertEqual(self.client.post(reverse('order_feed_token_view')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        url = reverse('order_feed_view')
+        response = async_to_sync(order_feed_view)(self.factory.get(url, {'token': token}))
+        self.assertEqual((response.status_code, response['Content-Type']), (status.HTTP_200_OK, 'text/event-stream'))
+        expired = FeedToken.for_user(self.user)
+        expired.set_exp(lifetime=timedelta(seconds=-1))
+        access = self.headers['Authorization'].split()[1]
+        for rejected in (expired, access, 'not-a-token'):
+            response = async_to_sync(order_feed_view)(self.factory.get(url, {'token': str(rejected)}))
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.get(reverse('order_view'), headers={'Authorization': f"Bearer {token}"})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class CustomerCacheTest(APITestCase):
+
+    def setUp(self):
+        customer_cache.clear()
+        self.customer = Customer.objects.create(name='Test Customer', code='CUST123')
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.client.force_authenticate(user=self.user)
+        self.order_data = {'customer': self.customer.id, 'item': 'Tea', 'amount': '1.00'}
+
+    def test_order_writes_resolve_customer_from_cache(self):
+        """
+        Ensure only the first order for a customer loads it from the database.
+        """
+        self.client.post(reverse('order_view'), self.order_data, format='json')  # Creates the slug counter and rollup
+        customer_cache.clear()
+        caches['default'].clear()
+        with CaptureQueriesContext(connection) as cold:
+            self.client.post(reverse('order_view'), self.order_data, format='json')
+        with CaptureQueriesContext(connection) as warm:
+            self.client.post(reverse('order_view'), self.order_data, format='json')
+        self.assertEqual(len(warm), len(cold) - 1)
+        self.assertEqual(Order.objects.count(), 3)
+        stats = customer_cache.stats()
+        self.assertEqual((stats['misses'], stats['local_hits']), (1, 1))
+
+    def test_two_tiers(self):
+        """
+        Ensure a customer missing from the local tier is served by the shared cache.
+        """
+        customer_cache.get(self.customer.pk)
+        customer_cache.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(customer_cache.get(self.customer.pk).name, 'Test Customer')
+        self.assertEqual(customer_cache.stats()['shared_hits'], 1)
+        self.assertIsNone(customer_cache.get(999999))
+
+    def test_customer_save_invalidates_cache(self):
+        """
+        Ensure saving a customer drops the stale copy from the cache.
+        """
+        customer_cache.get(self.customer.pk)
+        self.customer.name = 'Renamed'
+        self.customer.save()
+        self.assertEqual(customer_cache.get(self.customer.pk).name, 'Renamed')
+
+    def test_unknown_customer_error_is_unchanged(self):
+        """
+        Ensure an unknown customer id gets the same error message as without the cache.
+        """
+        response = self.client.post(reverse('order_view'), {**self.order_data, 'customer': 999999}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['customer'], ['Invalid pk "999999" - object does not exist.'])
+
+    def test_stats_endpoint_is_staff_only(self):
+        """
+        Ensure the cache counters are only visible to staff users.
+        """
+        response = self.client.get(reverse('cache_stats_view'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get(reverse('cache_stats_view'))
+        self.assertIn('local_hits', response.data['customer_cache'])
+
+
+class AdminChangelistTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_superuser(username='admin', password='adminpassword')
+        self.client.force_login(self.user)
+        self.customer = Customer.objects.create(name='Test Customer', code='CUST123')
+        Customer.objects.create(name='Other Customer', code='OTHER1')
+        for item, amount in [('Sugar', 50), ('Tea', 500), ('Coffee', 5000)]:
+            Order.objects.create(customer=self.customer, item=item, amount=amount)
+
+    def test_order_changelist_filters_and_search(self):
+        """
+        Ensure the order changelist filters by amount bracket and searches by item prefix.
+        """
+        url = reverse('admin:main_app_order_changelist')
+        response = self.client.get(url, {'amount_range': '100-1000'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([order.item for order in response.context['cl'].result_list], ['Tea'])
+
+        response = self.client.get(url, {'q': 'Cof'})
+        self.assertEqual([order.item for order in response.context['cl'].result_list], ['Coffee'])
+
+        response = self.client.get(url, {'q': 'CUST'})
+        self.assertEqual(response.context['cl'].result_count, 3)
+
+    def test_order_changelist_query_count_does_not_grow(self):
+        """
+        Ensure customers are joined in rather than loaded once per row.
+        """
+        url = reverse('admin:main_app_order_changelist')
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(url)
+        for i in range(10):
+            Order.objects.create(customer=Customer.objects.create(name=f"Customer {i}", code=f"C{i}"), item='Tea', amount=1)
+        with CaptureQueriesContext(connection) as many:
+            self.client.get(url)
+        self.assertEqual(len(many), len(few))
+
+    def test_customer_search_is_prefix_match(self):
+        """
+        Ensure customers are searched by code or name prefix only.
+        """
+        url = reverse('admin:main_app_customer_changelist')
+        response = self.client.get(url, {'q': 'Other'})
+        self.assertEqual([customer.code for customer in response.context['cl'].result_list], ['OTHER1'])
+        response = self.client.get(url, {'q': 'Customer'})
+        self.assertEqual(response.context['cl'].result_count, 0)
+
+    @override_settings(ADMIN_COUNT_LIMIT=2)
+    def test_paginator_count_is_bounded(self):
+        """
+        Ensure the admin paginator stops counting at settings.ADMIN_COUNT_LIMIT.
+        """
+        paginator = EstimatedCountPaginator(Order.objects.order_by('-id'), 1)
+        self.assertEqual(paginator.count, 2)
+        self.assertEqual(paginator.num_pages, 2)
+
+
+@override_settings(DATABASE_REPLICAS=['replica_1', 'replica_2'])
+class ReplicaRoutingTest(TestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    @staticmethod
+    def read_alias(request):
+        """
+        Stand-in view reporting where the request's reads are routed.
+        """
+        return HttpResponse(Order.objects.all().db)
+
+    def test_reads_use_primary_by_default(self):
+        """
+        Ensure only reads inside replica_reads() go to a replica, and writes never do.
+        """
+        self.assertEqual(router.db_for_read(Order), 'default')
+        with replica_reads():
+            self.assertIn(router.db_for_read(Order), ['replica_1', 'replica_2'])
+            self.assertEqual(router.db_for_write(Order), 'default')
+            with replica_reads(False):
+                self.assertEqual(router.db_for_read(Order), 'default')
+        self.assertFalse(router.allow_migrate('replica_1', 'main_app'))
+        self.assertTrue(router.allow_migrate('default', 'main_app'))
+
+    def test_middleware_pins_client_to_primary_after_write(self):
+        """
+        Ensure GETs read a replica, except for a client that has just written.
+        """
+        middleware = ReplicaPinningMiddleware(self.read_alias)
+        self.assertIn(middleware(self.factory.get('/')).content.decode(), ['replica_1', 'replica_2'])
+
+        response = middleware(self.factory.post('/'))
+        self.assertEqual(response.content.decode(), 'default')
+        cookie = response.cookies[ReplicaPinningMiddleware.cookie_name]
+        self.assertEqual(cookie['max-age'], settings.DATABASE_REPLICA_PIN_SECONDS)
+
+        self.factory.cookies[cookie.key] = cookie.value
+        self.assertEqual(middleware(self.factory.get('/')).content.decode(), 'default')
+
+    def test_middleware_pins_token_user_without_cookies(self):
+        """
+        Ensure a bearer-token client that keeps no cookies reads its writes, and other users still read a replica.
+        """
+        caches[settings.DATABASE_REPLICA_PIN_CACHE_ALIAS].clear()
+        users = [get_user_model().objects.create_user(username=name, password='pass') for name in ('writer', 'reader')]
+        writer, reader = [{'HTTP_AUTHORIZATION': f"Bearer {AccessToken.for_user(user)}"} for user in users]
+        middleware = ReplicaPinningMiddleware(self.read_alias)
+        self.assertIn(middleware(self.factory.get('/', **writer)).content.decode(), ['replica_1', 'replica_2'])
+
+        self.assertEqual(middleware(self.factory.post('/', **writer)).content.decode(), 'default')
+        self.assertEqual(middleware(self.factory.get('/', **writer)).content.decode(), 'default')
+        self.assertIn(middleware(self.factory.get('/', **reader)).content.decode(), ['replica_1', 'replica_2'])
+        self.assertIn(middleware(self.factory.get('/')).content.decode(), ['replica_1', 'replica_2'])
+        invalid = {'HTTP_AUTHORIZATION': 'Bearer not-a-token'}
+        self.assertIn(middleware(self.factory.get('/', **invalid)).content.decode(), ['replica_1', 'replica_2'])
+
+    async def test_async_middleware(self):
+        """
+        Ensure the middleware routes reads the same way for async views.
+        """
+        async def read_alias(request):
+            return self.read_alias(request)
+
+        middleware = ReplicaPinningMiddleware(read_alias)
+        response = await middleware(AsyncRequestFactory().get('/'))
+        self.assertIn(response.content.decode(), ['replica_1', 'replica_2'])
+        response = await middleware(AsyncRequestFactory().post('/'))
+        self.assertEqual(response.content.decode(), 'default')
+
+        user = await get_user_model().objects.acreate(username='async-writer')
+        headers = {'Authorization': f"Bearer {AccessToken.for_user(user)}"}
+        await caches[settings.DATABASE_REPLICA_PIN_CACHE_ALIAS].aclear()
+        await middleware(AsyncRequestFactory().post('/', headers=headers))
+        response = await middleware(AsyncRequestFactory().get('/', headers=headers))
+        self.assertEqual(response.content.decode(), 'default')
+
+
+class SlugAllocationTest(TestCase):
+
+    def setUp(self):
+        self.customer = Customer.objects.create(name='Test Customer', code='CUST123')
+
+    def create_order(self, item='Sugar'):
+        return Order.objects.create(customer=self.customer, item=item, amount=1)
+
+    def test_slugs_are_numbered_per_item(self):
+        """
+        Ensure the first order for an item gets the plain slug and later ones are numbered.
+        """
+        slugs = [self.create_order().slug for _ in range(3)]
+        self.assertEqual(slugs, ['sugar', 'sugar-2', 'sugar-3'])
+
+    def test_query_count_is_constant_with_collisions(self):
+        """
+        Ensure allocating a slug costs the same number of queries however many orders share the item.
+        """
+        self.create_order()
+        with CaptureQueriesContext(connection) as second:
+            self.create_order()
+        for _ in range(20):
+            self.create_order()
+        with CaptureQueriesContext(connection) as last:
+            self.create_order()
+        self.assertEqual(len(second), len(last))
+
+    def test_slug_produced_by_another_item_is_skipped(self):
+        """
+        Ensure a slug already taken by a different item is not handed out again.
+        """
+        self.create_order()
+        self.create_order('Sugar 3')
+        slugs = [self.create_order().slug for _ in range(2)]
+        self.assertEqual(slugs, ['sugar-2', 'sugar-4'])
+
+    def test_assign_slugs_for_batch(self):
+        """
+        Ensure bulk slug assignment continues the per-item numbering and avoids clashes within the batch.
+        """
+        self.create_order()
+        orders = [Order(customer=self.customer, item=item, amount=1) for item in ['Sugar', 'Sugar 3', 'Sugar', 'Tea']]
+        assign_slugs(orders, Order)
+        self.assertEqual([order.slug for order in orders], ['sugar-2', 'sugar-3-2', 'sugar-3', 'tea'])
+
+    def test_slug_is_unique_in_database(self):
+        """
+        Ensure the database rejects duplicate slugs.
+        """
+        order = self.create_order()
+        with self.assertRaises(IntegrityError):
+            Order.objects.create(customer=self.customer, item='Other', amount=1, slug=order.slug)
+
+
+class FailingSmsBackend:
+    """
+    SMS gateway backend that always fails, to exercise the retry path.
+    """
+
+    def send(self, message, recipients):
+        raise ConnectionError("Gateway unavailable")
+
+
+class SlowSmsBackend:
+    """
+    SMS gateway backend that answers after a delay, to exercise the async timeout.
+    """
+
+    async def asend(self, message, recipients):  # pylint: disable=W0613
+        await asyncio.sleep(1)
+
+
+class HangingSmsBackend:
+    """
+    SMS gateway backend whose blocking call takes longer than the test's timeout.
+    """
+
+    def send(self, message, recipients):  # pylint: disable=W0613
+        time.sleep(0.5)
+
+
+class RejectingSmsBackend(LocmemBackend):
+    """
+    SMS gateway backend that rejects one recipient of each call, to exercise per-recipient results.
+    """
+
+    def __init__(self, rejected):
+        self.rejected = rejected
+
+    def send(self, message, recipients):
+        response = super().send(message, recipients)
+        for row in response['SMSMessageData']['Recipients']:
+            if row['number'] == self.rejected:
+                row.update(status='InvalidPhoneNumber', statusCode=403)
+        return response
+
+
+@override_settings(
+    SMS_BACKEND='main_app.utils.LocmemBackend',
+    SMS_OUTBOX_MAX_ATTEMPTS=2,
+    SMS_BATCH_WINDOW=0,
+)
+class SmsDispatcherTest(TestCase):
+
+    def setUp(self):
+        LocmemBackend.outbox.clear()
+        for backend in (LocmemBackend(), FailingSmsBackend(), HangingSmsBackend(), SlowSmsBackend()):
+            gateway_breaker(backend).reset()
+        self.sms = enqueue_sms('+254700000000', 'Hello')
+
+    def test_dispatch_sends_pending_messages(self):
+        """
+        Ensure the dispatcher delivers due messages and marks them as sent.
+        """
+        stats = dispatch_pending()
+        self.assertEqual(stats, {'sent': 1, 'retried': 0, 'failed': 0})
+        self.assertEqual(LocmemBackend.outbox, [('Hello', ['+254700000000'])])
+        self.sms.refresh_from_db()
+        self.assertEqual(self.sms.status, OutboundSms.STATUS_SENT)
+        self.assertEqual(self.sms.attempts, 1)
+
+        # Sent messages are not picked up again
+        self.assertEqual(dispatch_pending(), {'sent': 0, 'retried': 0, 'failed': 0})
+
+    def test_dispatch_retries_with_backoff_then_fails(self):
+        """
+        Ensure gateway errors are retried later and the message is eventually marked as failed.
+        """
+        stats = dispatch_pending(backend=FailingSmsBackend())
+        self.assertEqual(stats['retried'], 1)
+        self.sms.refresh_from_db()
+        self.assertEqual(self.sms.status, OutboundSms.STATUS_PENDING)
+        self.assertGreater(self.sms.next_attempt_at, timezone.now())
+        self.assertEqual(self.sms.last_error, "Gateway unavailable")
+
+        # Not due yet, so nothing is sent
+        self.assertEqual(dispatch_pending(backend=FailingSmsBackend())['retried'], 0)
+
+        OutboundSms.objects.update(next_attempt_at=timezone.now())
+        stats = dispatch_pending(backend=FailingSmsBackend())
+        self.assertEqual(stats['failed'], 1)
+        self.sms.refresh_from_db()
+        self.assertEqual(self.sms.status, OutboundSms.STATUS_FAILED)
+        self.assertEqual(self.sms.attempts, 2)
+
+    def test_async_dispatch_sends_concurrently(self):
+        """
+        Ensure the async dispatcher delivers a batch and records each outcome.
+        """
+        enqueue_sms('+254700000001', 'Hi')
+        stats = async_to_sync(adispatch_pending)(concurrency=2)
+        self.assertEqual(stats, {'sent': 2, 'retried': 0, 'failed': 0})
+        self.assertEqual(sorted(recipients for _, recipients in LocmemBackend.outbox), [['+254700000000'], ['+254700000001']])
+
+    @override_settings(SMS_SEND_TIMEOUT=0.05)
+    def test_async_dispatch_times_out_slow_gateway(self):
+        """
+        Ensure a gateway call exceeding SMS_SEND_TIMEOUT counts as a failed attempt.
+        """
+        stats = async_to_sync(adispatch_pending)(backend=SlowSmsBackend())
+        self.assertEqual(stats['retried'], 1)
+        self.sms.refresh_from_db()
+        self.assertEqual(self.sms.last_error, "SMS gateway timed out")
+
+    def test_identical_bodies_share_a_gateway_call(self):
+        """
+        Ensure identical messages go out in one call per batch of distinct recipients.
+        """
+        for phone_number, message in [
+            ('+254700000001', 'Hello'), ('+254700000002', 'Hello'), ('+254700000000', 'Hello'), ('+254700000003', 'Hi'),
+        ]:
+            enqueue_sms(phone_number, message)
+        self.assertEqual(dispatch_pending(), {'sent': 5, 'retried': 0, 'failed': 0})
+        self.assertEqual(LocmemBackend.outbox, [
+            ('Hello', ['+254700000000', '+254700000001', '+254700000002']),
+            ('Hello', ['+254700000000']),  # Each identical message to the same number is delivered
+            ('Hi', ['+254700000003']),
+        ])
+
+    def test_rejected_recipient_is_retried_alone(self):
+        """
+        Ensure each message of a multi-recipient call gets its own recipient's outcome.
+        """
+        other = enqueue_sms('+254700000001', 'Hello')
+        stats = async_to_sync(adispatch_pending)(backend=RejectingSmsBackend('+254700000001'))
+        self.assertEqual(stats, {'sent': 1, 'retried': 1, 'failed': 0})
+        other.refresh_from_db()
+        self.assertEqual(other.last_error, "InvalidPhoneNumber (403)")
+        self.assertEqual(OutboundSms.objects.get(pk=self.sms.pk).status, OutboundSms.STATUS_SENT)
+
+    @override_settings(SMS_SEND_TIMEOUT=0.05)
+    def test_blocking_gateway_call_times_out(self):
+        """
+        Ensure a blocking gateway call exceeding SMS_SEND_TIMEOUT counts as a failed attempt.
+        """
+        self.assertEqual(dispatch_pending(backend=HangingSmsBackend())['retried'], 1)
+        self.sms.refresh_from_db()
+        self.assertEqual(self.sms.last_error, "SMS gateway timed out")
+
+    def test_claimed_messages_stay_leased_while_the_batch_is_sent(self):
+        """
+        Ensure another dispatcher cannot claim a batch's messages while its gateway calls are still running.
+        """
+        for n in range(1, 3):
+            enqueue_sms(f"+25470000000{n}", f"Hello {n}")  # Distinct bodies: one gateway call each
+        reclaimed, send = [], send_bulk_sms
+
+        def slow_send(phone_numbers, message, backend=None):
+            """
+            Send as if every earlier call took SMS_SEND_TIMEOUT, letting another dispatcher try to claim first.
+            """
+            calls = len(LocmemBackend.outbox)
+            later = timezone.now() + timedelta(seconds=settings.SMS_OUTBOX_LEASE_SECONDS + calls * settings.SMS_SEND_TIMEOUT)
+            with mock.patch('django.utils.timezone.now', return_value=later):
+                reclaimed.extend(claim_batch(10))
+            return send(phone_numbers, message, backend=backend)
+
+        with mock.patch('main_app.utils.send_bulk_sms', side_effect=slow_send):
+            self.assertEqual(dispatch_pending()['sent'], 3)
+        self.assertEqual(reclaimed, [])
+
+    def test_queued_gateway_call_is_cancelled_on_timeout(self):
+        """
+        Ensure a send still waiting for a gateway thread when it times out is never made.
+        """
+        executor, release = concurrent.futures.ThreadPoolExecutor(1), threading.Event()
+        executor.submit(release.wait)  # Keeps the only gateway thread busy
+        try:
+            with mock.patch('main_app.utils._gateway_executor', return_value=executor):
+                with self.assertRaises(TimeoutError):
+                    send_sms('+254700000000', 'Hello', timeout=0.05)
+        finally:
+            release.set()
+            executor.shutdown(wait=True)
+        self.assertEqual(LocmemBackend.outbox, [])
+
+    def test_open_breaker_defers_messages(self):
+        """
+        Ensure the dispatcher stops calling a failing gateway and defers messages without using attempts.
+        """
+        for n in range(1, settings.SMS_BREAKER_FAILURE_THRESHOLD + 1):
+            enqueue_sms(f"+25470000000{n}", f"Hello {n}")
+        stats = dispatch_pending(backend=FailingSmsBackend())
+        self.assertEqual(stats['retried'], settings.SMS_BREAKER_FAILURE_THRESHOLD + 1)
+        deferred = OutboundSms.objects.get(message=f"Hello {settings.SMS_BREAKER_FAILURE_THRESHOLD}")
+        self.assertEqual(deferred.attempts, 0)
+        self.assertIn("circuit is open", deferred.last_error)
+        self.assertGreater(deferred.next_attempt_at, timezone.now() + timedelta(seconds=1))
+        self.assertIn('sms_breaker_trips_total{gateway="main_app.tests.FailingSmsBackend"}', metrics.render())
+
+        # While the breaker is open, nothing is claimed
+        OutboundSms.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(dispatch_pending(backend=FailingSmsBackend()), {'sent': 0, 'retried': 0, 'failed': 0})
+
+    def test_breaker_half_open_probe(self):
+        """
+        Ensure an open breaker lets a single probe through after its reset timeout.
+        """
+        breaker = CircuitBreaker('test', failure_threshold=2, reset_timeout=0.02)
+        for _ in range(2):
+            with self.assertRaises(ConnectionError), breaker.guard():
+                raise ConnectionError()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+
+        time.sleep(0.03)
+        breaker.before_call()  # The probe
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()  # Only one probe at a time
+        breaker.record_success()
+        self.assertEqual(breaker.stats(), {'state': 'closed', 'failures': 0, 'trips': 1, 'rejected': 2})
+
+    def test_batcher_caps_recipients_per_call(self):
+        """
+        Ensure a gateway call never exceeds the recipient cap.
+        """
+        batcher = SmsBatcher(max_recipients=2)
+        for n in range(5):
+            batcher.add(n, f"+25470000000{n}", 'Hello')
+        self.assertEqual([len(recipients) for _, recipients in batcher.calls()], [2, 2, 1])
+        self.assertEqual(batcher.send(LocmemBackend()), dict.fromkeys(range(5)))
+
+
+class LoadTestHarnessTest(TestCase):
+
+    def setUp(self):
+        self.context = {'tag': 'loadtest-1', 'username': 'loadtest-1-user', 'password': 'secret', 'customers': [7, 8]}
+
+    def test_recorded_mix_replays_with_new_tag_and_customers(self):
+        """
+        Ensure a recorded mix is replayed with the new run's tag and seeded customers.
+        """
+        requests = list(loadtest.synthetic_requests(50, self.context, {'customer': 1, 'order': 1}, seed=1))
+        self.assertEqual({request['name'] for request in requests}, {'customer', 'order'})
+        with tempfile.NamedTemporaryFile(suffix='.jsonl') as recording:
+            loadtest.save_requests(requests, recording.name, self.context)
+            replayed = list(loadtest.load_requests(recording.name, {'tag': 'loadtest-2', 'customers': [9]}))
+        self.assertEqual(len(replayed), len(requests))
+        for request in replayed:
+            if request['name'] == 'order':
+                self.assertEqual(request['data']['customer'], 9)
+            else:
+                self.assertTrue(request['data']['code'].startswith('loadtest-2-'))
+
+    def test_summary_percentiles(self):
+        """
+        Ensure latencies, errors and queries are summarised per request kind.
+        """
+        samples = [('order', 201, ms / 1000, 10) for ms in range(1, 101)] + [('token', 401, 0.5, 1)]
+        summary = loadtest.summarize(samples, elapsed=2)
+        order = summary['requests']['order']
+        self.assertEqual((order['p50_ms'], order['p95_ms'], order['p99_ms']), (50, 95, 99))
+        self.assertEqual((order['count'], order['errors'], order['rps']), (100, 0, 50))
+        self.assertEqual(summary['requests']['token']['errors'], 1)
+        self.assertEqual(summary['total']['queries_per_request'], round(1001 / 101, 2))
+
+
+class MetricsTest(APITestCase):
+
+    def setUp(self):
+        user_cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpassword', is_staff=True)
+        self.token = str(AccessToken.for_user(self.user))
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.token)
+        self.customer = Customer.objects.create(name='Test Customer', code='CUST123')
+
+    def sample(self, name, text=None):
+        """
+        Return the value of a sample line in the /metrics output, or 0 if it is absent.
+        """
+        text = text if text is not None else self.client.get('/metrics').content.decode()
+        for line in text.splitlines():
+            if line.startswith(name + ' '):
+                return float(line.rsplit(' ', 1)[1])
+        return 0
+
+    def test_request_metrics_by_route(self):
+        """
+        Ensure requests are counted and timed per URL pattern, with their database queries.
+        """
+        requests = 'http_requests_total{method="POST",route="api/orders/",status="201"}'
+        queries = 'http_request_db_queries_sum{route="api/orders/"}'
+        before_requests, before_queries = self.sample(requests), self.sample(queries)
+        response = self.client.post(reverse('order_view'), {
+            'customer': self.customer.id, 'item': 'Sugar', 'amount': '10.00',
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        response = self.client.get('/metrics')
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        text = response.content.decode()
+        self.assertEqual(self.sample(requests, text), before_requests + 1)
+        self.assertGreater(self.sample(queries, text), before_queries)
+        self.assertIn('http_request_duration_seconds_bucket{method="POST",route="api/orders/",le="+Inf"}', text)
+        self.assertGreater(self.sample('signal_handler_duration_seconds_count{handler="presave_order"}', text), 0)
+        self.assertIn('customer_cache_misses_total', text)
+
+    async def test_async_requests_count_queries(self):
+        """
+        Ensure queries run by sync code called from async requests are counted.
+        """
+        queries = 'http_request_db_queries_sum{route="api/customers/"}'
+        before = await sync_to_async(self.sample)(queries)
+        response = await self.async_client.get(
+            reverse('customer_view'), headers={'Authorization': 'Bearer ' + self.token}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertGreater(await sync_to_async(self.sample)(queries), before)
+
+    def test_sms_send_outcomes(self):
+        """
+        Ensure SMS sends are timed by outcome.
+        """
+        success = 'sms_send_duration_seconds_count{outcome="success"}'
+        error = 'sms_send_duration_seconds_count{outcome="error"}'
+        before_success, before_error = self.sample(success), self.sample(error)
+        gateway_breaker(FailingSmsBackend()).reset()
+        send_sms('+254700000000', "Hello", backend=LocmemBackend())
+        with self.assertRaises(ConnectionError):
+            send_sms('+254700000000', "Hello", backend=FailingSmsBackend())
+        self.assertEqual(self.sample(success), before_success + 1)
+        self.assertEqual(self.sample(error), before_error + 1)
+
+    def test_snapshots_of_other_processes_are_added_up(self):
+        """
+        Ensure /metrics adds up the snapshots written by other worker processes.
+        """
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            metrics.registry.flush()
+            self.assertTrue(os.path.exists(os.path.join(directory, f"metrics-{os.getpid()}.json")))
+            own = self.sample('sms_outbox_attempts_total{outcome="sent"}')
+            other = {
+                'pid': 999999999,  # An exited worker
+                'metrics': {'sms_outbox_attempts_total': [[['sent'], 5]]},
+                'collected': [
+                    ['customer_cache_local_size', "Entries.", 'gauge', [], 100],
+                    ['customer_cache_misses_total', "Misses.", 'counter', [], 1000],
+                ],
+            }
+            with open(os.path.join(directory, 'metrics-999999999.json'), 'w', encoding='utf-8') as snapshot:
+                json.dump(other, snapshot)
+            text = self.client.get('/metrics').content.decode()
+        self.assertEqual(self.sample('sms_outbox_attempts_total{outcome="sent"}', text), own + 5)
+        self.assertGreaterEqual(self.sample('customer_cache_misses_total', text), 1000)
+        self.assertLess(self.sample('customer_cache_local_size', text), 100)
+
+    def test_snapshots_of_exited_processes_are_archived(self):
+        """
+        Ensure the snapshots of exited processes, including one whose pid is reused, are merged into the archive and deleted.
+        """
+        sample = 'sms_outbox_attempts_total{outcome="sent"}'
+        own = self.sample(sample)
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            exited = [
+                (999999999, 'exited-worker', 5),
+                (os.getpid(), 'earlier-process-with-this-pid', 7),
+            ]
+            for pid, instance, sent in exited:
+                with open(os.path.join(directory, f"metrics-{pid}.json"), 'w', encoding='utf-8') as snapshot:
+                    json.dump({
+                        'pid': pid, 'instance': instance,
+                        'metrics': {'sms_outbox_attempts_total': [[['sent'], sent]]},
+                        'collected': [['customer_cache_misses_total', "Misses.", 'counter', [], 1000]],
+                    }, snapshot)
+            metrics.registry.flush()  # Archives the predecessor's snapshot rather than overwriting it
+            self.assertEqual(metrics.registry.snapshots()[-1]['metrics']['sms_outbox_attempts_total'], [[['sent'], 12]])
+            self.assertEqual(
+                sorted(name for name in os.listdir(directory) if name.endswith('.json')),
+                sorted(['metrics-archive.json', f"metrics-{os.getpid()}.json"]),
+            )
+            for _ in range(2):  # Archived counts are added once, and stay
+                text = self.client.get('/metrics').content.decode()
+                self.assertEqual(self.sample(sample, text), own + 12)
+                self.assertGreaterEqual(self.sample('customer_cache_misses_total', text), 2000)
+
+    @override_settings(METRICS_TOKEN='scrape-secret')
+    def test_token_or_staff_is_required(self):
+        """
+        Ensure /metrics answers only settings.METRICS_TOKEN and staff users, unless METRICS_PUBLIC is set.
+        """
+        self.assertEqual(self.client.get('/metrics').status_code, status.HTTP_200_OK)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for header in ({}, {'HTTP_AUTHORIZATION': 'Bearer wrong-secret'}):
+            self.client.credentials(**header)
+            self.assertEqual(self.client.get('/metrics').status_code, status.HTTP_401_UNAUTHORIZED)
+        other = User.objects.create_user(username='other', password='testpassword')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(other)}")
+        self.assertEqual(self.client.get('/metrics').status_code, status.HTTP_403_FORBIDDEN)
+        self.client.credentials()
+        with override_settings(METRICS_PUBLIC=True):
+            self.assertEqual(self.client.get('/metrics').status_code, status.HTTP_200_OK)
+        with override_settings(METRICS_TOKEN=''):
+            response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer ')
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class StartupTest(TestCase):
+
+    @override_settings(AFRICAS_TALKING_USERNAME='', AFRICAS_TALKING_API_KEY='')
+    def test_sms_sdk_requires_credentials(self):
+        """
+        Ensure sending through Africa's Talking without credentials fails instead of using "None".
+        """
+        with self.assertRaises(ImproperlyConfigured):
+            africastalking_sms()
+
+    def test_parse_importtime(self):
+        """
+        Ensure the -X importtime report is parsed into module, self, cumulative time and depth.
+        """
+        report = [
+            "import time: self [us] | cumulative | imported package",
+            "import time:       225 |        225 |   _io",
+            "import time:       570 |       1342 | _frozen_importlib_external",
+            "import time:        12 |         12 |     main_app.cache",
+        ]
+        self.assertEqual(parse_importtime(report), [
+            ('_io', 225, 225, 1), ('_frozen_importlib_external', 570, 1342, 0), ('main_app.cache', 12, 12, 2),
+        ])
+
+    def test_application_starts_without_sms_sdk(self):
+        """
+        Ensure loading the WSGI application, URLconf included, does not import the SMS SDK.
+        """
+        out = StringIO()
+        call_command('profile_startup', '--prefix', 'main_app', '--prefix', 'africastalking', '--limit', '100', stdout=out)
+        modules = {line.split()[-1] for line in out.getvalue().splitlines()[1:-1]}
+        self.assertIn('main_app.views', modules)
+        self.assertIn('main_app.utils', modules)
+        self.assertFalse({module for module in modules if module.startswith('africastalking')})
@@ -4,13 +4,22 @@ URL configurations for the MainApp Django application.
 This module defines the URL patterns for the API endpoints,
     facilitating the routing of requests to the appropriate views.
 
-- customer_view: Endpoint for managing customer data.
-- order_view: Endpoint for handling order transactions.
+- customer_view: Endpoint for managing customer data (async_customer_view when settings.ASYNC_VIEWS is set).
+- customer_search_view: Endpoint for type-ahead customer search by name or code.
+- customer_rollup_view: Endpoint for a customer's precomputed order totals.
+- customer_import_view: Endpoint for importing customers from CSV or NDJSON.
+- order_view: Endpoint for handling order transactions (async_order_view when settings.ASYNC_VIEWS is set).
+- order_export_view: Endpoint streaming the orders as CSV or NDJSON.
+- order_bulk_view: Endpoint for creating many orders in one request.
+- order_feed_view: Endpoint streaming orders as they are created, as server-sent events (ASGI only).
+- order_feed_token_view: Endpoint issuing short-lived tokens for the order feed's URL, for EventSource.
+- cache_stats_view: Endpoint reporting customer cache hit/miss counters.
 - JWT token paths: Endpoints for obtaining and refreshing JWT tokens for authentication.
 - SignUpView: Endpoint for user registration.
 """
 
 
+from django.conf import settings
 from django.urls import path
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
@@ -18,13 +27,28 @@ from rest_framework_simplejwt.views import (
 )
 from .views import (
     customer_view,
+    customer_import_view,
+    customer_rollup_view,
+    customer_search_view,
     order_view,
+    order_bulk_view,
+    order_export_view,
+    cache_stats_view,
     SignUpView,
 )
+from .async_views import async_customer_view, async_order_view, order_feed_token_view, order_feed_view
 
 urlpatterns = [
-    path('customers/', customer_view, name='customer_view'),
-    path('orders/', order_view, name='order_view'),
+    path('customers/', async_customer_view if settings.ASYNC_VIEWS else customer_view, name='customer_view'),
+    path('customers/search/', customer_search_view, name='customer_search_view'),
+    path('customers/import/', customer_import_view, name='customer_import_view'),
+    path('customers/<int:pk>/rollup/', customer_rollup_view, name='customer_rollup_view'),
+    path('orders/', async_order_view if settings.ASYNC_VIEWS else order_view, name='order_view'),
+    path('orders/bulk/', order_bulk_view, name='order_bulk_view'),
+    path('orders/export/', order_export_view, name='order_export_view'),
+    path('orders/feed/', order_feed_view, name='order_feed_view'),
+    path('orders/feed/token/', order_feed_token_view, name='order_feed_token_view'),
+    path('cache/stats/', cache_stats_view, name='cache_stats_view'),
     # JWT token paths
     path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
@@ -3,29 +3,422 @@ Utility functions for the MainApp Django application.
 
 This module contains helper functions for sending SMS notifications using the Africa's Talking SDK.
 
-- send_sms: Sends an SMS to the specified phone number with the provided message.
-    Handles specific and general exceptions, allowing the calling view to manage errors.
+- AfricasTalkingBackend: SMS gateway backend that delivers messages through Africa's Talking.
+- africastalking_sms: Returns the Africa's Talking SMS service, initialising the SDK on first use.
+- LocmemBackend: SMS gateway backend that keeps messages in memory, for tests and local runs.
+- FakeLatencyBackend: In-memory SMS gateway backend that answers after settings.SMS_FAKE_LATENCY
+    seconds, for load tests.
+- get_sms_backend: Instantiates the gateway backend configured by the SMS_BACKEND setting.
+- send_sms: Sends an SMS to the specified phone number with the provided message, giving up
+    after settings.SMS_SEND_TIMEOUT seconds. Logs and re-raises errors, allowing the caller to manage them.
+- asend_sms: Async version of send_sms.
+- send_bulk_sms / asend_bulk_sms: Send one message to several recipients in one gateway call.
+- recipient_errors: Maps a gateway response to an error, or None, per recipient.
+- SmsBatcher: Groups messages with identical bodies into multi-recipient gateway calls and
+    maps the per-recipient results back to each message.
+
+- gateway_breaker: Returns the circuit breaker of a gateway backend.
+
+All of them record the time and outcome of each send in the sms_send_duration_seconds metric.
+
+Every gateway call goes through the backend's circuit breaker: after
+settings.SMS_BREAKER_FAILURE_THRESHOLD consecutive failures or timeouts, sends fail at once
+with CircuitOpenError for settings.SMS_BREAKER_RESET_SECONDS, then one probe call is let through.
+Blocking ``send`` calls run on a small thread pool (settings.SMS_GATEWAY_THREADS) so the caller
+can stop waiting after the timeout; a call that hangs keeps its pool thread until it returns.
+
+The Africa's Talking SDK is imported and initialised on the first send of each process, not when
+this module is imported, so worker boot, management commands and tests that send no SMS do not
+pay for it, and a gunicorn master started with ``--preload`` does not hand its client to the
+forked workers.
 """
 
 
-import africastalking
+import asyncio
+import concurrent.futures
+import functools
+import logging
+import os
+import threading
+import time
+
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+from .breaker import CircuitBreaker, CircuitOpenError
+from .metrics import SMS_BATCH_RECIPIENTS, SMS_BREAKER_TRIPS, SMS_SEND_SECONDS, registry
+
+logger = logging.getLogger(__name__)
+
+# Africa's Talking status codes of recipients the message was accepted for
+# (100 Processed, 101 Sent, 102 Queued)
+SUCCESS_STATUS_CODES = {100, 101, 102}
+
+_sdk = {'pid': None, 'sms': None}
+_sdk_lock = threading.Lock()
+
+
+def africastalking_sms():
+    """
+    Return the Africa's Talking SMS service, initialising the SDK on the first call in this process.
+
+    The service is rebuilt after a fork, so a child process never shares the parent's client.
+
+    Raises:
+        ImproperlyConfigured: AFRICAS_TALKING_USERNAME or AFRICAS_TALKING_API_KEY is not set.
+    """
+    pid = os.getpid()
+    if _sdk['pid'] == pid:
+        return _sdk['sms']
+    with _sdk_lock:
+        if _sdk['pid'] != pid:
+            username, api_key = settings.AFRICAS_TALKING_USERNAME, settings.AFRICAS_TALKING_API_KEY
+            if not username or not api_key:
+                raise ImproperlyConfigured(
+                    "AFRICAS_TALKING_USERNAME and AFRICAS_TALKING_API_KEY must be set to send SMS "
+                    "through Africa's Talking."
+                )
+            import africastalking  # pylint: disable=C0415
+
+            africastalking.initialize(username, api_key)
+            _sdk['sms'], _sdk['pid'] = africastalking.SMS, pid
+    return _sdk['sms']
+
+
+class AfricasTalkingBackend:
+    """
+    SMS gateway backend that sends messages through the Africa's Talking SDK.
+    """
+
+    def send(self, message, recipients):
+        return africastalking_sms().send(message, recipients)
+
+
+class LocmemBackend:
+    """
+    SMS gateway backend that stores sent messages in memory instead of calling the gateway.
+
+    Sent messages are appended to ``LocmemBackend.outbox`` as ``(message, recipients)`` tuples.
+    """
+    outbox = []
+
+    def send(self, message, recipients):
+        self.outbox.append((message, list(recipients)))
+        return {
+            'SMSMessageData': {
+                'Message': f"Sent to {len(recipients)}/{len(recipients)}",
+                'Recipients': [
+                    {'number': number, 'status': 'Success', 'statusCode': 101}
+                    for number in recipients
+                ],
+            }
+        }
+
+
+class FakeLatencyBackend(LocmemBackend):
+    """
+    SMS gateway backend that behaves like LocmemBackend after waiting settings.SMS_FAKE_LATENCY
+    seconds, to stand in for the real gateway's response time.
+    """
+    outbox = []
+
+    def send(self, message, recipients):
+        time.sleep(settings.SMS_FAKE_LATENCY)
+        return super().send(message, recipients)
+
+    async def asend(self, message, recipients):
+        await asyncio.sleep(settings.SMS_FAKE_LATENCY)
+        return super().send(message, recipients)
+
+
+def get_sms_backend(backend=None):
+    """
+    Return an instance of the SMS gateway backend.
+
+    Args:
+        backend: Dotted path of the backend class (defaults to settings.SMS_BACKEND).
+
+    Returns:
+        An object exposing ``send(message, recipients)``.
+    """
+    return import_string(backend or settings.SMS_BACKEND)()
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def gateway_breaker(backend):
+    """
+    Return the circuit breaker shared by every instance of ``backend``'s class in this process.
+    """
+    name = f"{type(backend).__module__}.{type(backend).__qualname__}"
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(
+                f"SMS gateway {name}",
+                failure_threshold=settings.SMS_BREAKER_FAILURE_THRESHOLD,
+                reset_timeout=settings.SMS_BREAKER_RESET_SECONDS,
+                # A malformed message or missing credentials, not a gateway failure
+                ignore=(ValueError, ImproperlyConfigured),
+                on_trip=lambda breaker: SMS_BREAKER_TRIPS.inc(gateway=name),
+            )
+        return _breakers[name]
+
+
+@registry.register_collector
+def breaker_states():
+    """
+    Report the state of each gateway circuit breaker of this process.
+    """
+    with _breakers_lock:
+        breakers = dict(_breakers)
+    for name, breaker in breakers.items():
+        current = breaker.state
+        for state in (CircuitBreaker.CLOSED, CircuitBreaker.OPEN, CircuitBreaker.HALF_OPEN):
+            yield (
+                'sms_breaker_state', "Processes whose SMS gateway circuit breaker is in each state.",
+                'gauge', {'gateway': name, 'state': state}, int(state == current),
+            )
 
-# Initialize Africa's Talking SDK
-africastalking.initialize(
-    settings.AFRICAS_TALKING_USERNAME,
-    settings.AFRICAS_TALKING_API_KEY
-)
 
-SMS = africastalking.SMS
+@functools.lru_cache(maxsize=None)
+def _gateway_executor():
+    # Created on first use, so each worker process gets its own threads after forking
+    return concurrent.futures.ThreadPoolExecutor(settings.SMS_GATEWAY_THREADS, thread_name_prefix='sms-gateway')
 
-def send_sms(phone_number, message):
+
+def send_sms(phone_number, message, backend=None, timeout=None):
+    return send_bulk_sms([phone_number], message, backend=backend, timeout=timeout)
+
+
+async def asend_sms(phone_number, message, backend=None, timeout=None):
+    """
+    Send an SMS without blocking the event loop.
+
+    Backends may provide an ``asend(message, recipients)`` coroutine; otherwise their blocking
+    ``send`` runs in a worker thread. A send that times out is abandoned, not cancelled, so the
+    gateway may still deliver it.
+
+    Args:
+        phone_number: The recipient's phone number.
+        message: The SMS body.
+        backend: Gateway backend instance to use (default is the SMS_BACKEND setting).
+        timeout: Seconds to wait for the gateway (default is settings.SMS_SEND_TIMEOUT).
+
+    Returns:
+        The gateway response.
+
+    Raises:
+        TimeoutError: The gateway did not answer in time.
+    """
+    return await asend_bulk_sms([phone_number], message, backend=backend, timeout=timeout)
+
+
+def send_bulk_sms(phone_numbers, message, backend=None, timeout=None):
+    """
+    Send one message to several recipients in a single gateway call.
+
+    The call runs on one of settings.SMS_GATEWAY_THREADS threads. If it has not started when
+    the timeout expires, because every thread is busy, it is cancelled. A call already running
+    cannot be cancelled and may still reach the gateway after the timeout, so the outbox's
+    retry of a timed-out message can deliver it twice.
+
+    Args:
+        phone_numbers: The recipients' phone numbers.
+        message: The SMS body.
+        backend: Gateway backend instance to use (default is the SMS_BACKEND setting).
+        timeout: Seconds to wait for the gateway (default is settings.SMS_SEND_TIMEOUT).
+
+    Returns:
+        The gateway response; see recipient_errors for the outcome per recipient.
+
+    Raises:
+        TimeoutError: The gateway did not answer in time.
+        CircuitOpenError: The gateway is failing, so it was not called.
+    """
+    started, outcome = time.perf_counter(), 'error'
     try:
-        response = SMS.send(message, [phone_number])
-        print(response)
+        sms_backend = backend or get_sms_backend()
+        with gateway_breaker(sms_backend).guard():
+            future = _gateway_executor().submit(sms_backend.send, message, list(phone_numbers))
+            try:
+                response = future.result(timeout or settings.SMS_SEND_TIMEOUT)
+            except concurrent.futures.TimeoutError as e:
+                future.cancel()  # Still queued behind busy threads: never send it
+                outcome = 'timeout'
+                raise TimeoutError("SMS gateway timed out") from e
+        outcome = 'success'
+        logger.debug("SMS gateway response: %s", response)
+        return response
+    except CircuitOpenError:
+        outcome = 'circuit_open'
+        raise
+    except TimeoutError:
+        logger.warning("Error sending SMS: gateway timed out after %ss", timeout or settings.SMS_SEND_TIMEOUT)
+        raise
     except ValueError as e:
-        print(f"Value error: {e}")  # Specific handling for value errors
-        raise  # Reraise the exception to handle it in the view
+        logger.warning("Value error sending SMS: %s", e)  # Specific handling for value errors
+        raise  # Reraise the exception to handle it in the caller
     except Exception as e:
-        print(f"Error sending SMS: {e}")  # General exception handling
-        raise  # Reraise the exception to handle it in the view
+        logger.warning("Error sending SMS: %s", e)  # General exception handling
+        raise  # Reraise the exception to handle it in the caller
+    finally:
+        SMS_SEND_SECONDS.observe(time.perf_counter() - started, outcome=outcome)
+        SMS_BATCH_RECIPIENTS.observe(len(phone_numbers))
+
+
+async def asend_bulk_sms(phone_numbers, message, backend=None, timeout=None):
+    """
+    Async version of send_bulk_sms, bounded by ``timeout`` like asend_sms.
+    """
+    started, outcome = time.perf_counter(), 'error'
+    try:
+        sms_backend = backend or get_sms_backend()
+        with gateway_breaker(sms_backend).guard():
+            if hasattr(sms_backend, 'asend'):
+                pending = sms_backend.asend(message, list(phone_numbers))
+            else:
+                pending = sync_to_async(sms_backend.send, thread_sensitive=False)(message, list(phone_numbers))
+            try:
+                response = await asyncio.wait_for(pending, timeout or settings.SMS_SEND_TIMEOUT)
+            except asyncio.TimeoutError as e:
+                outcome = 'timeout'
+                raise TimeoutError("SMS gateway timed out") from e
+        outcome = 'success'
+        logger.debug("SMS gateway response: %s", response)
+        return response
+    except CircuitOpenError:
+        outcome = 'circuit_open'
+        raise
+    except TimeoutError:
+        logger.warning("Error sending SMS: gateway timed out after %ss", timeout or settings.SMS_SEND_TIMEOUT)
+        raise
+    except Exception as e:
+        logger.warning("Error sending SMS: %s", e)
+        raise
+    finally:
+        SMS_SEND_SECONDS.observe(time.perf_counter() - started, outcome=outcome)
+        SMS_BATCH_RECIPIENTS.observe(len(phone_numbers))
+
+
+def recipient_errors(response, phone_numbers):
+    """
+    Return the outcome of a gateway call for each recipient.
+
+    Args:
+        response: The gateway response, shaped like Africa's Talking's
+            ``{'SMSMessageData': {'Recipients': [{'number', 'status', 'statusCode'}, ...]}}``.
+        phone_numbers: The recipients the message was sent to.
+
+    Returns:
+        A dict of phone number to None (accepted) or an error message.
+    """
+    try:
+        results = {row['number']: row for row in response['SMSMessageData']['Recipients']}
+    except (KeyError, TypeError):
+        results = {}
+    errors = {}
+    for number in phone_numbers:
+        row = results.get(number)
+        if row is None:
+            errors[number] = "No result for this recipient in the gateway response"
+        elif row.get('statusCode') in SUCCESS_STATUS_CODES or row.get('status') == 'Success':
+            errors[number] = None
+        else:
+            errors[number] = f"{row.get('status', 'Rejected')} ({row.get('statusCode')})"
+    return errors
+
+
+class SmsBatcher:
+    """
+    Collects messages and sends those with identical bodies together, one gateway call per
+    group of up to ``max_recipients`` (default settings.SMS_BATCH_MAX_RECIPIENTS) recipients.
+
+    A phone number appears at most once per call, so two identical messages to the same number
+    (e.g. two identical orders) are still delivered separately, and each gets its own result.
+
+        batcher = SmsBatcher()
+        for sms in batch:
+            batcher.add(sms.pk, sms.phone_number, sms.message)
+        errors = batcher.send()  # {sms.pk: None or an error}
+    """
+
+    def __init__(self, max_recipients=None):
+        self.max_recipients = max_recipients or settings.SMS_BATCH_MAX_RECIPIENTS
+        self.messages = []
+
+    def add(self, key, phone_number, message):
+        """
+        Queue ``message`` for ``phone_number``; ``key`` identifies it in the results.
+        """
+        self.messages.append((key, phone_number, message))
+
+    def calls(self):
+        """
+        Return the gateway calls to make, as ``(message, [(key, phone_number), ...])`` tuples.
+        """
+        calls, open_calls = [], {}
+        for key, phone_number, message in self.messages:
+            # The first call for this body with room and without this number, or a new one
+            for numbers, recipients in open_calls.setdefault(message, []):
+                if len(recipients) < self.max_recipients and phone_number not in numbers:
+                    break
+            else:
+                numbers, recipients = set(), []
+                open_calls[message].append((numbers, recipients))
+                calls.append((message, recipients))
+            numbers.add(phone_number)
+            recipients.append((key, phone_number))
+        return calls
+
+    @staticmethod
+    def _results(recipients, response=None, error=None):
+        if error is not None:
+            return {key: error for key, _ in recipients}
+        errors = recipient_errors(response, [number for _, number in recipients])
+        return {key: errors[number] for key, number in recipients}
+
+    def send(self, backend=None):
+        """
+        Send the queued messages.
+
+        Returns:
+            A dict of key to None (accepted by the gateway) or the error: the exception raised
+            by the gateway call, or the gateway's rejection message for that recipient.
+        """
+        backend = backend or get_sms_backend()
+        results = {}
+        for message, recipients in self.calls():
+            try:
+                response = send_bulk_sms([number for _, number in recipients], message, backend=backend)
+            except Exception as e:  # pylint: disable=W0718
+                results.update(self._results(recipients, error=e))
+            else:
+                results.update(self._results(recipients, response))
+        return results
+
+    async def asend(self, backend=None, concurrency=None, timeout=None):
+        """
+        Async version of send, with up to ``concurrency`` (default settings.SMS_OUTBOX_CONCURRENCY)
+        gateway calls in flight, each bounded by ``timeout``.
+        """
+        backend = backend or get_sms_backend()
+        semaphore = asyncio.Semaphore(concurrency or settings.SMS_OUTBOX_CONCURRENCY)
+
+        async def call(message, recipients):
+            async with semaphore:
+                try:
+                    response = await asend_bulk_sms(
+                        [number for _, number in recipients], message, backend=backend, timeout=timeout,
+                    )
+                except Exception as e:  # pylint: disable=W0718
+                    return self._results(recipients, error=e)
+                return self._results(recipients, response)
+
+        results = {}
+        for result in await asyncio.gather(*(call(message, recipients) for message, recipients in self.calls())):
+            results.update(result)
+        return results
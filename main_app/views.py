@@ -5,27 +5,61 @@ This module contains the views that handle requests related to customers and ord
 It includes functionality for user registration and SMS notifications upon order creation.
 
 - SignUpView: Allows users to register using the UserSerializer.
-- customer_view: Handles POST requests for creating customers, returning validation errors as needed.
-- order_view: Manages order creation, sends an SMS notification to the customer upon success,
-    and handles errors appropriately.
+- customer_view: Handles POST requests for creating customers, returning validation errors as needed
+    (a taken code is detected by the INSERT), and GET requests listing customers with keyset
+    pagination. POSTs honour an Idempotency-Key header.
+- customer_rollup_view: Returns a customer's precomputed order count, revenue and last order time.
+- customer_import_view: Streams a CSV or NDJSON upload and upserts customers on their code.
+- save_order: Saves a validated order and queues its SMS notification, for the sync and async views.
+- order_view: Manages order creation and queues an SMS notification to the customer in the
+    same transaction; the SMS dispatcher delivers it outside the request. GET lists orders
+    with keyset pagination. POSTs honour an Idempotency-Key header, so retries do not create
+    another order.
+- cache_stats_view: Reports the customer cache hit/miss counters of the serving process, for staff users.
+- metrics_view: Serves the request, database, SMS and signal metrics of all worker processes
+    in the Prometheus text format.
+- order_export_view: Streams every order matching the list filters, current and archived, as CSV or
+    NDJSON, gzip-compressed when the client accepts it.
+- order_bulk_view: Accepts a JSON array or NDJSON body of orders and inserts them in batches,
+    reporting validation errors per row.
 """
 
 
 from rest_framework.response import Response
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.exceptions import APIException
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.decorators import api_view, parser_classes, permission_classes
+from rest_framework.exceptions import AuthenticationFailed, ValidationError
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAdminUser, IsAuthenticated, AllowAny
 from rest_framework import status, generics
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import render
+from django.utils.cache import patch_vary_headers
+from django.utils.crypto import constant_time_compare
 
 # Import your serializers and utility functions at the top
+from .authentication import ClaimsJWTAuthentication
+from .exports import FORMATS as EXPORT_FORMATS, aiterate, export_querysets, gzip_chunks, iter_chunks, iter_rows
+from .filters import filter_customers, filter_orders, wants_archived
+from .idempotency import idempotent
+from .models import Customer, CustomerDailyRollup, CustomerRollup, Order, OrderArchive
+from .pagination import KeysetPagination
+from .search import search_customers
+from . import metrics
+from .bulk import create_orders_in_bulk
+from .cache import customer_cache
+from .fast_serializers import FastCustomerSerializer, FastOrderListSerializer, FastOrderSerializer
+from .importers import FORMATS, import_customers
 from .serializers import (
-    CustomerSerializer,
-    OrderSerializer,
+    CustomerDailyRollupSerializer,
+    CustomerRollupSerializer,
+    CustomerSearchSerializer,
     UserSerializer
 )
-from .utils import send_sms  # Import the SMS utility function
+from .parsers import FastJSONParser, NDJSONParser
+from .outbox import enqueue_sms, order_confirmation_message  # Queue SMS notifications for the dispatcher
 
 User = get_user_model()  # Get the user model
 
@@ -45,46 +79,253 @@ class SignUpView(generics.CreateAPIView):
     permission_classes = [AllowAny]  # Allow any user to register
 
 
-@api_view(['POST'])
+@api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
+@idempotent
 def customer_view(request):
     """
-    Handle POST requests for Customer.
+    Handle GET and POST requests for Customer.
     """
+    if request.method == 'GET':
+        customers = filter_customers(Customer.objects.all(), request.query_params)
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(customers, request)
+        return paginator.get_paginated_response(FastCustomerSerializer(page, many=True).data)
+
     if request.method == 'POST':
-        serializer = CustomerSerializer(data=request.data)
+        serializer = FastCustomerSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            try:
+                serializer.save()
+            except ValidationError as e:  # The code is taken; returned here so an idempotent retry replays it
+                return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
             return Response(status=status.HTTP_201_CREATED)
 
         # Return validation errors if the data is invalid
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-    # This should never be reached in a properly configured API, as only POST is allowed
+    # This should never be reached in a properly configured API, as only GET and POST are allowed
     return Response({"detail": "Method not allowed"}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def customer_search_view(request):
+    """
+    Handle GET requests for a type-ahead Customer search.
+
+    ``q`` is matched as a prefix of, or fuzzily against, the customers' names and codes; the
+    best ``limit`` matches (default settings.CUSTOMER_SEARCH_LIMIT) are returned, best first.
+    """
+    term = request.query_params.get('q', '').strip()
+    if not term:
+        return Response({"q": ["This parameter is required."]}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        limit = int(request.query_params.get('limit', settings.CUSTOMER_SEARCH_LIMIT))
+    except ValueError:
+        return Response({"limit": ["A valid integer is required."]}, status=status.HTTP_400_BAD_REQUEST)
+    limit = min(max(limit, 1), settings.CUSTOMER_SEARCH_MAX_LIMIT)
+    return Response({"results": CustomerSearchSerializer(search_customers(term, limit), many=True).data})
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def customer_rollup_view(request, pk):
+    """
+    Handle GET requests for a Customer's order rollup.
+
+    Reads the incrementally maintained rollup row instead of aggregating the customer's orders.
+    ``?days=N`` adds the per-day totals of the customer's last N days with orders.
+    """
+    rollup = CustomerRollup.objects.filter(customer_id=pk).first()
+    if rollup is None:
+        if not Customer.objects.filter(pk=pk).exists():
+            return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+        rollup = CustomerRollup(customer_id=pk)  # No orders yet
+    data = CustomerRollupSerializer(rollup).data
+
+    if 'days' in request.query_params:
+        try:
+            days = min(max(int(request.query_params['days']), 1), settings.ROLLUP_MAX_DAYS)
+        except ValueError:
+            return Response({"days": ["A valid integer is required."]}, status=status.HTTP_400_BAD_REQUEST)
+        daily = CustomerDailyRollup.objects.filter(customer_id=pk).order_by('-day')[:days]
+        data['daily'] = CustomerDailyRollupSerializer(daily, many=True).data
+    return Response(data)
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@parser_classes([MultiPartParser])
+def customer_import_view(request):
+    """
+    Handle POST requests importing Customers in bulk.
+
+    The body is either a raw CSV (text/csv) or NDJSON (application/x-ndjson) document, or a
+    multipart form with the document in a ``file`` field. The raw body is read as a stream.
+    """
+    media_types = {media_type: fmt for fmt, media_type in FORMATS.items()}
+    content_type = request.content_type.split(';')[0].strip()
+    if content_type == 'multipart/form-data':
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"file": ["No file was submitted."]}, status=status.HTTP_400_BAD_REQUEST)
+        fmt = media_types.get(upload.content_type) or upload.name.rsplit('.', 1)[-1].lower()
+        stream = upload
+    else:
+        fmt = media_types.get(content_type)
+        stream = request.stream
+    if fmt not in FORMATS:
+        return Response(
+            {"detail": "Expected a CSV or NDJSON document."},
+            status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+        )
+    if stream is None:
+        return Response({"detail": "Empty document."}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response(import_customers(stream, fmt), status=status.HTTP_200_OK)
+
+
+def save_order(serializer):
+    """
+    Save a validated order serializer and queue the order's confirmation SMS.
+
+    The SMS is queued in the same transaction as the order; the dispatcher sends it.
+    """
+    with transaction.atomic():
+        order = serializer.save()
+        enqueue_sms(settings.ORDER_SMS_RECIPIENT, order_confirmation_message(order), order=order)
+    return order
+
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+@idempotent
 def order_view(request):
     """
-    Handle POST requests for Order.
+    Handle GET and POST requests for Order.
+
+    GET lists the current orders, or with ``archived=true`` the archived ones.
     """
+    if request.method == 'GET':
+        model = OrderArchive if wants_archived(request.query_params) else Order
+        orders = filter_orders(model.objects.select_related('customer'), request.query_params)
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(orders, request)
+        return paginator.get_paginated_response(FastOrderListSerializer(page, many=True).data)
+
     if request.method == 'POST':
-        serializer = OrderSerializer(data=request.data)
+        serializer = FastOrderSerializer(data=request.data)
         if serializer.is_valid():
-            # Send SMS to the customer upon successful order creation
-            order = serializer.save()
-            message = f"Dear {order.customer.name}, your order for {order.item} has been successfully placed."
-            try:
-                send_sms('+254704205757', message)
-            except APIException as e:
-                return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
-
+            save_order(serializer)
             return Response(status=status.HTTP_201_CREATED)
 
         # Return validation errors if the data is invalid
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-    # This should never be reached in a properly configured API, as only POST is allowed
+    # This should never be reached in a properly configured API, as only GET and POST are allowed
     return Response({"detail": "Method not allowed"}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def order_export_view(request):
+    """
+    Handle GET requests exporting Orders.
+
+    Streams every current and archived order matching the ``customer``, ``active``, ``since``
+    and ``until`` filters, oldest first, as CSV or, with ``output=ndjson``, NDJSON. The body is
+    gzip-compressed on the fly when the client accepts it. Under ASGI the rows are read through
+    an async iterator, so the response is not buffered before it is sent.
+    """
+    fmt = request.query_params.get('output', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return Response(
+            {"output": [f"Expected one of: {', '.join(EXPORT_FORMATS)}."]}, status=status.HTTP_400_BAD_REQUEST
+        )
+    querysets = export_querysets(request.query_params)  # Filter errors surface here, as a 400
+
+    chunks = iter_chunks(iter_rows(querysets), fmt)
+    compress = 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+    if compress:
+        chunks = gzip_chunks(chunks)
+    response = StreamingHttpResponse(
+        aiterate(chunks) if hasattr(request, 'scope') else chunks,
+        content_type=f"{EXPORT_FORMATS[fmt]}; charset=utf-8",
+    )
+    response['Content-Disposition'] = f'attachment; filename="orders.{fmt}"'
+    patch_vary_headers(response, ['Accept-Encoding'])
+    if compress:
+        response['Content-Encoding'] = 'gzip'
+    return response
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@parser_classes([FastJSONParser, NDJSONParser])
+def order_bulk_view(request):
+    """
+    Handle POST requests for a batch of Orders.
+
+    Valid rows are created and invalid ones are reported by their index in the payload.
+    Responds with 201 when every row was created, 207 when only some were, and 400 when none were.
+    """
+    rows = request.data
+    if not isinstance(rows, list):
+        return Response({"detail": "Expected a list of orders."}, status=status.HTTP_400_BAD_REQUEST)
+    if len(rows) > settings.ORDER_BULK_MAX_ROWS:
+        return Response(
+            {"detail": f"A bulk request may contain at most {settings.ORDER_BULK_MAX_ROWS} orders."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    orders, errors = create_orders_in_bulk(rows)
+    if not errors:
+        response_status = status.HTTP_201_CREATED
+    elif orders:
+        response_status = status.HTTP_207_MULTI_STATUS
+    else:
+        response_status = status.HTTP_400_BAD_REQUEST
+    return Response({"created": len(orders), "errors": errors}, status=response_status)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def cache_stats_view(request):  # pylint: disable=W0613
+    """
+    Handle GET requests for the customer cache counters of the process serving the request.
+    """
+    return Response({"customer_cache": customer_cache.stats()})
+
+
+def _metrics_user(request):
+    """
+    Return the user of the request's session or JWT bearer token, or None.
+    """
+    if request.user.is_authenticated:
+        return request.user
+    try:
+        result = ClaimsJWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return None
+    return result[0] if result else None
+
+
+def metrics_view(request):
+    """
+    Handle Prometheus scrapes.
+
+    Metrics reveal the traffic and timings of every endpoint, so a scrape must present
+    settings.METRICS_TOKEN as a bearer token or come from a staff user, unless
+    settings.METRICS_PUBLIC opens the endpoint to anyone.
+    """
+    if not settings.METRICS_PUBLIC:
+        scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+        scraper = settings.METRICS_TOKEN and scheme.lower() == 'bearer'
+        if not (scraper and constant_time_compare(token, settings.METRICS_TOKEN)):
+            user = _metrics_user(request)
+            if user is None:
+                return HttpResponse("Authentication required.\n", status=401, content_type='text/plain')
+            if not user.is_staff:
+                return HttpResponse("Staff access required.\n", status=403, content_type='text/plain')
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')